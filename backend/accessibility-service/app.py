@@ -2,7 +2,7 @@
 Main application entry point
 Accessibility Service - Port 8005
 """
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 from config import Config
 from routes.stations import stations_bp
 from routes.equipment import equipment_bp
@@ -34,6 +34,17 @@ def update_equipment_job():
         with app.app_context():
             mta_client.fetch_equipment_status()
 
+@app.after_request
+def add_data_age_headers(response):
+    """Expose how old the equipment data behind an accessibility response is"""
+    if request.path.startswith('/api/accessibility/'):
+        age, is_stale = cache.get_age('equipment_data')
+        if age is not None:
+            response.headers['X-Data-Age'] = str(int(age))
+            if is_stale:
+                response.headers['X-Cache'] = 'STALE'
+    return response
+
 @app.route('/')
 def index():
     """Service health check and information"""
@@ -103,31 +114,30 @@ def refresh_data():
 @app.route('/api/accessibility/stats', methods=['GET'])
 def get_stats():
     """Get system-wide accessibility statistics"""
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
+    equipment = mta_client.get_equipment_status()
     
-    stations = cache.get('stations_data')
-    if not stations:
-        stations = mta_client.fetch_stations()
+    # Totals are precomputed when equipment and stations are fetched
+    station_index = mta_client.get_station_index()
+    totals = equipment.get('totals', {})
     
-    total_elevators = len(equipment.get('elevators', []))
-    active_elevators = len([e for e in equipment.get('elevators', []) if e['status'] == 'active'])
-    outage_elevators = len([e for e in equipment.get('elevators', []) if e['status'] == 'outage'])
+    total_elevators = totals.get('elevators', 0)
+    active_elevators = totals.get('active_elevators', 0)
+    outage_elevators = totals.get('outage_elevators', 0)
     
-    total_escalators = len(equipment.get('escalators', []))
-    active_escalators = len([e for e in equipment.get('escalators', []) if e['status'] == 'active'])
+    total_escalators = totals.get('escalators', 0)
+    active_escalators = totals.get('active_escalators', 0)
     
-    ada_stations = len([s for s in stations if s.get('ada_compliant')])
+    total_stations = station_index['total_stations']
+    ada_stations = station_index['ada_compliant_stations']
     elevator_uptime = (active_elevators / total_elevators * 100) if total_elevators > 0 else 0
     
     return jsonify({
         'status': 'success',
         'data': {
             'system_wide': {
-                'total_stations': len(stations),
+                'total_stations': total_stations,
                 'ada_compliant_stations': ada_stations,
-                'ada_compliance_rate': round(ada_stations / len(stations) * 100, 2) if stations else 0
+                'ada_compliance_rate': round(ada_stations / total_stations * 100, 2) if total_stations else 0
             },
             'elevators': {
                 'total': total_elevators,
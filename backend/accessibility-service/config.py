@@ -3,6 +3,8 @@ Configuration settings for Accessibility Service
 """
 import os
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     # Service settings
     SERVICE_NAME = 'Accessibility Service'
@@ -17,4 +19,11 @@ class Config:
     EQUIPMENT_UPDATE_INTERVAL = 600  # 10 minutes sync
     
     # Route planning
-    MAX_TRANSFER_DISTANCE_KM = 0.5
\ No newline at end of file
+    MAX_TRANSFER_DISTANCE_KM = 0.5
+    
+    # Equipment change feed
+    EQUIPMENT_CHANGELOG_SIZE = 1000  # Outage events kept for /api/accessibility/changes
+    
+    # Outage history and reliability
+    OUTAGE_HISTORY_DB = os.path.join(BASE_DIR, 'instance', 'outage_history.db')
+    RELIABILITY_MAX_WINDOW_DAYS = 30  # Longest uptime window kept in memory
\ No newline at end of file
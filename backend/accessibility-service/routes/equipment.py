@@ -3,7 +3,8 @@ Equipment endpoints for elevators and escalators
 """
 from flask import Blueprint, jsonify, request
 from services.mta_client import mta_client
-from services.cache_manager import cache
+from services.reliability import reliability_service
+from config import Config
 from utils.helpers import format_response, format_error
 
 equipment_bp = Blueprint('equipment', __name__, url_prefix='/api/accessibility')
@@ -15,18 +16,17 @@ def get_all_elevators():
     station_id = request.args.get('station_id')
     
     # Get equipment data
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
-    
-    elevators = equipment.get('elevators', [])
-    
-    # Apply filters
-    if status_filter:
-        elevators = [e for e in elevators if e['status'] == status_filter]
+    equipment = mta_client.get_equipment_status()
     
+    # Narrow with the prebuilt indexes, then filter the (small) remainder
     if station_id:
-        elevators = [e for e in elevators if e['station_id'] == station_id]
+        elevators = equipment.get('elevators_by_station', {}).get(station_id, [])
+        if status_filter:
+            elevators = [e for e in elevators if e['status'] == status_filter]
+    elif status_filter:
+        elevators = equipment.get('elevators_by_status', {}).get(status_filter, [])
+    else:
+        elevators = equipment.get('elevators', [])
     
     return jsonify(format_response({
         'elevators': elevators,
@@ -38,15 +38,9 @@ def get_all_elevators():
 @equipment_bp.route('/elevators/<elevator_id>', methods=['GET'])
 def get_elevator(elevator_id):
     """Get specific elevator information"""
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
+    equipment = mta_client.get_equipment_status()
     
-    elevator = None
-    for e in equipment.get('elevators', []):
-        if e['id'] == elevator_id:
-            elevator = e
-            break
+    elevator = equipment.get('elevators_by_id', {}).get(elevator_id)
     
     if not elevator:
         return jsonify(format_error(f'Elevator {elevator_id} not found', 404))
@@ -57,11 +51,9 @@ def get_elevator(elevator_id):
 @equipment_bp.route('/elevators/outages', methods=['GET'])
 def get_elevator_outages():
     """Get all current elevator outages"""
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
+    equipment = mta_client.get_equipment_status()
     
-    outages = [e for e in equipment.get('elevators', []) if e['status'] == 'outage']
+    outages = equipment.get('elevators_by_status', {}).get('outage', [])
     
     return jsonify(format_response({
         'outages': outages,
@@ -76,18 +68,17 @@ def get_all_escalators():
     status_filter = request.args.get('status')
     station_id = request.args.get('station_id')
     
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
-    
-    escalators = equipment.get('escalators', [])
-    
-    # Apply filters
-    if status_filter:
-        escalators = [e for e in escalators if e['status'] == status_filter]
+    equipment = mta_client.get_equipment_status()
     
+    # Narrow with the prebuilt indexes, then filter the (small) remainder
     if station_id:
-        escalators = [e for e in escalators if e['station_id'] == station_id]
+        escalators = equipment.get('escalators_by_station', {}).get(station_id, [])
+        if status_filter:
+            escalators = [e for e in escalators if e['status'] == status_filter]
+    elif status_filter:
+        escalators = equipment.get('escalators_by_status', {}).get(status_filter, [])
+    else:
+        escalators = equipment.get('escalators', [])
     
     return jsonify(format_response({
         'escalators': escalators,
@@ -99,17 +90,56 @@ def get_all_escalators():
 @equipment_bp.route('/escalators/<escalator_id>', methods=['GET'])
 def get_escalator(escalator_id):
     """Get specific escalator information"""
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
+    equipment = mta_client.get_equipment_status()
     
-    escalator = None
-    for e in equipment.get('escalators', []):
-        if e['id'] == escalator_id:
-            escalator = e
-            break
+    escalator = equipment.get('escalators_by_id', {}).get(escalator_id)
     
     if not escalator:
         return jsonify(format_error(f'Escalator {escalator_id} not found', 404))
     
     return jsonify(format_response(escalator))
+
+
+@equipment_bp.route('/changes', methods=['GET'])
+def get_equipment_changes():
+    """
+    Get elevator/escalator outage events since a sequence number (?since=N)
+    Clients pass the returned latest_sequence as since on their next call;
+    reset=true means events were missed and the full equipment list should be reloaded
+    """
+    since = request.args.get('since', default=0, type=int)
+    
+    events, latest_sequence, complete = mta_client.get_changes(since)
+    
+    return jsonify(format_response({
+        'events': events,
+        'count': len(events),
+        'since': since,
+        'latest_sequence': latest_sequence,
+        'reset': not complete
+    }))
+
+
+@equipment_bp.route('/reliability', methods=['GET'])
+def get_reliability():
+    """Get rolling elevator uptime per station (?window_days=N, optional ?station_id=)"""
+    window_days = request.args.get('window_days', default=7, type=int)
+    station_id = request.args.get('station_id')
+    
+    if not 1 <= window_days <= Config.RELIABILITY_MAX_WINDOW_DAYS:
+        return jsonify(format_error(f'window_days must be between 1 and {Config.RELIABILITY_MAX_WINDOW_DAYS}'))
+    
+    equipment = mta_client.get_equipment_status()
+    scores = reliability_service.get_station_scores(equipment, window_days)
+    
+    if station_id:
+        if station_id not in scores:
+            return jsonify(format_error(f'No elevators found for station {station_id}', 404))
+        scores = {station_id: scores[station_id]}
+    
+    return jsonify(format_response({
+        'stations': sorted(scores.values(), key=lambda s: s['uptime_percentage']),
+        'count': len(scores),
+        'window_days': window_days,
+        'last_updated': equipment.get('last_updated')
+    }))
\ No newline at end of file
@@ -2,6 +2,7 @@
 Route planning endpoints
 """
 from flask import Blueprint, jsonify, request
+from services.geo_index import GeoIndex
 from services.route_planner import route_planner
 from utils.helpers import format_response, format_error
 
@@ -27,33 +28,24 @@ def plan_accessible_route():
 @routes_bp.route('/alternatives/<station_id>', methods=['GET'])
 def get_alternatives(station_id):
     """Find nearby accessible alternatives for a station"""
-    max_distance = float(request.args.get('max_distance', 0.5))
+    max_distance = request.args.get('max_distance', default=0.5, type=float)
+    
+    error = GeoIndex.search_error(max_distance)
+    if error:
+        return format_error(f'max_distance: {error}')
     
     from services.mta_client import mta_client
-    from services.cache_manager import cache
     
     # Get station info
-    stations = cache.get('stations_data')
-    if not stations:
-        stations = mta_client.fetch_stations()
-    
-    station = None
-    for s in stations:
-        if s['station_id'] == station_id:
-            station = s
-            break
+    station = mta_client.get_station(station_id)
     
     if not station:
         return jsonify(format_error(f'Station {station_id} not found', 404))
     
     # Get equipment status for this station
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
+    equipment = mta_client.get_equipment_status()
     
-    station_elevators = [e for e in equipment.get('elevators', []) 
-                        if e['station_id'] == station_id]
-    working_elevators = [e for e in station_elevators if e['status'] == 'active']
+    counts = mta_client.get_station_counts(equipment, station_id)
     
     # Find alternatives
     alternatives = route_planner.find_nearby_accessible_stations(
@@ -66,9 +58,9 @@ def get_alternatives(station_id):
     return jsonify(format_response({
         'station': {
             **station,
-            'is_accessible': len(working_elevators) > 0,
-            'working_elevators': len(working_elevators),
-            'total_elevators': len(station_elevators)
+            'is_accessible': counts['working_elevators'] > 0,
+            'working_elevators': counts['working_elevators'],
+            'total_elevators': counts['elevators']
         },
         'alternatives': alternatives,
         'search_radius_km': max_distance
@@ -3,7 +3,6 @@ Station accessibility endpoints
 """
 from flask import Blueprint, request, jsonify
 from services.mta_client import mta_client
-from services.cache_manager import cache
 from utils.helpers import format_response, format_error
 
 stations_bp = Blueprint('stations', __name__, url_prefix='/api/accessibility/stations')
@@ -15,17 +14,13 @@ def get_all_stations():
     accessible_only = request.args.get('accessible_only', 'false').lower() == 'true'
     
     # Get stations from cache or MTA
-    stations = cache.get('stations_data')
-    if not stations:
-        stations = mta_client.fetch_stations()
+    stations = mta_client.get_stations()
     
     if not stations:
         return jsonify(format_error('Unable to fetch stations data', 503))
     
     # Get equipment data for accessibility check
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
+    equipment = mta_client.get_equipment_status()
     
     results = []
     for station in stations:
@@ -33,17 +28,15 @@ def get_all_stations():
         if ada_only and not station.get('ada_compliant'):
             continue
         
-        # Check real-time accessibility
-        station_elevators = [e for e in equipment.get('elevators', []) 
-                            if e['station_id'] == station['station_id']]
-        working_elevators = [e for e in station_elevators if e['status'] == 'active']
+        # Check real-time accessibility (counts precomputed per equipment fetch)
+        counts = mta_client.get_station_counts(equipment, station['station_id'])
         
         station_data = {
             **station,
-            'has_elevator': len(station_elevators) > 0,
-            'elevator_count': len(station_elevators),
-            'working_elevators': len(working_elevators),
-            'is_currently_accessible': len(working_elevators) > 0
+            'has_elevator': counts['elevators'] > 0,
+            'elevator_count': counts['elevators'],
+            'working_elevators': counts['working_elevators'],
+            'is_currently_accessible': counts['working_elevators'] > 0
         }
         
         # Filter by current accessibility if requested
@@ -58,42 +51,25 @@ def get_all_stations():
 @stations_bp.route('/<station_id>', methods=['GET'])
 def get_station(station_id):
     """Get detailed accessibility information for a specific station"""
-    # Get stations
-    stations = cache.get('stations_data')
-    if not stations:
-        stations = mta_client.fetch_stations()
-    
-    station = None
-    for s in stations:
-        if s['station_id'] == station_id:
-            station = s
-            break
+    station = mta_client.get_station(station_id)
     
     if not station:
         return jsonify(format_error(f'Station {station_id} not found', 404))
     
     # Get equipment for this station
-    equipment = cache.get('equipment_data')
-    if not equipment:
-        equipment = mta_client.fetch_equipment_status()
-    
-    station_elevators = [e for e in equipment.get('elevators', []) 
-                        if e['station_id'] == station_id]
-    station_escalators = [e for e in equipment.get('escalators', []) 
-                         if e['station_id'] == station_id]
+    equipment = mta_client.get_equipment_status()
     
-    working_elevators = [e for e in station_elevators if e['status'] == 'active']
-    working_escalators = [e for e in station_escalators if e['status'] == 'active']
+    counts = mta_client.get_station_counts(equipment, station_id)
     
     station_data = {
         **station,
         'equipment': {
-            'elevators': station_elevators,
-            'escalators': station_escalators,
-            'working_elevators_count': len(working_elevators),
-            'working_escalators_count': len(working_escalators)
+            'elevators': equipment.get('elevators_by_station', {}).get(station_id, []),
+            'escalators': equipment.get('escalators_by_station', {}).get(station_id, []),
+            'working_elevators_count': counts['working_elevators'],
+            'working_escalators_count': counts['working_escalators']
         },
-        'is_currently_accessible': len(working_elevators) > 0
+        'is_currently_accessible': counts['working_elevators'] > 0
     }
     
     return jsonify(format_response(station_data))
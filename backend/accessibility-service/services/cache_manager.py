@@ -10,6 +10,7 @@ class CacheManager:
         self.ttl = ttl  # Time to live in seconds
         self.cache = {}
         self.lock = threading.Lock()
+        self.refreshing = set()  # Keys with a background refresh in progress
     
     def get(self, key):
         """Get value from cache if not expired"""
@@ -18,19 +19,76 @@ class CacheManager:
                 entry = self.cache[key]
                 if datetime.utcnow() < entry['expires_at']:
                     return entry['data']
-                else:
+                elif datetime.utcnow() >= entry['stale_until']:
                     # Remove expired entry
                     del self.cache[key]
             return None
     
-    def set(self, key, data, ttl=None):
-        """Set value in cache with expiration"""
+    def get_stale(self, key):
+        """Get value even if past its TTL, as long as it is within its stale window"""
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and datetime.utcnow() < entry['stale_until']:
+                return entry['data']
+            return None
+    
+    def get_age(self, key):
+        """
+        Get the age of a cached value
+        Returns (age_seconds, is_stale), or (None, False) if not cached
+        """
+        with self.lock:
+            entry = self.cache.get(key)
+            if not entry:
+                return None, False
+            now = datetime.utcnow()
+            return (now - entry['cached_at']).total_seconds(), now >= entry['expires_at']
+    
+    def get_or_refresh(self, key, loader):
+        """
+        Stale-while-revalidate lookup
+    
+        Fresh values are returned as-is. Stale values (past TTL but within
+        stale_ttl) are returned immediately while loader() runs once in a
+        background thread. On a full miss, loader() runs inline.
+        loader is expected to store its result in this cache, as the
+        MTAClient fetch methods do.
+        """
+        data = self.get(key)
+        if data is not None:
+            return data
+    
+        data = self.get_stale(key)
+        if data is None:
+            return loader()
+    
+        with self.lock:
+            if key in self.refreshing:
+                return data
+            self.refreshing.add(key)
+    
+        def refresh():
+            try:
+                loader()
+            except Exception as e:
+                print(f"Background refresh failed for {key}: {str(e)}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+    
+        threading.Thread(target=refresh, daemon=True).start()
+        return data
+    
+    def set(self, key, data, ttl=None, stale_ttl=0):
+        """Set value in cache with expiration, kept stale_ttl seconds longer for get_or_refresh"""
         cache_ttl = ttl if ttl is not None else self.ttl
+        now = datetime.utcnow()
         with self.lock:
             self.cache[key] = {
                 'data': data,
-                'expires_at': datetime.utcnow() + timedelta(seconds=cache_ttl),
-                'cached_at': datetime.utcnow()
+                'expires_at': now + timedelta(seconds=cache_ttl),
+                'stale_until': now + timedelta(seconds=cache_ttl + stale_ttl),
+                'cached_at': now
             }
     
     def delete(self, key):
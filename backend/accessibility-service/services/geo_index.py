@@ -0,0 +1,171 @@
+"""
+Vectorized station proximity search
+Station coordinates are kept as NumPy arrays in radians and bucketed into a grid
+"""
+import threading
+import numpy as np
+
+EARTH_RADIUS_KM = 6371
+
+
+# GeoIndex is copied verbatim from transit-service, which owns its tests
+# (including a check that this copy hasn't drifted). Each service is
+# installed and deployed on its own, so there is no shared package to import.
+class GeoIndex:
+    """
+    Grid-bucketed coordinate matrix for vectorized Haversine queries
+    
+    Latitudes and longitudes are converted to radians and cos(lat) is
+    precomputed once at build time. Points are also bucketed into a grid of
+    CELL_SIZE-degree cells, so a radius query only computes distances for
+    points in the cells overlapping its bounding box rather than for every
+    point in the index.
+    """
+    CELL_SIZE = 0.01  # Degrees; about 1.1 km north-south, 0.85 km east-west in NYC
+    KM_PER_DEGREE = 111.2
+    MAX_RADIUS_KM = 10  # Largest search radius accepted from API callers
+    MAX_LIMIT = 200  # Most results per search accepted from API callers
+    
+    def __init__(self, items, coordinates):
+        """
+        Args:
+            items: Payloads returned by queries (e.g. station dicts)
+            coordinates: (latitude, longitude) in degrees for each item
+        """
+        self.items = list(items)
+        degrees = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        radians = np.radians(degrees)
+        self.lat = radians[:, 0]
+        self.lon = radians[:, 1]
+        self.cos_lat = np.cos(self.lat)
+    
+        cells = {}
+        rows = np.floor(degrees[:, 0] / self.CELL_SIZE).astype(np.int64)
+        cols = np.floor(degrees[:, 1] / self.CELL_SIZE).astype(np.int64)
+        for i, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            cells.setdefault(cell, []).append(i)
+        self.cells = {cell: np.array(members, dtype=np.int64) for cell, members in cells.items()}
+    
+    def __len__(self):
+        return len(self.items)
+    
+    @staticmethod
+    def point_error(lat, lon):
+        """Why a caller's (lat, lon) can't be queried, or None; 0.0 is a valid coordinate"""
+        if lat is None or lon is None:
+            return 'Latitude and longitude required'
+        # Comparisons with NaN are False, so non-finite values fail here too
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return 'Latitude must be within [-90, 90] and longitude within [-180, 180]'
+        return None
+    
+    @classmethod
+    def search_error(cls, radius, limit=None):
+        """Why a caller's radius (km) and result limit can't be queried, or None"""
+        if radius is None or not 0 < radius <= cls.MAX_RADIUS_KM:
+            return f'radius must be greater than 0 and at most {cls.MAX_RADIUS_KM} km'
+        if limit is not None and not 0 < limit <= cls.MAX_LIMIT:
+            return f'limit must be between 1 and {cls.MAX_LIMIT}'
+        return None
+    
+    def candidates(self, lat, lon, radius):
+        """Indexes of points in the grid cells overlapping a radius-km box around a point"""
+        dlat = radius / self.KM_PER_DEGREE
+        dlon = radius / (self.KM_PER_DEGREE * max(np.cos(np.radians(lat)), 0.01))
+        row_min = int(np.floor((lat - dlat) / self.CELL_SIZE))
+        row_max = int(np.floor((lat + dlat) / self.CELL_SIZE))
+        col_min = int(np.floor((lon - dlon) / self.CELL_SIZE))
+        col_max = int(np.floor((lon + dlon) / self.CELL_SIZE))
+    
+        # A box wider than the occupied grid is cheaper to filter than to walk
+        if (row_max - row_min + 1) * (col_max - col_min + 1) > len(self.cells):
+            buckets = [
+                members for (row, col), members in self.cells.items()
+                if row_min <= row <= row_max and col_min <= col <= col_max
+            ]
+        else:
+            buckets = [
+                self.cells[(row, col)]
+                for row in range(row_min, row_max + 1)
+                for col in range(col_min, col_max + 1)
+                if (row, col) in self.cells
+            ]
+    
+        if not buckets:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(buckets)
+    
+    def distances(self, lat, lon, indexes=None):
+        """Distance in km from one point to the indexed points (all, or just indexes)"""
+        if indexes is None:
+            indexes = slice(None)
+        lat = np.radians(lat)
+        lon = np.radians(lon)
+        a = (np.sin((self.lat[indexes] - lat) / 2) ** 2 +
+             np.cos(lat) * self.cos_lat[indexes] * np.sin((self.lon[indexes] - lon) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    
+    def within(self, lat, lon, radius, limit=None):
+        """Items within radius km of a point, nearest first, as (item, distance) pairs"""
+        indexes = self.candidates(lat, lon, radius)
+        distances = self.distances(lat, lon, indexes)
+        inside = distances <= radius
+        return self._select(indexes[inside], distances[inside], limit)
+    
+    def nearest(self, lat, lon, k):
+        """The k items nearest to a point, nearest first, as (item, distance) pairs"""
+        if k <= 0 or not self.items:
+            return []
+    
+        # Double the search radius until it holds k points; the k nearest
+        # within a radius are then the k nearest overall
+        radius = self.CELL_SIZE * self.KM_PER_DEGREE
+        while True:
+            found = self.within(lat, lon, radius, limit=k)
+            if len(found) >= min(k, len(self.items)):
+                return found
+            radius *= 2
+    
+    def batch_within(self, points, radius, limit=None):
+        """within() for many (lat, lon) points at once, one result list per point"""
+        return [self.within(lat, lon, radius, limit=limit) for lat, lon in points]
+    
+    def _select(self, indexes, distances, limit):
+        # Partial sort when only the closest few are wanted
+        if limit is not None and limit < len(indexes):
+            if limit <= 0:
+                return []
+            closest = np.argpartition(distances, limit - 1)[:limit]
+            indexes, distances = indexes[closest], distances[closest]
+    
+        order = np.argsort(distances, kind='stable')
+        return [(self.items[i], float(d)) for i, d in zip(indexes[order].tolist(), distances[order].tolist())]
+
+
+class StationIndex:
+    """
+    GeoIndex over the MTA stations list, rebuilt when the list changes
+    
+    MTAClient replaces the cached stations list on every refresh, so the
+    index is rebuilt whenever it is handed a different list object.
+    """
+    def __init__(self):
+        self._index = None
+        self._source = None
+        self.lock = threading.Lock()
+    
+    def get(self, stations):
+        """Get the GeoIndex for this stations list, rebuilding it if the list changed"""
+        with self.lock:
+            if self._index is None or stations is not self._source:
+                located = [s for s in stations if s.get('latitude') and s.get('longitude')]
+                self._index = GeoIndex(
+                    located,
+                    [(s['latitude'], s['longitude']) for s in located]
+                )
+                self._source = stations
+            return self._index
+
+
+# Global station index instance
+station_index = StationIndex()
\ No newline at end of file
@@ -6,6 +6,20 @@ import csv
 from io import StringIO
 from datetime import datetime
 from services.cache_manager import cache
+from services.outage_history import outage_history
+from config import Config
+from collections import deque
+from itertools import islice
+import threading
+
+# Counts for a station with no equipment in the feed
+EMPTY_STATION_COUNTS = {
+    'elevators': 0,
+    'working_elevators': 0,
+    'outage_elevators': 0,
+    'escalators': 0,
+    'working_escalators': 0
+}
 
 class MTAClient:
     def __init__(self):
@@ -15,6 +29,14 @@ class MTAClient:
         self.session.headers.update({
             'User-Agent': 'AccessibilityService/1.0'
         })
+        self._station_index = None
+        self._station_index_source = None  # Stations list the index was built from
+        self.lock = threading.Lock()
+        
+        # Outage change feed, diffed between consecutive equipment fetches
+        self._last_equipment = None
+        self.changelog = deque(maxlen=Config.EQUIPMENT_CHANGELOG_SIZE)
+        self.sequence = 0
     
     def fetch_equipment_status(self):
         """
@@ -28,9 +50,10 @@ class MTAClient:
             
             data = response.json()
             equipment_data = self._parse_equipment_data(data)
+            self._record_changes(equipment_data)
             
             # Cache the results
-            cache.set('equipment_data', equipment_data, ttl=600)
+            cache.set('equipment_data', equipment_data, ttl=600, stale_ttl=1800)
             print(f"[{datetime.utcnow()}] Equipment data fetched successfully")
             
             return equipment_data
@@ -38,11 +61,121 @@ class MTAClient:
         except requests.exceptions.RequestException as e:
             print(f"Error fetching equipment data: {str(e)}")
             # Return cached data if available
-            cached = cache.get('equipment_data')
+            cached = cache.get_stale('equipment_data')
             if cached:
                 print("Returning cached equipment data")
                 return cached
-            return {'elevators': [], 'escalators': [], 'error': str(e)}
+            equipment_data = self._build_equipment_data([], [])
+            equipment_data['error'] = str(e)
+            return equipment_data
+    
+    def _record_changes(self, equipment_data):
+        """
+        Diff a new equipment payload against the previous one by equipment ID
+        Appends outage_started / outage_ended events to the changelog and
+        the persistent outage history
+        The first payload is the baseline: it produces no changelog events and
+        only reconciles the stored history with the current outages
+        """
+        with self.lock:
+            previous = self._last_equipment
+            self._last_equipment = equipment_data
+            if previous is None:
+                outage_history.sync_baseline(equipment_data)
+                return
+            
+            first_new = self.sequence + 1
+            
+            now = datetime.utcnow().isoformat()
+            for kind in ('elevators', 'escalators'):
+                old_by_id = previous.get(f'{kind}_by_id', {})
+                new_by_id = equipment_data.get(f'{kind}_by_id', {})
+                
+                for equipment_id, equipment in new_by_id.items():
+                    old = old_by_id.get(equipment_id)
+                    was_out = old is not None and old['status'] == 'outage'
+                    is_out = equipment['status'] == 'outage'
+                    if is_out and not was_out:
+                        self._append_change('outage_started', kind, equipment, old, now)
+                    elif was_out and not is_out:
+                        self._append_change('outage_ended', kind, equipment, old, now)
+                
+                # Equipment dropped from the feed while out is treated as returned
+                for equipment_id, old in old_by_id.items():
+                    if equipment_id not in new_by_id and old['status'] == 'outage':
+                        self._append_change('outage_ended', kind, None, old, now)
+            
+            new_events = [e for e in self.changelog if e['sequence'] >= first_new]
+            outage_history.record_events(new_events)
+    
+    def _append_change(self, event_type, kind, equipment, old, timestamp):
+        """Add one event to the changelog (caller holds the lock)"""
+        current = equipment or old
+        self.sequence += 1
+        self.changelog.append({
+            'sequence': self.sequence,
+            'type': event_type,
+            'equipment_type': kind[:-1],
+            'equipment_id': current['id'],
+            'station_id': current['station_id'],
+            'station_name': current['station_name'],
+            'location': current['location'],
+            'status': equipment['status'] if equipment else None,
+            'previous_status': old['status'] if old else None,
+            'reason': current.get('reason', ''),
+            'estimated_return': current.get('estimated_return'),
+            'timestamp': timestamp
+        })
+    
+    def get_changes(self, since=0):
+        """
+        Get outage events with a sequence number greater than since
+        Returns (events, latest_sequence, complete) where complete is False
+        when events after since have already been dropped from the changelog
+        """
+        with self.lock:
+            # Sequence numbers in the changelog are contiguous, so slice by offset
+            oldest = self.changelog[0]['sequence'] if self.changelog else self.sequence + 1
+            start = max(since - oldest + 1, 0)
+            events = list(islice(self.changelog, start, None))
+            # A since ahead of the log (e.g. from before a restart) is also incomplete
+            complete = oldest - 1 <= since <= self.sequence
+            return events, self.sequence, complete
+    
+    def get_equipment_status(self):
+        """
+        Get equipment data from cache, serving stale data while it refreshes
+        Only fetches inline when nothing usable is cached
+        """
+        return cache.get_or_refresh('equipment_data', self.fetch_equipment_status)
+    
+    def get_stations(self):
+        """Get stations from cache, serving stale data while it refreshes"""
+        return cache.get_or_refresh('stations_data', self.fetch_stations)
+    
+    def get_station_index(self):
+        """
+        Get stations keyed by station ID plus station totals
+        Rebuilt only when the cached stations list is replaced
+        """
+        stations = self.get_stations() or []
+        with self.lock:
+            if self._station_index is None or stations is not self._station_index_source:
+                self._station_index = {
+                    'by_id': {s['station_id']: s for s in stations},
+                    'total_stations': len(stations),
+                    'ada_compliant_stations': sum(1 for s in stations if s.get('ada_compliant'))
+                }
+                self._station_index_source = stations
+            return self._station_index
+    
+    def get_station(self, station_id):
+        """Look up one station by ID, or None"""
+        return self.get_station_index()['by_id'].get(station_id)
+    
+    def get_station_counts(self, equipment, station_id):
+        """Precomputed elevator/escalator counts for a station"""
+        return equipment.get('station_counts', {}).get(station_id, EMPTY_STATION_COUNTS)
     
     def _parse_equipment_data(self, data):
         """Parse MTA equipment JSON response"""
@@ -81,12 +214,58 @@ class MTAClient:
                     equipment_info['direction'] = item.get('direction', 'bidirectional')
                     escalators.append(equipment_info)
         
+        return self._build_equipment_data(elevators, escalators)
+    
+    def _build_equipment_data(self, elevators, escalators):
+        """
+        Bundle equipment lists with lookup indexes built once per fetch
+        Indexes: by station, by ID and by status, plus per-station counts
+        and system-wide totals, so endpoints never scan the full lists
+        """
+        station_counts = {}
+        
+        def index(equipment_list, kind):
+            by_station = {}
+            by_id = {}
+            by_status = {}
+            for e in equipment_list:
+                by_station.setdefault(e['station_id'], []).append(e)
+                by_id.setdefault(e['id'], e)
+                by_status.setdefault(e['status'], []).append(e)
+                
+                counts = station_counts.get(e['station_id'])
+                if counts is None:
+                    counts = station_counts[e['station_id']] = dict(EMPTY_STATION_COUNTS)
+                counts[kind] += 1
+                if e['status'] == 'active':
+                    counts[f'working_{kind}'] += 1
+                elif e['status'] == 'outage' and kind == 'elevators':
+                    counts['outage_elevators'] += 1
+            return by_station, by_id, by_status
+        
+        elevators_by_station, elevators_by_id, elevators_by_status = index(elevators, 'elevators')
+        escalators_by_station, escalators_by_id, escalators_by_status = index(escalators, 'escalators')
+        
         return {
             'elevators': elevators,
             'escalators': escalators,
             'last_updated': datetime.utcnow().isoformat(),
             'total_elevators': len(elevators),
-            'total_escalators': len(escalators)
+            'total_escalators': len(escalators),
+            'elevators_by_station': elevators_by_station,
+            'escalators_by_station': escalators_by_station,
+            'elevators_by_id': elevators_by_id,
+            'escalators_by_id': escalators_by_id,
+            'elevators_by_status': elevators_by_status,
+            'escalators_by_status': escalators_by_status,
+            'station_counts': station_counts,
+            'totals': {
+                'elevators': len(elevators),
+                'active_elevators': len(elevators_by_status.get('active', [])),
+                'outage_elevators': len(elevators_by_status.get('outage', [])),
+                'escalators': len(escalators),
+                'active_escalators': len(escalators_by_status.get('active', []))
+            }
         }
     
     def _parse_status(self, status_value):
@@ -114,7 +293,7 @@ class MTAClient:
             stations = self._parse_stations_csv(response.text)
             
             # Cache the results
-            cache.set('stations_data', stations, ttl=3600)  # Cache for 1 hour
+            cache.set('stations_data', stations, ttl=3600, stale_ttl=3600)  # Cache for 1 hour
             print(f"[{datetime.utcnow()}] Stations data fetched successfully: {len(stations)} stations")
             
             return stations
@@ -122,7 +301,7 @@ class MTAClient:
         except requests.exceptions.RequestException as e:
             print(f"Error fetching stations data: {str(e)}")
             # Return cached data if available
-            cached = cache.get('stations_data')
+            cached = cache.get_stale('stations_data')
             if cached:
                 print("Returning cached stations data")
                 return cached
@@ -144,6 +323,7 @@ class MTAClient:
                 'station_id': station_id,
                 'station_name': row.get('Stop Name', 'Unknown'),
                 'borough': row.get('Borough', 'Unknown'),
+                'line': row.get('Line', ''),
                 'lines': row.get('Daytime Routes', '').split(),
                 'latitude': float(row.get('GTFS Latitude', 0)) if row.get('GTFS Latitude') else None,
                 'longitude': float(row.get('GTFS Longitude', 0)) if row.get('GTFS Longitude') else None,
@@ -0,0 +1,178 @@
+"""
+Append-only equipment outage history
+Outage transitions are stored in SQLite; rolling uptime is kept up to date in memory
+"""
+import os
+import sqlite3
+import threading
+import time
+from config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outage_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    equipment_id TEXT NOT NULL,
+    equipment_type TEXT NOT NULL,
+    station_id TEXT,
+    event_type TEXT NOT NULL,
+    occurred_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_outage_events_equipment_time ON outage_events (equipment_id, occurred_at);
+CREATE INDEX IF NOT EXISTS ix_outage_events_time ON outage_events (occurred_at);
+"""
+
+# Each outage_started row paired with the next event for the same equipment
+# (its outage_ended, or NULL while still out)
+OUTAGE_INTERVALS = """
+SELECT equipment_id, equipment_type, station_id, occurred_at AS started_at, ended_at
+FROM (
+    SELECT equipment_id, equipment_type, station_id, event_type, occurred_at,
+           LEAD(occurred_at) OVER (PARTITION BY equipment_id ORDER BY occurred_at, id) AS ended_at
+    FROM outage_events
+)
+WHERE event_type = 'outage_started'
+"""
+
+# Seconds of downtime per equipment inside [window_start, now]
+DOWNTIME_SINCE = f"""
+SELECT equipment_id, equipment_type, station_id,
+       SUM(MIN(COALESCE(ended_at, :now), :now) - MAX(started_at, :window_start)) AS downtime
+FROM ({OUTAGE_INTERVALS})
+WHERE COALESCE(ended_at, :now) > :window_start AND started_at < :now
+GROUP BY equipment_id
+"""
+
+class OutageHistory:
+    """
+    Outage transitions for every elevator and escalator
+    
+    Rows are only ever appended. The outage intervals overlapping the
+    longest reliability window are also kept in memory and updated as each
+    transition is recorded, so rolling uptime never rescans the table.
+    """
+    def __init__(self, db_path, max_window_days):
+        self.db_path = db_path
+        self.max_window = max_window_days * 86400
+        self.lock = threading.Lock()
+        self._conn = None
+        self._open = {}  # equipment_id -> outage start (epoch seconds)
+        self._closed = {}  # equipment_id -> list of (start, end) inside the longest window
+        self._equipment = {}  # equipment_id -> (equipment_type, station_id)
+    
+    def _connect(self):
+        """Open the history database and load recent intervals (caller holds the lock)"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            self._conn = conn
+    
+            window_start = time.time() - self.max_window
+            for equipment_id, equipment_type, station_id, started_at, ended_at in conn.execute(
+                f"{OUTAGE_INTERVALS} AND (ended_at IS NULL OR ended_at > ?)", (window_start,)
+            ):
+                self._equipment[equipment_id] = (equipment_type, station_id)
+                if ended_at is None:
+                    self._open[equipment_id] = started_at
+                else:
+                    self._closed.setdefault(equipment_id, []).append((started_at, ended_at))
+        return self._conn
+    
+    def sync_baseline(self, equipment_data, occurred_at=None):
+        """
+        Reconcile the stored history with a full equipment payload
+        Used for the first payload after startup, when there is nothing to diff
+        against: outages the history doesn't know about are opened, and
+        outages it still has open that have since ended are closed
+        """
+        occurred_at = occurred_at or time.time()
+        with self.lock:
+            self._connect()
+            events = []
+            seen = set()
+            for kind in ('elevators', 'escalators'):
+                for equipment_id, equipment in equipment_data.get(f'{kind}_by_id', {}).items():
+                    seen.add(equipment_id)
+                    is_out = equipment['status'] == 'outage'
+                    if is_out and equipment_id not in self._open:
+                        events.append(('outage_started', kind[:-1], equipment_id, equipment['station_id']))
+                    elif not is_out and equipment_id in self._open:
+                        events.append(('outage_ended', kind[:-1], equipment_id, equipment['station_id']))
+            for equipment_id in self._open:
+                if equipment_id not in seen:
+                    equipment_type, station_id = self._equipment[equipment_id]
+                    events.append(('outage_ended', equipment_type, equipment_id, station_id))
+            self._append(events, occurred_at)
+    
+    def record_events(self, events, occurred_at=None):
+        """Append changelog events (outage_started / outage_ended) to the history"""
+        if not events:
+            return
+        occurred_at = occurred_at or time.time()
+        with self.lock:
+            self._connect()
+            self._append([
+                (e['type'], e['equipment_type'], e['equipment_id'], e['station_id']) for e in events
+            ], occurred_at)
+    
+    def _append(self, events, occurred_at):
+        """Insert events in one transaction and apply them to the in-memory intervals"""
+        if not events:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO outage_events (event_type, equipment_type, equipment_id, station_id, occurred_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(*event, occurred_at) for event in events]
+            )
+    
+        window_start = occurred_at - self.max_window
+        for event_type, equipment_type, equipment_id, station_id in events:
+            self._equipment[equipment_id] = (equipment_type, station_id)
+            if event_type == 'outage_started':
+                self._open[equipment_id] = occurred_at
+            elif equipment_id in self._open:
+                intervals = self._closed.setdefault(equipment_id, [])
+                intervals.append((self._open.pop(equipment_id), occurred_at))
+                # Drop intervals that have aged out of every window
+                self._closed[equipment_id] = [i for i in intervals if i[1] > window_start]
+    
+    def equipment_uptime(self, window_days, now=None):
+        """
+        Uptime percentage over the last window_days for equipment with outages in that window
+        Equipment missing from the result had no downtime (100%)
+        """
+        now = now or time.time()
+        window = min(window_days * 86400, self.max_window)
+        window_start = now - window
+        with self.lock:
+            self._connect()
+            downtime = {}
+            for equipment_id, intervals in self._closed.items():
+                seconds = sum(min(end, now) - max(start, window_start) for start, end in intervals if end > window_start)
+                if seconds > 0:
+                    downtime[equipment_id] = seconds
+            for equipment_id, start in self._open.items():
+                downtime[equipment_id] = downtime.get(equipment_id, 0) + now - max(start, window_start)
+    
+        return {
+            equipment_id: round(max(0.0, 100 - seconds / window * 100), 2)
+            for equipment_id, seconds in downtime.items()
+        }
+    
+    def downtime_since(self, window_start, now=None):
+        """
+        Seconds of downtime per equipment since window_start, in one aggregate query
+        Works for any window, including ones longer than the in-memory intervals
+        Returns dict of equipment_id -> (equipment_type, station_id, downtime_seconds)
+        """
+        now = now or time.time()
+        with self.lock:
+            conn = self._connect()
+            rows = conn.execute(DOWNTIME_SINCE, {'now': now, 'window_start': window_start}).fetchall()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+
+# Global outage history instance
+outage_history = OutageHistory(Config.OUTAGE_HISTORY_DB, Config.RELIABILITY_MAX_WINDOW_DAYS)
\ No newline at end of file
@@ -2,9 +2,10 @@
 Reliability calculation service
 Calculates uptime percentages for equipment and stations
 """
-from datetime import datetime, timedelta
+from datetime import datetime
 from models import db, Elevator, Escalator, StationAccessibility
-from sqlalchemy import func
+from services.outage_history import outage_history
+import time
 
 class ReliabilityService:
     def __init__(self, lookback_days=30):
@@ -13,16 +14,25 @@ class ReliabilityService:
     def calculate_reliability_scores(self):
         """
         Calculate reliability scores for all stations based on equipment uptime
+        Score is the mean elevator uptime over lookback_days from the outage history
         """
         print(f"[{datetime.utcnow()}] Calculating reliability scores...")
         
         try:
             stations = StationAccessibility.query.all()
-            cutoff_date = datetime.utcnow() - timedelta(days=self.lookback_days)
+            window = self.lookback_days * 86400
+            now = time.time()
+            
+            # One query for every elevator instead of one per station
+            elevators_by_station = {}
+            for elevator in Elevator.query.all():
+                elevators_by_station.setdefault(elevator.station_id, []).append(elevator)
+            
+            # Downtime inside the lookback window for all equipment, in one aggregate query
+            downtime = outage_history.downtime_since(now - window, now=now)
             
             for station in stations:
-                # Get all elevators for this station
-                elevators = Elevator.query.filter_by(station_id=station.station_id).all()
+                elevators = elevators_by_station.get(station.station_id)
                 
                 if not elevators:
                     station.reliability_score = 100.0
@@ -30,21 +40,11 @@ class ReliabilityService:
                 
                 total_score = 0
                 for elevator in elevators:
-                    # Calculate uptime based on outage history
-                    # Simplified: if currently in outage, reduce score
-                    if elevator.status == 'outage':
-                        # Calculate how long it's been out
-                        if elevator.outage_start:
-                            outage_hours = (datetime.utcnow() - elevator.outage_start).total_seconds() / 3600
-                            penalty = min(outage_hours * 2, 50)  # Max 50% penalty
-                            total_score += (100 - penalty)
-                        else:
-                            total_score += 70  # Default penalty for unknown outage duration
-                    else:
-                        total_score += 100
+                    _, _, seconds = downtime.get(elevator.id, (None, None, 0))
+                    total_score += max(0.0, 100 - seconds / window * 100)
                 
                 # Average score across all elevators
-                station.reliability_score = total_score / len(elevators) if elevators else 100.0
+                station.reliability_score = total_score / len(elevators)
                 station.last_verified = datetime.utcnow()
             
             db.session.commit()
@@ -55,3 +55,26 @@ class ReliabilityService:
             print(f"Error calculating reliability scores: {str(e)}")
             db.session.rollback()
             return False
+    
+    def get_station_scores(self, equipment, window_days):
+        """
+        Live per-station elevator uptime over the last window_days
+        Reads the in-memory outage intervals, which are updated as each
+        transition arrives, so nothing is recomputed from the full history
+        """
+        uptime = outage_history.equipment_uptime(window_days)
+        
+        scores = {}
+        for station_id, elevators in equipment.get('elevators_by_station', {}).items():
+            values = [uptime.get(e['id'], 100.0) for e in elevators]
+            scores[station_id] = {
+                'station_id': station_id,
+                'uptime_percentage': round(sum(values) / len(values), 2),
+                'elevators': len(values),
+                'elevators_with_downtime': sum(1 for v in values if v < 100.0)
+            }
+        return scores
+
+
+# Global reliability service instance
+reliability_service = ReliabilityService()
\ No newline at end of file
@@ -2,13 +2,18 @@
 Accessible route planning service
 Plans routes using only accessible stations with working equipment
 """
-from services.cache_manager import cache
 from services.mta_client import mta_client
-from utils.helpers import calculate_distance
+from services.geo_index import GeoIndex, station_index
+from services.station_graph import StationGraph
+import threading
 
 class RoutePlannerService:
     def __init__(self):
-        pass
+        self._graph = None
+        self._graph_source = None  # Stations list the graph was built from
+        self._mask = frozenset()
+        self._mask_source = None  # Equipment data the outage mask was built from
+        self.lock = threading.Lock()
     
     def find_accessible_route(self, origin_id, destination_id):
         """
@@ -18,8 +23,8 @@ class RoutePlannerService:
         stations = self._get_stations()
         equipment = self._get_equipment()
         
-        origin = self._find_station(origin_id, stations)
-        destination = self._find_station(destination_id, stations)
+        origin = self._find_station(origin_id)
+        destination = self._find_station(destination_id)
         
         if not origin or not destination:
             return None
@@ -28,6 +33,10 @@ class RoutePlannerService:
         origin_status = self._check_station_accessibility(origin_id, equipment)
         dest_status = self._check_station_accessibility(destination_id, equipment)
         
+        # Fastest step-free path, avoiding transfers blocked by elevator outages
+        graph, blocked = self._get_graph(stations, equipment)
+        path = graph.shortest_path(origin_id, destination_id, blocked)
+        
         route = {
             'origin': {
                 **origin,
@@ -37,10 +46,18 @@ class RoutePlannerService:
                 **destination,
                 'accessibility': dest_status
             },
-            'route_fully_accessible': origin_status['is_accessible'] and dest_status['is_accessible'],
+            'path': path,
+            'route_fully_accessible': (
+                origin_status['is_accessible'] and dest_status['is_accessible'] and path is not None
+            ),
             'recommendations': []
         }
         
+        if origin_status['is_accessible'] and dest_status['is_accessible'] and path is None:
+            route['recommendations'].append(
+                'No step-free path connects these stations with the current elevator outages'
+            )
+        
         # Add alternatives if needed
         if not origin_status['is_accessible']:
             route['origin_alternatives'] = self.find_nearby_accessible_stations(
@@ -56,77 +73,75 @@ class RoutePlannerService:
     
     def find_nearby_accessible_stations(self, exclude_station_id, lat, lon, max_distance=0.5):
         """Find nearby accessible stations within max_distance (km)"""
-        if not lat or not lon:
+        if GeoIndex.point_error(lat, lon):
             return []
         
         stations = self._get_stations()
         equipment = self._get_equipment()
         nearby = []
         
-        for station in stations:
+        # Candidates come back nearest first from the vectorized index, so
+        # accessibility only needs checking until the top 5 are found
+        for station, distance in station_index.get(stations).within(lat, lon, max_distance):
             if station['station_id'] == exclude_station_id:
                 continue
             
-            s_lat = station.get('latitude')
-            s_lon = station.get('longitude')
-            
-            if not s_lat or not s_lon:
-                continue
-            
-            distance = calculate_distance(lat, lon, s_lat, s_lon)
+            accessibility = self._check_station_accessibility(station['station_id'], equipment)
             
-            if distance <= max_distance:
-                accessibility = self._check_station_accessibility(station['station_id'], equipment)
-                
-                if accessibility['is_accessible']:
-                    nearby.append({
-                        'station': station,
-                        'accessibility': accessibility,
-                        'distance_km': round(distance, 2),
-                        'walking_time_minutes': round(distance * 12)  # ~12 min per km
-                    })
+            if accessibility['is_accessible']:
+                nearby.append({
+                    'station': station,
+                    'accessibility': accessibility,
+                    'distance_km': round(distance, 2),
+                    'walking_time_minutes': round(distance * 12)  # ~12 min per km
+                })
+                if len(nearby) == 5:
+                    break
         
-        # Sort by distance
-        nearby.sort(key=lambda x: x['distance_km'])
-        return nearby[:5]  # Return top 5
+        return nearby
+    
+    def _get_graph(self, stations, equipment):
+        """
+        Get the station graph and outage mask for the current data
+        The graph is rebuilt only when the stations list is refreshed;
+        a new equipment payload only recomputes the outage mask
+        """
+        with self.lock:
+            if self._graph is None or stations is not self._graph_source:
+                self._graph = StationGraph(stations)
+                self._graph_source = stations
+            if equipment is not self._mask_source:
+                self._mask = StationGraph.outage_mask(equipment)
+                self._mask_source = equipment
+            return self._graph, self._mask
     
     def _get_stations(self):
         """Get stations from cache or fetch from MTA"""
-        stations = cache.get('stations_data')
-        if not stations:
-            stations = mta_client.fetch_stations()
+        stations = mta_client.get_stations()
         return stations or []
     
     def _get_equipment(self):
         """Get equipment data from cache or fetch from MTA"""
-        equipment = cache.get('equipment_data')
-        if not equipment:
-            equipment = mta_client.fetch_equipment_status()
+        equipment = mta_client.get_equipment_status()
         return equipment
     
-    def _find_station(self, station_id, stations):
+    def _find_station(self, station_id):
         """Find station by ID"""
-        for station in stations:
-            if station['station_id'] == station_id:
-                return station
-        return None
+        return mta_client.get_station(station_id)
     
     def _check_station_accessibility(self, station_id, equipment):
         """Check if station is currently accessible"""
-        elevators = [e for e in equipment.get('elevators', []) 
-                     if e['station_id'] == station_id]
-        
-        working_elevators = [e for e in elevators if e['status'] == 'active']
-        outage_elevators = [e for e in elevators if e['status'] == 'outage']
+        elevators = equipment.get('elevators_by_station', {}).get(station_id, [])
+        counts = mta_client.get_station_counts(equipment, station_id)
         
         return {
-            'is_accessible': len(working_elevators) > 0,
-            'has_elevators': len(elevators) > 0,
-            'total_elevators': len(elevators),
-            'working_elevators': len(working_elevators),
-            'outage_elevators': len(outage_elevators),
+            'is_accessible': counts['working_elevators'] > 0,
+            'has_elevators': counts['elevators'] > 0,
+            'total_elevators': counts['elevators'],
+            'working_elevators': counts['working_elevators'],
+            'outage_elevators': counts['outage_elevators'],
             'elevators': elevators,
-            'outages': outage_elevators
+            'outages': [e for e in elevators if e['status'] == 'outage']
         }
 
 
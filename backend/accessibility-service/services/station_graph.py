@@ -0,0 +1,227 @@
+"""
+In-memory subway graph for step-free route planning
+Built from Stations.csv: Line and Daytime Routes give track links, Complex ID gives transfers
+"""
+import heapq
+from itertools import count
+from utils.helpers import calculate_distance
+
+TRAIN_SPEED_KMH = 30  # Average running speed between stops
+DWELL_MINUTES = 0.5  # Time stopped at each station
+SAME_PLATFORM_TRANSFER_MINUTES = 3  # Switching routes without leaving the platform
+COMPLEX_TRANSFER_MINUTES = 5  # Walking between platforms of a station complex
+MAX_SEGMENT_LINK_KM = 1.5  # Max gap when joining one route's runs across lines
+
+class StationGraph:
+    """
+    Station graph with one node per (station_id, route) pair
+    
+    Ride edges join consecutive stations on the same Line that share a
+    route. A route's runs on different lines are joined at their closest
+    ends. Route changes on a platform are always step-free. Transfers between
+    platforms of a complex are only added when both platforms are ADA
+    compliant, and they are skipped at query time when an elevator outage
+    blocks either platform (see outage_mask).
+    """
+    def __init__(self, stations):
+        self.stations = {s['station_id']: s for s in stations}
+        self.edges = {}  # node -> list of (node, minutes, transfer_station_ids or None)
+    
+        self._add_ride_edges(stations)
+        self._add_transfer_edges(stations)
+    
+    def _add_edge(self, a, b, minutes, via=None):
+        self.edges.setdefault(a, []).append((b, minutes, via))
+        self.edges.setdefault(b, []).append((a, minutes, via))
+    
+    def _ride_minutes(self, a, b):
+        distance = calculate_distance(
+            self.stations[a].get('latitude'), self.stations[a].get('longitude'),
+            self.stations[b].get('latitude'), self.stations[b].get('longitude')
+        )
+        if distance == float('inf'):
+            distance = 1.0  # Typical stop spacing when coordinates are missing
+        return distance / TRAIN_SPEED_KMH * 60 + DWELL_MINUTES
+    
+    def _add_ride_edges(self, stations):
+        """Link consecutive CSV rows on the same line, then join each route's runs"""
+        segments = {}  # route -> list of station ID runs
+        previous = None
+        for station in stations:
+            station_id = station['station_id']
+            for route in station.get('lines', []):
+                runs = segments.setdefault(route, [])
+                if (previous and route in previous.get('lines', [])
+                        and previous.get('line') and previous.get('line') == station.get('line')):
+                    self._add_edge(
+                        (previous['station_id'], route), (station_id, route),
+                        self._ride_minutes(previous['station_id'], station_id)
+                    )
+                    runs[-1].append(station_id)
+                else:
+                    runs.append([station_id])
+                self.edges.setdefault((station_id, route), [])
+            previous = station
+    
+        # A route changing lines (e.g. the A from 8 Av onto Fulton St) shows
+        # up as separate runs; join each run end to the nearest other run end
+        for route, runs in segments.items():
+            ends = [(i, run[0]) for i, run in enumerate(runs)] + [(i, run[-1]) for i, run in enumerate(runs)]
+            for i, end in ends:
+                best = None
+                for j, other in ends:
+                    if j == i:
+                        continue
+                    distance = calculate_distance(
+                        self.stations[end].get('latitude'), self.stations[end].get('longitude'),
+                        self.stations[other].get('latitude'), self.stations[other].get('longitude')
+                    )
+                    if distance <= MAX_SEGMENT_LINK_KM and (best is None or distance < best[0]):
+                        best = (distance, other)
+                if best and (best[1], route) not in [n for n, _, _ in self.edges[(end, route)]]:
+                    self._add_edge((end, route), (best[1], route), self._ride_minutes(end, best[1]))
+    
+    def _add_transfer_edges(self, stations):
+        """Add same-platform route changes and step-free transfers within complexes"""
+        complexes = {}
+        for station in stations:
+            routes = station.get('lines', [])
+            for i, route in enumerate(routes):
+                for other in routes[i + 1:]:
+                    self._add_edge(
+                        (station['station_id'], route), (station['station_id'], other),
+                        SAME_PLATFORM_TRANSFER_MINUTES
+                    )
+            if station.get('complex_id') and routes:
+                complexes.setdefault(station['complex_id'], []).append(station)
+    
+        for members in complexes.values():
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    if a['station_id'] == b['station_id']:
+                        continue
+                    # Elevator-less platforms can't be part of a step-free transfer
+                    if not (a.get('ada_compliant') and b.get('ada_compliant')):
+                        continue
+                    via = (a['station_id'], b['station_id'])
+                    for route_a in a['lines']:
+                        for route_b in b['lines']:
+                            self._add_edge(
+                                (a['station_id'], route_a), (b['station_id'], route_b),
+                                COMPLEX_TRANSFER_MINUTES, via
+                            )
+    
+    @staticmethod
+    def outage_mask(equipment):
+        """
+        Station IDs made inaccessible by current outages
+        All of the station's elevators are out of service
+        """
+        return frozenset(
+            station_id for station_id, counts in equipment.get('station_counts', {}).items()
+            if counts['elevators'] and not counts['working_elevators']
+        )
+    
+    def is_step_free(self, station_id, blocked):
+        """Whether a station can be entered, exited or transferred at without stairs"""
+        station = self.stations.get(station_id)
+        return bool(station and station.get('ada_compliant') and station_id not in blocked)
+    
+    def shortest_path(self, origin_id, destination_id, blocked=frozenset()):
+        """
+        Fastest step-free path between two stations (A* with a haversine heuristic)
+    
+        Returns dict with total_minutes, transfers and legs, or None when
+        either end isn't step-free or no step-free path exists
+        """
+        if not (self.is_step_free(origin_id, blocked) and self.is_step_free(destination_id, blocked)):
+            return None
+    
+        destination = self.stations[destination_id]
+    
+        def heuristic(station_id):
+            # Straight-line travel at train speed never overestimates
+            station = self.stations[station_id]
+            distance = calculate_distance(
+                station.get('latitude'), station.get('longitude'),
+                destination.get('latitude'), destination.get('longitude')
+            )
+            return 0 if distance == float('inf') else distance / TRAIN_SPEED_KMH * 60
+    
+        tie = count()
+        best = {}
+        came_from = {}
+        heap = []
+        for route in self.stations[origin_id].get('lines', []):
+            node = (origin_id, route)
+            best[node] = 0
+            came_from[node] = None
+            heapq.heappush(heap, (heuristic(origin_id), 0, next(tie), node))
+    
+        while heap:
+            _, minutes, _, node = heapq.heappop(heap)
+            if minutes > best.get(node, float('inf')):
+                continue
+            if node[0] == destination_id:
+                return self._build_path(node, came_from, minutes)
+    
+            for neighbor, cost, via in self.edges.get(node, []):
+                if via and not (self.is_step_free(via[0], blocked) and self.is_step_free(via[1], blocked)):
+                    continue
+                total = minutes + cost
+                if total < best.get(neighbor, float('inf')):
+                    best[neighbor] = total
+                    came_from[neighbor] = (node, via)
+                    heapq.heappush(heap, (total + heuristic(neighbor[0]), total, next(tie), neighbor))
+    
+        return None
+    
+    def _station_summary(self, station_id):
+        station = self.stations[station_id]
+        return {
+            'station_id': station_id,
+            'station_name': station.get('station_name'),
+            'complex_id': station.get('complex_id')
+        }
+    
+    def _build_path(self, node, came_from, minutes):
+        """Turn the A* parent chain into legs, one per route ridden"""
+        nodes = [node]
+        rides = []  # Whether each step along the path is a ride (not a transfer)
+        while came_from[node] is not None:
+            previous, via = came_from[node]
+            rides.append(via is None and previous[0] != node[0])
+            nodes.append(previous)
+            node = previous
+        nodes.reverse()
+        rides.reverse()
+    
+        legs = []
+        leg_start = nodes[0]
+        stops = 0
+        for previous, current, ride in zip(nodes, nodes[1:], rides):
+            if ride:
+                stops += 1
+                continue
+            # Route change: close the current leg (skip legs with no ride)
+            if stops:
+                legs.append(self._leg(leg_start, previous, stops))
+            leg_start = current
+            stops = 0
+        if stops:
+            legs.append(self._leg(leg_start, nodes[-1], stops))
+    
+        return {
+            'total_minutes': round(minutes, 1),
+            'transfers': max(len(legs) - 1, 0),
+            'legs': legs
+        }
+    
+    def _leg(self, start, end, stops):
+        return {
+            'route': start[1],
+            'from': self._station_summary(start[0]),
+            'to': self._station_summary(end[0]),
+            'stops': stops
+        }
+    
\ No newline at end of file
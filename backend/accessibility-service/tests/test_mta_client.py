@@ -0,0 +1,78 @@
+from collections import deque
+import pytest
+import services.mta_client as mta_client_module
+from services.mta_client import MTAClient
+from services.outage_history import OutageHistory
+
+
+def elevator(equipment_id, status):
+    return {
+        'id': equipment_id, 'station_id': '127', 'station_name': 'Times Sq-42 St',
+        'location': 'Street to mezzanine', 'status': status, 'reason': '', 'estimated_return': None
+    }
+
+
+def payload(*elevators):
+    return {'elevators_by_id': {e['id']: e for e in elevators}, 'escalators_by_id': {}}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(mta_client_module, 'outage_history', OutageHistory(str(tmp_path / 'history.db'), 30))
+    client = MTAClient()
+    client._record_changes(payload(elevator('EL1', 'working'), elevator('EL2', 'working')))
+    return client
+
+
+def sequences(events):
+    return [event['sequence'] for event in events]
+
+
+def test_baseline_payload_records_no_changes(client):
+    assert client.get_changes(0) == ([], 0, True)
+
+
+def test_changes_since_a_sequence_in_the_log(client):
+    client._record_changes(payload(elevator('EL1', 'outage'), elevator('EL2', 'working')))
+    client._record_changes(payload(elevator('EL1', 'working'), elevator('EL2', 'outage')))
+
+    events, latest, complete = client.get_changes(1)
+
+    assert latest == 3 and complete
+    assert sequences(events) == [2, 3]
+    assert {(e['type'], e['equipment_id']) for e in events} == {('outage_ended', 'EL1'), ('outage_started', 'EL2')}
+    assert sequences(client.get_changes(0)[0]) == [1, 2, 3]
+
+
+def test_unchanged_payload_and_caught_up_caller_get_no_events(client):
+    client._record_changes(payload(elevator('EL1', 'outage'), elevator('EL2', 'working')))
+    client._record_changes(payload(elevator('EL1', 'outage'), elevator('EL2', 'working')))
+
+    assert client.get_changes(1) == ([], 1, True)
+
+
+def test_aged_out_sequence_is_incomplete(client):
+    client.changelog = deque(maxlen=3)
+    for i in range(5):
+        status = 'outage' if i % 2 == 0 else 'working'
+        client._record_changes(payload(elevator('EL1', status), elevator('EL2', 'working')))
+
+    events, latest, complete = client.get_changes(1)
+    assert (sequences(events), latest, complete) == ([3, 4, 5], 5, False)
+
+    # Oldest retained event is 3, so a caller at 2 has missed nothing
+    assert client.get_changes(2)[2]
+
+
+def test_sequence_ahead_of_the_log_is_incomplete(client):
+    client._record_changes(payload(elevator('EL1', 'outage'), elevator('EL2', 'working')))
+
+    assert client.get_changes(99) == ([], 1, False)
+
+
+def test_equipment_dropped_while_out_is_returned(client):
+    client._record_changes(payload(elevator('EL1', 'outage'), elevator('EL2', 'working')))
+    client._record_changes(payload(elevator('EL2', 'working')))
+
+    events = client.get_changes(1)[0]
+    assert [(e['type'], e['equipment_id'], e['status']) for e in events] == [('outage_ended', 'EL1', None)]
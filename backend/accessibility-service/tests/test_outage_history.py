@@ -0,0 +1,60 @@
+import time
+import pytest
+from services.outage_history import OutageHistory
+
+DAY = 86400
+NOW = time.time()
+
+
+def event(kind, equipment_id, equipment_type='elevator', station_id='127'):
+    return {'type': f'outage_{kind}', 'equipment_type': equipment_type,
+            'equipment_id': equipment_id, 'station_id': station_id}
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = OutageHistory(str(tmp_path / 'outage_history.db'), max_window_days=30)
+    # EL1 straddles the start of a one-day window, EL2 ended inside it and
+    # ES1 is still out
+    history.record_events([event('started', 'EL1')], occurred_at=NOW - DAY - 3600)
+    history.record_events([event('ended', 'EL1')], occurred_at=NOW - DAY + 3600)
+    history.record_events([event('started', 'EL2')], occurred_at=NOW - 3600)
+    history.record_events([event('ended', 'EL2')], occurred_at=NOW - 1800)
+    history.record_events([event('started', 'ES1', 'escalator', '631')], occurred_at=NOW - 600)
+    return history
+
+
+def test_downtime_since_clips_intervals_to_the_window(history):
+    assert history.downtime_since(NOW - DAY, now=NOW) == {
+        'EL1': ('elevator', '127', pytest.approx(3600)),
+        'EL2': ('elevator', '127', pytest.approx(1800)),
+        'ES1': ('escalator', '631', pytest.approx(600)),
+    }
+    assert set(history.downtime_since(NOW - 1200, now=NOW)) == {'ES1'}
+
+
+def test_equipment_uptime_matches_downtime_since(history):
+    uptime = history.equipment_uptime(1, now=NOW)
+
+    for equipment_id, (_, _, seconds) in history.downtime_since(NOW - DAY, now=NOW).items():
+        assert uptime[equipment_id] == round(100 - seconds / DAY * 100, 2)
+
+
+def test_intervals_outside_the_window_do_not_count(history):
+    # One day later only the open escalator outage overlaps the window
+    assert history.equipment_uptime(1, now=NOW + DAY) == {'ES1': 0.0}
+    assert set(history.downtime_since(NOW, now=NOW + DAY)) == {'ES1'}
+
+
+def test_intervals_are_reloaded_from_disk(history):
+    reopened = OutageHistory(history.db_path, max_window_days=30)
+
+    assert reopened.equipment_uptime(7, now=NOW) == history.equipment_uptime(7, now=NOW)
+
+
+def test_baseline_closes_outages_missing_from_the_payload(history):
+    history.sync_baseline({'elevators_by_id': {}, 'escalators_by_id': {}}, occurred_at=NOW)
+
+    assert history.downtime_since(NOW - 1200, now=NOW + 600) == {
+        'ES1': ('escalator', '631', pytest.approx(600))
+    }
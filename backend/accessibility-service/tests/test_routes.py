@@ -0,0 +1,53 @@
+import pytest
+from flask import Flask
+from routes.routes import routes_bp
+from services.mta_client import mta_client
+from services.route_planner import route_planner
+
+
+@pytest.fixture
+def client(monkeypatch):
+    station = {'station_id': '127', 'station_name': 'Times Sq-42 St', 'latitude': 40.75529, 'longitude': -73.987495}
+    monkeypatch.setattr(mta_client, 'get_station', lambda station_id: station)
+    monkeypatch.setattr(mta_client, 'get_equipment_status', lambda: {})
+    monkeypatch.setattr(mta_client, 'get_station_counts', lambda equipment, station_id: {
+        'elevators': 1, 'working_elevators': 1
+    })
+
+    app = Flask(__name__)
+    app.register_blueprint(routes_bp)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('max_distance', ['nan', 'inf', '-1', '0', '50'])
+def test_alternatives_reject_bad_max_distance(client, max_distance):
+    response = client.get(f'/api/accessibility/alternatives/127?max_distance={max_distance}')
+
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_alternatives_search_within_max_distance(client, monkeypatch):
+    searches = []
+    monkeypatch.setattr(route_planner, 'find_nearby_accessible_stations', lambda *args: searches.append(args) or [])
+
+    response = client.get('/api/accessibility/alternatives/127?max_distance=1.5')
+
+    assert response.status_code == 200
+    assert response.get_json()['data']['search_radius_km'] == 1.5
+    assert searches == [('127', 40.75529, -73.987495, 1.5)]
+
+
+def test_nearby_accessible_stations_accept_zero_coordinates(monkeypatch):
+    stations = [
+        {'station_id': 'NULL', 'station_name': 'Null Island', 'latitude': 0.001, 'longitude': 0.001},
+    ]
+    monkeypatch.setattr(route_planner, '_get_stations', lambda: stations)
+    monkeypatch.setattr(route_planner, '_get_equipment', lambda: {})
+    monkeypatch.setattr(route_planner, '_check_station_accessibility', lambda station_id, equipment: {
+        'is_accessible': True
+    })
+
+    nearby = route_planner.find_nearby_accessible_stations(None, 0.0, 0.0, 1)
+
+    assert [match['station']['station_id'] for match in nearby] == ['NULL']
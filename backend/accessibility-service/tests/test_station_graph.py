@@ -0,0 +1,106 @@
+import heapq
+import pytest
+from services.station_graph import COMPLEX_TRANSFER_MINUTES, StationGraph
+
+
+def station(station_id, lat, lon, line, lines, complex_id=None, ada=True):
+    return {
+        'station_id': station_id, 'station_name': station_id, 'latitude': lat, 'longitude': lon,
+        'line': line, 'lines': lines, 'complex_id': complex_id, 'ada_compliant': ada
+    }
+
+
+# Two parallel lines joined by step-free complexes at A2/N2 and A4/N3.
+# N1 has no elevator, so it can't be used as an origin or transfer.
+STATIONS = [
+    station('A1', 40.700, -74.000, '8 Av', ['A']),
+    station('A2', 40.710, -74.000, '8 Av', ['A'], complex_id='1'),
+    station('A3', 40.720, -74.000, '8 Av', ['A']),
+    station('A4', 40.730, -74.000, '8 Av', ['A'], complex_id='2'),
+    station('N1', 40.700, -73.980, 'Broadway', ['N'], ada=False),
+    station('N2', 40.715, -73.980, 'Broadway', ['N'], complex_id='1'),
+    station('N3', 40.730, -73.980, 'Broadway', ['N'], complex_id='2'),
+]
+
+
+@pytest.fixture
+def graph():
+    return StationGraph(STATIONS)
+
+
+def out_of_service(*station_ids):
+    """Equipment payload with every elevator at these stations out"""
+    return {'station_counts': {
+        station_id: {'elevators': 1, 'working_elevators': 0} for station_id in station_ids
+    }}
+
+
+def dijkstra(graph, origin_id, destination_id, blocked):
+    """Exhaustive shortest step-free path length, or None"""
+    if not (graph.is_step_free(origin_id, blocked) and graph.is_step_free(destination_id, blocked)):
+        return None
+    best = {}
+    heap = [(0, (origin_id, route)) for route in graph.stations[origin_id]['lines']]
+    while heap:
+        minutes, node = heapq.heappop(heap)
+        if node in best:
+            continue
+        best[node] = minutes
+        for neighbor, cost, via in graph.edges[node]:
+            if via and not all(graph.is_step_free(s, blocked) for s in via):
+                continue
+            if neighbor not in best:
+                heapq.heappush(heap, (minutes + cost, neighbor))
+    reached = [m for (station_id, _), m in best.items() if station_id == destination_id]
+    return min(reached) if reached else None
+
+
+@pytest.mark.parametrize('blocked', [(), ('A2',), ('N2',), ('A4',), ('A2', 'A4')])
+def test_shortest_path_matches_exhaustive_search(graph, blocked):
+    blocked = StationGraph.outage_mask(out_of_service(*blocked))
+    for origin in graph.stations:
+        for destination in graph.stations:
+            path = graph.shortest_path(origin, destination, blocked)
+            expected = dijkstra(graph, origin, destination, blocked)
+            if expected is None:
+                assert path is None, (origin, destination)
+            else:
+                assert path['total_minutes'] == round(expected, 1), (origin, destination)
+
+
+def test_transfers_at_the_nearest_step_free_complex(graph):
+    path = graph.shortest_path('A1', 'N2')
+
+    assert path['transfers'] == 0
+    assert [(leg['route'], leg['from']['station_id'], leg['to']['station_id']) for leg in path['legs']] == [
+        ('A', 'A1', 'A2')
+    ]
+    assert path['total_minutes'] > COMPLEX_TRANSFER_MINUTES
+
+
+def test_outage_reroutes_around_the_blocked_transfer(graph):
+    open_path = graph.shortest_path('A1', 'N2')
+    path = graph.shortest_path('A1', 'N2', StationGraph.outage_mask(out_of_service('A2')))
+
+    # Riding through A2 is fine; transferring there isn't
+    assert [(leg['route'], leg['from']['station_id'], leg['to']['station_id']) for leg in path['legs']] == [
+        ('A', 'A1', 'A4'), ('N', 'N3', 'N2')
+    ]
+    assert path['transfers'] == 1
+    assert path['total_minutes'] > open_path['total_minutes']
+
+
+def test_no_path_when_every_transfer_or_an_end_is_blocked(graph):
+    assert graph.shortest_path('A1', 'N2', StationGraph.outage_mask(out_of_service('A2', 'N3'))) is None
+    assert graph.shortest_path('A1', 'N2', StationGraph.outage_mask(out_of_service('A1'))) is None
+    assert graph.shortest_path('N1', 'A1') is None
+
+
+def test_outage_mask_only_counts_stations_with_no_working_elevator():
+    equipment = {'station_counts': {
+        'A1': {'elevators': 2, 'working_elevators': 1},
+        'A2': {'elevators': 1, 'working_elevators': 0},
+        'A3': {'elevators': 0, 'working_elevators': 0},
+    }}
+
+    assert StationGraph.outage_mask(equipment) == {'A2'}
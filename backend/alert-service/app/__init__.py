@@ -32,6 +32,11 @@ def create_app():
     # Create tables
     with app.app_context():
         db.create_all()
+        
+        # create_all skips indexes on tables that already exist
+        from app.models.service_status import ServiceStatus
+        for index in ServiceStatus.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
     
     # Start background scheduler
     from app.services.mta_api_service import start_scheduler
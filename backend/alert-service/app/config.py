@@ -22,7 +22,27 @@ class Config:
     # Cache Configuration
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
     CACHE_DEFAULT_TIMEOUT = 60  # seconds
+    CACHE_L1_MAX_ENTRIES = 256  # In-process LRU entries per worker
+    CACHE_INVALIDATION_CHANNEL = 'alert-cache-invalidate'
+    CACHE_GZIP_MIN_BYTES = 1024  # Smaller cached responses are not worth compressing
+    SINGLE_FLIGHT_LOCK_TIMEOUT = 30  # Max seconds one worker may hold a cache rebuild lock
+    
+    # Alert feed fetching
+    ALERT_FEED_TIMEOUT = 10  # Per-feed request deadline
+    ALERT_FETCH_BUDGET = 12  # Overall budget for fetching all feeds at once
+    ALERT_FETCH_WORKERS = 8  # Worker pool and HTTP connection pool size
+    ALERT_FEED_CACHE_TIMEOUT = 60  # Seconds each feed's parsed alerts are reused
+    ALERT_RATE_LIMIT = 4  # Sustained requests per second per MTA host
+    ALERT_RATE_BURST = 8  # Requests allowed back to back before throttling
+    ALERT_STORE_REFRESH_INTERVAL = 30  # Seconds between background alert store rebuilds
     
     # Update intervals (in seconds)
     REALTIME_UPDATE_INTERVAL = 30
-    STATUS_UPDATE_INTERVAL = 60
\ No newline at end of file
+    STATUS_UPDATE_INTERVAL = 60
+    
+    # service_status retention: full history for this many days, then
+    # transitions only, compacted every STATUS_RETENTION_INTERVAL seconds
+    STATUS_RETENTION_FULL_DAYS = 7
+    STATUS_RETENTION_INTERVAL = 3600
+    STATUS_RETENTION_BATCH_SIZE = 500  # Rows deleted per transaction
+    STATUS_RETENTION_BATCH_PAUSE = 0.05  # Seconds between delete batches
\ No newline at end of file
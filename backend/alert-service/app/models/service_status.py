@@ -1,8 +1,14 @@
 from app import db
 from datetime import datetime
+from sqlalchemy import desc
+from app.models.route import Route
 
 class ServiceStatus(db.Model):
     __tablename__ = 'service_status'
+    __table_args__ = (
+        # Latest-per-route and per-route history reads walk this index
+        db.Index('ix_service_status_route_timestamp', 'route_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     route_id = db.Column(db.String(50), db.ForeignKey('routes.id'), nullable=False)
@@ -19,4 +25,67 @@ class ServiceStatus(db.Model):
             'message': self.message,
             'severity': self.severity,
             'timestamp': self.timestamp.isoformat() if self.timestamp else None
-        }
\ No newline at end of file
+        }
+    
+    @classmethod
+    def latest_by_route(cls):
+        """
+        Most recent status row for every route, in a single query
+        
+        For each row of the routes table a correlated ORDER BY timestamp
+        DESC LIMIT 1 subquery picks the latest status ID, which is one seek
+        on ix_service_status_route_timestamp per route. The cost depends on
+        the number of routes, not on how much history has accumulated.
+        
+        Returns:
+            Dict of route_id -> ServiceStatus
+        """
+        latest_id = db.session.query(cls.id).filter(
+            cls.route_id == Route.id
+        ).order_by(desc(cls.timestamp), desc(cls.id)).limit(1).correlate(Route).scalar_subquery()
+        
+        latest = cls.query.filter(cls.id.in_(db.session.query(latest_id).select_from(Route))).all()
+        return {status.route_id: status for status in latest}
+    
+    @classmethod
+    def insert_transitions(cls, statuses, route_ids, timestamp=None):
+        """
+        Insert only the statuses that differ from each route's latest row
+        
+        Each route's latest row comes from latest_by_route, one index seek
+        per route. Unchanged routes are skipped, and everything else is
+        written in one executemany INSERT instead of one ORM object per
+        route. The caller commits.
+        
+        Args:
+            statuses: Dict of route_id -> dict with status, message and severity
+            route_ids: IDs in the routes table; statuses for any other route
+                are skipped, since service_status.route_id references routes
+            timestamp: Timestamp for every inserted row (defaults to now)
+        
+        Returns:
+            Tuple of (rows written, rows skipped)
+        """
+        timestamp = timestamp or datetime.utcnow()
+        latest = cls.latest_by_route()
+        
+        rows = []
+        for route_id, status in statuses.items():
+            if route_id not in route_ids:
+                continue
+            current = latest.get(route_id)
+            if (current and current.status == status['status']
+                    and current.message == status['message']
+                    and current.severity == status['severity']):
+                continue
+            rows.append({
+                'route_id': route_id,
+                'status': status['status'],
+                'message': status['message'],
+                'severity': status['severity'],
+                'timestamp': timestamp
+            })
+        
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+        return len(rows), len(statuses) - len(rows)
\ No newline at end of file
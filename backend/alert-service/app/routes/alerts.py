@@ -1,6 +1,7 @@
+import time
 from datetime import datetime
 from flask import Blueprint, jsonify, request
-from app.services.mta_alerts_service import MTAAlertsService
+from app.services.alert_store import AlertStore
 from app.services.cache_service import CacheService
 
 alerts_bp = Blueprint('alerts', __name__)
@@ -8,76 +9,95 @@ alerts_bp = Blueprint('alerts', __name__)
 @alerts_bp.route('/', methods=['GET'])
 def get_all_alerts():
     """Get all current MTA service alerts"""
-    # Try cache first
-    cached = CacheService.get('mta_alerts_all')
-    if cached:
-        return jsonify(cached)
+    # Try cache first (already-encoded response bytes); on a miss only one
+    # caller encodes the alert store snapshot while the rest wait. Fresh for 2 minutes, then
+    # served stale for up to 10 more while it refreshes in the background.
+    entry = CacheService.get_or_build_response(
+        'mta_alerts_all', lambda: list(AlertStore.get().alerts), timeout=120, stale_timeout=600
+    )
     
-    # Fetch from MTA
-    alerts = MTAAlertsService.fetch_all_alerts()
-    
-    # Cache for 2 minutes
-    CacheService.set('mta_alerts_all', alerts, timeout=120)
-    
-    return jsonify(alerts)
+    return CacheService.respond(entry)
 
 @alerts_bp.route('/subway', methods=['GET'])
 def get_subway_alerts():
     """Get subway service alerts"""
-    cached = CacheService.get('mta_alerts_subway')
-    if cached:
-        return jsonify(cached)
-    
-    alerts = MTAAlertsService.fetch_alerts('subway')
-    CacheService.set('mta_alerts_subway', alerts, timeout=120)
+    entry = CacheService.get_or_build_response(
+        'mta_alerts_subway',
+        lambda: AlertStore.get().query(feed_type='subway'),
+        timeout=120,
+        stale_timeout=600
+    )
     
-    return jsonify(alerts)
+    return CacheService.respond(entry)
 
 @alerts_bp.route('/route/<route_id>', methods=['GET'])
 def get_route_alerts(route_id):
-    """Get alerts for specific route"""
-    # Fetch all subway alerts
-    alerts = MTAAlertsService.fetch_alerts('subway')
+    """Get subway alerts for specific route"""
+    route_alerts = AlertStore.get().query(route_id=route_id, feed_type='subway')
     
-    # Filter by route
-    route_alerts = [
-        alert for alert in alerts 
-        if route_id in alert['affected_routes']
-    ]
-    
-    return jsonify(route_alerts)
+    return _conditional_json(route_alerts)
 
 @alerts_bp.route('/active', methods=['GET'])
 def get_active_alerts():
-    """Get only currently active alerts"""
-    alerts = MTAAlertsService.fetch_all_alerts()
-    now = datetime.utcnow()
+    """
+    Get only currently active alerts
+    
+    Query params:
+        at: Epoch seconds to evaluate instead of now
+        route, feed, severity, effect: Optional filters
+    """
+    at = request.args.get('at', type=float)
     
-    active_alerts = []
-    for alert in alerts:
-        # Check if alert is currently active
-        is_active = False
-        if not alert['active_period']:
-            is_active = True  # No time restriction
-        else:
-            for period in alert['active_period']:
-                start = period['start']
-                end = period['end']
-                
-                if start and end:
-                    if start <= now <= end:
-                        is_active = True
-                        break
-                elif start:
-                    if start <= now:
-                        is_active = True
-                        break
-                elif end:
-                    if now <= end:
-                        is_active = True
-                        break
-        
-        if is_active:
-            active_alerts.append(alert)
+    active_alerts = AlertStore.get().query(
+        route_id=request.args.get('route'),
+        feed_type=request.args.get('feed'),
+        severity=request.args.get('severity'),
+        effect=request.args.get('effect'),
+        active_at=at if at is not None else time.time()
+    )
     
-    return jsonify(active_alerts)
\ No newline at end of file
+    return _conditional_json(active_alerts)
+
+@alerts_bp.route('/changes', methods=['GET'])
+def get_alert_changes():
+    """
+    Get alerts added, updated or removed since an alert store version (?since=<version>)
+    
+    Versions are content hashes, so they mean the same alerts on every
+    worker. Without since every current alert is returned with full=true;
+    when since is unknown or older than the retained history, reset=true
+    is set too and the client should replace its copy. Clients pass the
+    returned version as since on their next poll.
+    """
+    since = request.args.get('since')
+    
+    if since is not None:
+        snapshot, changes = AlertStore.changes_since(since)
+        if changes is not None:
+            return jsonify({
+                'version': snapshot.version,
+                'since': since,
+                'full': False,
+                'reset': False,
+                'added': changes['added'],
+                'updated': changes['updated'],
+                'removed': [{'feed_type': feed_type, 'id': alert_id} for feed_type, alert_id in changes['removed']],
+                'timestamp': datetime.utcnow().isoformat()
+            })
+    
+    snapshot = AlertStore.get()
+    return jsonify({
+        'version': snapshot.version,
+        'since': since,
+        'full': True,
+        'reset': since is not None,
+        'alerts': list(snapshot.alerts),
+        'count': len(snapshot.alerts),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+def _conditional_json(payload):
+    """jsonify with a content-hash ETag, answering 304 if the client's copy is current"""
+    response = jsonify(payload)
+    response.add_etag()
+    return response.make_conditional(request)
\ No newline at end of file
@@ -7,27 +7,30 @@ realtime_bp = Blueprint('realtime', __name__)
 @realtime_bp.route('/<route_id>', methods=['GET'])
 def get_realtime_data(route_id):
     """Get real-time train positions for route"""
-    # Try cache first
-    cache_key = f'realtime_{route_id}'
-    cached = CacheService.get(cache_key)
-    if cached:
-        return jsonify(cached)
+    def build_realtime():
+        # Fetch from MTA API
+        data = MTAAPIService.fetch_realtime_data(route_id)
+        
+        if not data:
+            return None
+        
+        # Process and return data
+        # This would parse the GTFS-RT protobuf data
+        return {
+            'route_id': route_id,
+            'vehicles': [],  # Would contain train positions
+            'timestamp': 'current_time'
+        }
     
-    # Fetch from MTA API
-    data = MTAAPIService.fetch_realtime_data(route_id)
+    # Try cache first, coalescing concurrent misses; cache for 30 seconds
+    result = CacheService.get_or_build(
+        f'realtime_{route_id}',
+        build_realtime,
+        timeout=30,
+        cacheable=lambda result: result is not None
+    )
     
-    if not data:
+    if not result:
         return jsonify({'error': 'Unable to fetch real-time data'}), 503
     
-    # Process and return data
-    # This would parse the GTFS-RT protobuf data
-    result = {
-        'route_id': route_id,
-        'vehicles': [],  # Would contain train positions
-        'timestamp': 'current_time'
-    }
-    
-    # Cache for 30 seconds
-    CacheService.set(cache_key, result, timeout=30)
-    
     return jsonify(result)
@@ -7,18 +7,14 @@ routes_bp = Blueprint('routes', __name__)
 @routes_bp.route('/', methods=['GET'])
 def get_all_routes():
     """Get all transit routes"""
-    # Try cache first
-    cached = CacheService.get('all_routes')
-    if cached:
-        return jsonify(cached)
+    # Try cache first (already-encoded response bytes), cached for 5 minutes
+    entry = CacheService.get_or_build_response(
+        'all_routes',
+        lambda: [route.to_dict() for route in Route.query.all()],
+        timeout=300
+    )
     
-    routes = Route.query.all()
-    result = [route.to_dict() for route in routes]
-    
-    # Cache for 5 minutes
-    CacheService.set('all_routes', result, timeout=300)
-    
-    return jsonify(result)
+    return CacheService.respond(entry)
 
 @routes_bp.route('/<route_id>', methods=['GET'])
 def get_route(route_id):
@@ -1,10 +1,11 @@
 from flask import Blueprint, jsonify, request
 from app.models.station import Station
-from sqlalchemy import func
-import math
+from app.services.geo_index import GeoIndex, StationIndex
 
 stations_bp = Blueprint('stations', __name__)
 
+MAX_BATCH_POINTS = 100
+
 @stations_bp.route('/', methods=['GET'])
 def get_all_stations():
     """Get all stations"""
@@ -23,37 +24,65 @@ def get_nearby_stations():
     lat = request.args.get('lat', type=float)
     lon = request.args.get('lon', type=float)
     radius = request.args.get('radius', default=0.5, type=float)  # km
+    limit = request.args.get('limit', type=int)
     
-    if not lat or not lon:
-        return jsonify({'error': 'Latitude and longitude required'}), 400
+    error = GeoIndex.point_error(lat, lon) or GeoIndex.search_error(radius, limit)
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Simple distance calculation (Haversine formula would be more accurate)
-    stations = Station.query.all()
-    nearby = []
+    # Vectorized over the in-memory station index, optionally capped at ?limit= nearest
+    nearby = StationIndex.get().within(lat, lon, radius, limit=limit)
+    
+    return jsonify([_with_distance(station, distance) for station, distance in nearby])
+
+@stations_bp.route('/nearby/batch', methods=['POST'])
+def get_nearby_stations_batch():
+    """
+    Find stations near many points at once
     
-    for station in stations:
-        if station.latitude and station.longitude:
-            distance = calculate_distance(lat, lon, station.latitude, station.longitude)
-            if distance <= radius:
-                station_dict = station.to_dict()
-                station_dict['distance'] = round(distance, 2)
-                nearby.append(station_dict)
+    JSON body: {"points": [{"lat": ..., "lon": ...}], "radius": 0.5, "limit": 5}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object'}), 400
+    points = data.get('points')
     
-    # Sort by distance
-    nearby.sort(key=lambda x: x['distance'])
+    if not isinstance(points, list) or not points:
+        return jsonify({'error': 'points must be a non-empty list'}), 400
+    if len(points) > MAX_BATCH_POINTS:
+        return jsonify({'error': f'At most {MAX_BATCH_POINTS} points per request'}), 400
     
-    return jsonify(nearby)
-
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in km"""
-    R = 6371  # Earth's radius in km
+    try:
+        coordinates = [(float(point['lat']), float(point['lon'])) for point in points]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each point needs numeric lat and lon'}), 400
+    try:
+        radius = float(data.get('radius', 0.5))
+        limit = int(data['limit']) if data.get('limit') is not None else None
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'radius and limit must be numbers'}), 400
     
-    dlat = math.radians(lat2 - lat1)
-    dlon = math.radians(lon2 - lon1)
+    error = GeoIndex.search_error(radius, limit)
+    for lat, lon in coordinates:
+        error = error or GeoIndex.point_error(lat, lon)
+    if error:
+        return jsonify({'error': error}), 400
     
-    a = (math.sin(dlat / 2) ** 2 +
-         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
-         math.sin(dlon / 2) ** 2)
+    # Each point only measures the stations in the grid cells around it
+    matches = StationIndex.get().batch_within(coordinates, radius, limit=limit)
     
-    c = 2 * math.asin(math.sqrt(a))
-    return R * c
\ No newline at end of file
+    return jsonify({
+        'results': [
+            {
+                'lat': lat,
+                'lon': lon,
+                'stations': [_with_distance(station, distance) for station, distance in found]
+            }
+            for (lat, lon), found in zip(coordinates, matches)
+        ],
+        'count': len(coordinates)
+    })
+
+def _with_distance(station, distance):
+    """Copy an indexed station dict with its distance in km"""
+    return {**station, 'distance': round(distance, 2)}
\ No newline at end of file
@@ -11,11 +11,12 @@ def get_all_status():
     routes = Route.query.all()
     result = []
     
+    # Latest status for every route in one query: a correlated ORDER BY
+    # timestamp DESC LIMIT 1 subquery per route, each an index seek
+    latest_by_route = ServiceStatus.latest_by_route()
+    
     for route in routes:
-        # Get latest status for each route
-        latest_status = ServiceStatus.query.filter_by(
-            route_id=route.id
-        ).order_by(desc(ServiceStatus.timestamp)).first()
+        latest_status = latest_by_route.get(route.id)
         
         route_dict = route.to_dict()
         route_dict['current_status'] = latest_status.to_dict() if latest_status else {
@@ -0,0 +1,268 @@
+import hashlib
+import math
+import threading
+import time
+from bisect import bisect_right
+from collections import Counter, deque
+from dataclasses import dataclass
+from datetime import datetime
+from app.services.cache_service import CacheService
+from app.services.mta_alerts_service import MTAAlertsService
+
+
+class ActivePeriodIndex:
+    """
+    Sorted interval structure answering "which alerts are active at time T"
+
+    Every period start and end splits the timeline into elementary
+    segments, and the set of alerts active on each segment is precomputed
+    at build time. A query is a binary search over the segment boundaries,
+    with no per-alert period checks. Periods are inclusive of both ends, to
+    the second, like the GTFS-RT timestamps they come from.
+    """
+
+    def __init__(self, periods):
+        """
+        Args:
+            periods: (alert_index, start, end) in epoch seconds; start and end
+                may be None for periods open on that side
+        """
+        changes = {}
+        always = Counter()
+        for index, start, end in periods:
+            start = -math.inf if start is None else int(start)
+            end = math.inf if end is None else int(end) + 1  # Half-open [start, end + 1)
+            if start >= end:
+                continue
+            if start == -math.inf:
+                always[index] += 1
+            else:
+                changes.setdefault(start, []).append((index, 1))
+            if end != math.inf:
+                changes.setdefault(end, []).append((index, -1))
+
+        self.boundaries = sorted(changes)
+        self.segments = [frozenset(always)]  # segments[i + 1] is active from boundaries[i]
+        active = always
+        for boundary in self.boundaries:
+            for index, delta in changes[boundary]:
+                active[index] += delta
+                if not active[index]:
+                    del active[index]
+            self.segments.append(frozenset(active))
+
+    def active_at(self, timestamp):
+        """Indexes of alerts with a period covering timestamp (epoch seconds)"""
+        return self.segments[bisect_right(self.boundaries, math.floor(timestamp))]
+
+
+@dataclass(frozen=True)
+class AlertSnapshot:
+    """
+    Immutable indexed view of every alert feed, published by AlertStore.refresh
+
+    alerts is a tuple of alert dicts. by_route, by_feed, by_severity and
+    by_effect map each key to a frozenset of positions in alerts, and
+    active_periods answers active-at-time queries over the same positions.
+    by_key maps each alert's (feed_type, id) to its position and
+    fingerprints maps it to the alert's content hash.
+
+    version is a hash of every (feed_type, id, fingerprint). It is derived
+    from the alerts alone, so every worker process holding the same alerts
+    reports the same version, and it changes exactly when an alert is
+    added, removed or updated.
+    """
+    alerts: tuple
+    by_route: dict
+    by_feed: dict
+    by_severity: dict
+    by_effect: dict
+    active_periods: ActivePeriodIndex
+    refreshed_at: datetime
+    by_key: dict
+    fingerprints: dict
+    version: str
+
+    @classmethod
+    def build(cls, alerts):
+        """Index a list of parsed alerts, dropping repeats of the same (feed_type, id)"""
+        unique = []
+        by_route = {}
+        by_feed = {}
+        by_severity = {}
+        by_effect = {}
+        by_key = {}
+        fingerprints = {}
+        periods = []
+        for alert in alerts:
+            key = (alert.get('feed_type'), alert['id'])
+            if key in by_key:
+                continue
+            index = len(unique)
+            unique.append(alert)
+            by_key[key] = index
+            fingerprints[key] = alert.get('fingerprint')
+            for route_id in alert['affected_routes']:
+                by_route.setdefault(route_id, set()).add(index)
+            by_feed.setdefault(alert.get('feed_type'), set()).add(index)
+            by_severity.setdefault(alert['severity'], set()).add(index)
+            by_effect.setdefault(alert['effect'], set()).add(index)
+
+            # An alert with no active period has no time restriction
+            for period in alert['active_period'] or [{'start': None, 'end': None}]:
+                periods.append((
+                    index,
+                    period['start'].timestamp() if period['start'] else None,
+                    period['end'].timestamp() if period['end'] else None
+                ))
+
+        digest = hashlib.sha1()
+        for (feed_type, alert_id), fingerprint in sorted(fingerprints.items(), key=lambda item: repr(item[0])):
+            digest.update(f'{feed_type}\0{alert_id}\0{fingerprint}\n'.encode('utf-8'))
+
+        def freeze(index):
+            return {key: frozenset(positions) for key, positions in index.items()}
+
+        return cls(
+            alerts=tuple(unique),
+            by_route=freeze(by_route),
+            by_feed=freeze(by_feed),
+            by_severity=freeze(by_severity),
+            by_effect=freeze(by_effect),
+            active_periods=ActivePeriodIndex(periods),
+            refreshed_at=datetime.utcnow(),
+            by_key=by_key,
+            fingerprints=fingerprints,
+            version=digest.hexdigest()[:16]
+        )
+
+    def query(self, route_id=None, feed_type=None, severity=None, effect=None, active_at=None):
+        """
+        Alerts matching every given filter, in feed order
+
+        Each filter is one index lookup; the matching position sets are
+        intersected smallest first.
+
+        Args:
+            active_at: Epoch seconds the alert must be active at
+        """
+        selections = []
+        for index, key in ((self.by_route, route_id), (self.by_feed, feed_type),
+                           (self.by_severity, severity), (self.by_effect, effect)):
+            if key is not None:
+                selections.append(index.get(key, frozenset()))
+        if active_at is not None:
+            selections.append(self.active_periods.active_at(active_at))
+
+        if not selections:
+            return list(self.alerts)
+
+        selections.sort(key=len)
+        matches = set(selections[0])
+        for selection in selections[1:]:
+            if not matches:
+                break
+            matches &= selection
+        return [self.alerts[i] for i in sorted(matches)]
+
+
+class AlertStore:
+    """
+    Latest AlertSnapshot across all alert feeds, shared by the alert routes
+
+    The snapshot is rebuilt by a background job (see start_scheduler) and
+    swapped in whole, so readers never block and never see a partial index.
+    The first read before any refresh builds it synchronously.
+
+    Recent fingerprint sets are kept per version so changes_since can tell
+    clients which alerts were added, updated or removed, and the cached
+    alert responses are only dropped when a refresh actually changed
+    something.
+    """
+    _snapshot = None
+    _lock = threading.Lock()
+    _publish_lock = threading.Lock()
+
+    # Recent (version, fingerprints) pairs, kept for changes_since
+    CHANGE_HISTORY_SIZE = 60
+    _history = deque(maxlen=CHANGE_HISTORY_SIZE)
+
+    # Cached responses built from the store (see routes/alerts.py)
+    RESPONSE_CACHE_KEYS = ('response:mta_alerts_all', 'response:mta_alerts_subway')
+
+    @classmethod
+    def refresh(cls):
+        """Fetch every alert feed, index the alerts and publish the new snapshot"""
+        started = time.perf_counter()
+        snapshot = AlertSnapshot.build(MTAAlertsService.fetch_all_alerts())
+
+        with cls._publish_lock:
+            previous = cls._snapshot
+            changed = previous is None or previous.version != snapshot.version
+            if changed:
+                cls._history.append((snapshot.version, snapshot.fingerprints))
+            cls._snapshot = snapshot
+
+        if changed and previous is not None:
+            changes = cls.diff(previous.fingerprints, snapshot.fingerprints)
+            for key in cls.RESPONSE_CACHE_KEYS:
+                CacheService.delete(key)
+            summary = ', '.join(f"{len(keys)} {kind}" for kind, keys in changes.items())
+        else:
+            summary = 'no changes' if previous is not None else 'initial load'
+
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"Refreshed alert store {snapshot.version}: {len(snapshot.alerts)} alerts ({summary}) in {elapsed:.0f} ms")
+        return snapshot
+
+    @staticmethod
+    def diff(base, current):
+        """Compare two fingerprint maps, returning added, updated and removed keys"""
+        return {
+            'added': [key for key in current if key not in base],
+            'updated': [key for key, fingerprint in current.items()
+                        if key in base and base[key] != fingerprint],
+            'removed': [key for key in base if key not in current]
+        }
+
+    @classmethod
+    def changes_since(cls, since):
+        """
+        Diff the current alerts against the alerts as of version since
+
+        Returns:
+            Tuple of (snapshot, changes) where changes has lists of added and
+            updated alert dicts and removed (feed_type, id) keys, or None if
+            since is unknown to this process or no longer retained (the
+            caller should reset the client to a full snapshot)
+        """
+        snapshot = cls.get()
+        base = None
+        if since == snapshot.version:
+            base = snapshot.fingerprints
+        else:
+            for version, fingerprints in list(cls._history):
+                if version == since:
+                    base = fingerprints
+                    break
+
+        if base is None:
+            return snapshot, None
+
+        keys = cls.diff(base, snapshot.fingerprints)
+        return snapshot, {
+            'added': [snapshot.alerts[snapshot.by_key[key]] for key in keys['added']],
+            'updated': [snapshot.alerts[snapshot.by_key[key]] for key in keys['updated']],
+            'removed': keys['removed']
+        }
+
+    @classmethod
+    def get(cls):
+        """Get the current snapshot, building it if no refresh has run yet"""
+        snapshot = cls._snapshot
+        if snapshot is None:
+            with cls._lock:
+                snapshot = cls._snapshot
+                if snapshot is None:
+                    snapshot = cls.refresh()
+        return snapshot
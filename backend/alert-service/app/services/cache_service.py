@@ -1,10 +1,46 @@
+import gzip
+import hashlib
 import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
 import redis
-from flask import current_app
+from flask import current_app, request
+from werkzeug.http import is_resource_modified
+
+# Already-encoded JSON response body, optional gzip copy, a strong ETag and
+# the epoch times it was built at and stays fresh until (its soft TTL)
+CachedResponse = namedtuple(
+    'CachedResponse', ['body', 'gzip_body', 'etag', 'cached_at', 'fresh_until']
+)
 
 class CacheService:
+    """
+    Two-tier cache: a size-bounded in-process LRU (L1) in front of Redis (L2)
+
+    L1 entries expire together with their Redis key. Writes and deletes are
+    announced on a Redis pub/sub channel so other worker processes drop their
+    L1 copy. Values returned from L1 are shared; callers must not mutate them.
+    """
     _redis_client = None
-    
+    _raw_redis_client = None
+    _local = OrderedDict()  # key -> (expires_at, value)
+    _local_lock = threading.Lock()
+    _listener_started = False
+    _inflight = {}  # key -> Future of the rebuild in progress
+    _inflight_lock = threading.Lock()
+    _refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+    _instance_id = uuid.uuid4().hex
+
+    # Delete the lock only if we still own it
+    _RELEASE_LOCK_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) end return 0"
+    )
+
     @classmethod
     def get_redis(cls):
         """Get Redis client (singleton)"""
@@ -17,47 +53,416 @@ class CacheService:
             except Exception as e:
                 print(f"Redis connection failed: {e}")
                 return None
+        if not cls._listener_started:
+            cls._start_invalidation_listener()
         return cls._redis_client
-    
+
+    @classmethod
+    def get_raw_redis(cls):
+        """Get Redis client without response decoding, for binary values (singleton)"""
+        if cls._raw_redis_client is None:
+            try:
+                cls._raw_redis_client = redis.from_url(current_app.config['REDIS_URL'])
+            except Exception as e:
+                print(f"Redis connection failed: {e}")
+                return None
+        cls.get_redis()
+        return cls._raw_redis_client
+
     @classmethod
     def get(cls, key):
-        """Get value from cache"""
+        """Get value from cache, trying the local LRU before Redis"""
+        value = cls._local_get(key)
+        if value is not None:
+            return value
+
         client = cls.get_redis()
         if not client:
             return None
-        
+
         try:
-            value = client.get(key)
-            return json.loads(value) if value else None
+            pipe = client.pipeline()
+            pipe.get(key)
+            pipe.pttl(key)
+            value, ttl_ms = pipe.execute()
+            if not value:
+                return None
+
+            data = json.loads(value)
+            # Share the remaining Redis TTL so both tiers expire together
+            if ttl_ms and ttl_ms > 0:
+                cls._local_set(key, data, ttl_ms / 1000)
+            return data
         except Exception as e:
             print(f"Cache get error: {e}")
             return None
-    
+
     @classmethod
     def set(cls, key, value, timeout=None):
-        """Set value in cache"""
+        """Set value in cache (both tiers)"""
+        try:
+            timeout = timeout or current_app.config['CACHE_DEFAULT_TIMEOUT']
+            payload = json.dumps(value)
+        except Exception as e:
+            print(f"Cache set error: {e}")
+            return False
+
+        # Keep the JSON-normalized form locally so L1 and Redis hits look the same
+        cls._local_set(key, json.loads(payload), timeout)
+
         client = cls.get_redis()
         if not client:
             return False
-        
+
         try:
-            timeout = timeout or current_app.config['CACHE_DEFAULT_TIMEOUT']
-            client.setex(key, timeout, json.dumps(value))
+            client.setex(key, timeout, payload)
+            cls._announce(client, key)
             return True
         except Exception as e:
             print(f"Cache set error: {e}")
             return False
-    
+
     @classmethod
     def delete(cls, key):
-        """Delete key from cache"""
+        """Delete key from cache (both tiers, and other workers' local copies)"""
+        cls._local_delete(key)
+
         client = cls.get_redis()
         if not client:
             return False
-        
+
         try:
             client.delete(key)
+            cls._announce(client, key)
             return True
         except Exception as e:
             print(f"Cache delete error: {e}")
             return False
+
+    @classmethod
+    def encode_response(cls, value, timeout=0):
+        """Serialize a payload once, exactly as jsonify would, plus gzip and ETag"""
+        body = current_app.json.dumps(value).encode('utf-8')
+        gzip_body = b''
+        if len(body) >= current_app.config['CACHE_GZIP_MIN_BYTES']:
+            gzip_body = gzip.compress(body, compresslevel=5)
+        etag = hashlib.sha1(body).hexdigest()
+        now = time.time()
+        return CachedResponse(body, gzip_body, etag, now, now + timeout)
+
+    @classmethod
+    def get_response(cls, key):
+        """Get a pre-encoded response stored with set_response, or None"""
+        local_key = f'response:{key}'
+        entry = cls._local_get(local_key)
+        if entry is not None:
+            return entry
+
+        client = cls.get_raw_redis()
+        if not client:
+            return None
+
+        try:
+            pipe = client.pipeline()
+            pipe.hgetall(local_key)
+            pipe.pttl(local_key)
+            fields, ttl_ms = pipe.execute()
+            if not fields:
+                return None
+
+            entry = CachedResponse(
+                fields[b'body'],
+                fields[b'gzip'],
+                fields[b'etag'].decode(),
+                float(fields.get(b'cached_at', 0)),
+                float(fields.get(b'fresh_until', 0))
+            )
+            if ttl_ms and ttl_ms > 0:
+                cls._local_set(local_key, entry, ttl_ms / 1000)
+            return entry
+        except Exception as e:
+            print(f"Cache get error: {e}")
+            return None
+
+    @classmethod
+    def set_response(cls, key, value, timeout=None, stale_timeout=0):
+        """
+        Encode value once and cache the response bytes; returns the CachedResponse
+
+        The entry is fresh for timeout seconds and is kept for stale_timeout
+        more so get_or_build_response can serve it while it refreshes.
+        """
+        timeout = timeout or current_app.config['CACHE_DEFAULT_TIMEOUT']
+        entry = cls.encode_response(value, timeout)
+        local_key = f'response:{key}'
+        hard_timeout = timeout + stale_timeout
+        cls._local_set(local_key, entry, hard_timeout)
+
+        client = cls.get_raw_redis()
+        if not client:
+            return entry
+
+        try:
+            pipe = client.pipeline()
+            pipe.hset(local_key, mapping={
+                'body': entry.body,
+                'gzip': entry.gzip_body,
+                'etag': entry.etag,
+                'cached_at': entry.cached_at,
+                'fresh_until': entry.fresh_until
+            })
+            pipe.expire(local_key, hard_timeout)
+            pipe.execute()
+            cls._announce(client, local_key)
+        except Exception as e:
+            print(f"Cache set error: {e}")
+        return entry
+
+    @classmethod
+    def not_modified(cls, etag, last_modified=None):
+        """
+        Return a 304 response if the request's If-None-Match / If-Modified-Since
+        validators still match, otherwise None. Lets routes skip all work for
+        unchanged data.
+        """
+        if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            return None
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+        return response
+
+    @classmethod
+    def respond(cls, entry, etag=None, last_modified=None):
+        """
+        Build a Flask response straight from cached bytes, gzipped if the client accepts it
+
+        The entry's content hash and build time are used as ETag and
+        Last-Modified unless overridden; conditional requests get a 304.
+        """
+        if entry.gzip_body and 'gzip' in request.accept_encodings:
+            response = current_app.response_class(entry.gzip_body, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = current_app.response_class(entry.body, mimetype='application/json')
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.set_etag(etag or entry.etag)
+        response.last_modified = last_modified or datetime.fromtimestamp(entry.cached_at, timezone.utc)
+
+        # Let clients see how old the data is, and flag stale-while-revalidate hits
+        now = time.time()
+        response.headers['X-Data-Age'] = str(max(0, int(now - entry.cached_at)))
+        if entry.fresh_until <= now:
+            response.headers['X-Cache'] = 'STALE'
+        return response.make_conditional(request)
+
+    @classmethod
+    def get_or_build(cls, key, loader, timeout=None, cacheable=None):
+        """
+        Get a cached value, or build it with loader() on a miss
+
+        Concurrent misses are coalesced: only one caller runs loader() and the
+        others wait for its result. cacheable(value) can veto caching it.
+        """
+        value = cls.get(key)
+        if value is not None:
+            return value
+
+        def rebuild():
+            value = loader()
+            if cacheable is None or cacheable(value):
+                cls.set(key, value, timeout)
+            return value
+
+        return cls._single_flight(key, lambda: cls.get(key), rebuild)
+
+    @classmethod
+    def get_or_build_response(cls, key, loader, timeout=None, cacheable=None, stale_timeout=0):
+        """
+        Like get_or_build, but returns a CachedResponse ready for respond()
+
+        With stale_timeout, an entry past its soft TTL (timeout) but within
+        its hard TTL (timeout + stale_timeout) is returned immediately while
+        a single background refresh rebuilds it.
+        """
+        def rebuild():
+            value = loader()
+            if cacheable is None or cacheable(value):
+                return cls.set_response(key, value, timeout, stale_timeout)
+            return cls.encode_response(value)
+
+        lock_key = f'response:{key}'
+        entry = cls.get_response(key)
+        if entry is not None:
+            if stale_timeout and entry.fresh_until <= time.time():
+                cls._refresh_in_background(lock_key, rebuild)
+            return entry
+
+        return cls._single_flight(lock_key, lambda: cls.get_response(key), rebuild)
+
+    @classmethod
+    def _refresh_in_background(cls, key, rebuild):
+        """Start one background rebuild of a stale key unless one is already running"""
+        with cls._inflight_lock:
+            if key in cls._inflight:
+                return
+            future = Future()
+            cls._inflight[key] = future
+
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                with app.app_context():
+                    future.set_result(cls._rebuild_with_lock(key, None, rebuild))
+            except Exception as e:
+                print(f"Background cache refresh error for {key}: {e}")
+                future.set_exception(e)
+            finally:
+                with cls._inflight_lock:
+                    cls._inflight.pop(key, None)
+
+        cls._refresh_executor.submit(refresh)
+
+    @classmethod
+    def _single_flight(cls, key, lookup, rebuild):
+        """
+        Run rebuild() for key at most once at a time
+
+        Within the process, followers wait on the leader's Future. Across
+        workers, the leader takes a short Redis lock; other workers poll
+        lookup() until the value appears or the lock expires.
+        """
+        with cls._inflight_lock:
+            future = cls._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                cls._inflight[key] = future
+
+        if not is_leader:
+            result = future.result()
+            if result is not None:
+                return result
+            # Followed a background refresh that deferred to another worker
+            return cls._rebuild_with_lock(key, lookup, rebuild)
+
+        try:
+            result = cls._rebuild_with_lock(key, lookup, rebuild)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with cls._inflight_lock:
+                cls._inflight.pop(key, None)
+
+    @classmethod
+    def _rebuild_with_lock(cls, key, lookup, rebuild):
+        """
+        Rebuild under a cross-worker Redis lock, or wait for the worker holding it
+
+        Without a lookup (background refreshes), a held lock means another
+        worker is already refreshing, so this returns None without waiting.
+        """
+        client = cls.get_redis()
+        if not client:
+            return rebuild()
+
+        lock_key = f'lock:{key}'
+        lock_timeout = current_app.config['SINGLE_FLIGHT_LOCK_TIMEOUT']
+        token = uuid.uuid4().hex
+        try:
+            acquired = client.set(lock_key, token, nx=True, px=int(lock_timeout * 1000))
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+            return rebuild()
+
+        if not acquired:
+            if lookup is None:
+                return None
+            deadline = time.monotonic() + lock_timeout
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                result = lookup()
+                if result is not None:
+                    return result
+            # Lock holder is gone or too slow; rebuild here instead
+            return rebuild()
+
+        try:
+            return rebuild()
+        finally:
+            try:
+                client.eval(cls._RELEASE_LOCK_SCRIPT, 1, lock_key, token)
+            except Exception as e:
+                print(f"Cache lock release error: {e}")
+
+    @classmethod
+    def _local_get(cls, key):
+        """Get an unexpired L1 entry and mark it recently used"""
+        with cls._local_lock:
+            entry = cls._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del cls._local[key]
+                return None
+            cls._local.move_to_end(key)
+            return entry[1]
+
+    @classmethod
+    def _local_set(cls, key, value, timeout):
+        """Store an L1 entry, evicting least recently used entries over the limit"""
+        max_entries = current_app.config['CACHE_L1_MAX_ENTRIES']
+        with cls._local_lock:
+            cls._local[key] = (time.monotonic() + timeout, value)
+            cls._local.move_to_end(key)
+            while len(cls._local) > max_entries:
+                cls._local.popitem(last=False)
+
+    @classmethod
+    def _local_delete(cls, key):
+        """Drop an L1 entry"""
+        with cls._local_lock:
+            cls._local.pop(key, None)
+
+    @classmethod
+    def _announce(cls, client, key):
+        """Tell other workers to drop their L1 copy of key"""
+        channel = current_app.config['CACHE_INVALIDATION_CHANNEL']
+        client.publish(channel, f"{cls._instance_id}:{key}")
+
+    @classmethod
+    def _on_invalidation(cls, message):
+        """Drop the L1 copy of a key announced by another worker (our own announcements are ignored)"""
+        origin, _, key = message.partition(':')
+        if origin != cls._instance_id:
+            cls._local_delete(key)
+
+    @classmethod
+    def _start_invalidation_listener(cls):
+        """Subscribe to the invalidation channel in a daemon thread (once per process)"""
+        cls._listener_started = True
+        redis_url = current_app.config['REDIS_URL']
+        channel = current_app.config['CACHE_INVALIDATION_CHANNEL']
+
+        def listen():
+            while True:
+                try:
+                    pubsub = redis.from_url(redis_url, decode_responses=True).pubsub(
+                        ignore_subscribe_messages=True
+                    )
+                    pubsub.subscribe(channel)
+                    for message in pubsub.listen():
+                        cls._on_invalidation(message['data'])
+                except Exception as e:
+                    print(f"Cache invalidation listener error: {e}")
+                    # Entries published while disconnected may have been missed
+                    with cls._local_lock:
+                        cls._local.clear()
+                    time.sleep(5)
+
+        threading.Thread(target=listen, name='cache-invalidation', daemon=True).start()
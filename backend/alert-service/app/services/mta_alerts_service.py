@@ -1,11 +1,18 @@
+import hashlib
 import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
 from flask import current_app
+from requests.adapters import HTTPAdapter
 from app import db
 from app.models.service_status import ServiceStatus
 from app.models.route import Route
+from app.services.rate_limiter import TokenBucket
 from datetime import datetime
 from google.transit import gtfs_realtime_pb2
 import time
+from sqlalchemy import event
 
 class MTAAlertsService:
     """Service to fetch and process MTA service alerts"""
@@ -22,43 +29,149 @@ class MTAAlertsService:
         'metro_north': 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fmetronorth-alerts',
     }
     
-    @staticmethod
-    def fetch_alerts(feed_type='subway'):
+    _route_ids = None  # frozenset of Route IDs, cleared when routes are added or removed
+    
+    _session = None
+    _executor = None
+    _init_lock = threading.Lock()
+    _rate_limiters = {}  # host -> TokenBucket shared by every feed on that host
+    _feed_cache = {}  # feed_type -> (expires_at monotonic, alerts)
+    _feed_locks = {}  # feed_type -> Lock so only one caller downloads a feed at a time
+    _parsed_alerts = {}  # feed_type -> {entity ID: parsed alert} from the last download
+    
+    @classmethod
+    def get_session(cls):
+        """Get the pooled HTTP session shared by all alert feed fetches (singleton)"""
+        if cls._session is None:
+            with cls._init_lock:
+                if cls._session is None:
+                    pool_size = current_app.config['ALERT_FETCH_WORKERS']
+                    adapter = HTTPAdapter(
+                        pool_connections=pool_size,
+                        pool_maxsize=pool_size
+                    )
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    cls._session = session
+        return cls._session
+    
+    @classmethod
+    def get_executor(cls):
+        """Get the bounded worker pool used to fetch feeds concurrently (singleton)"""
+        if cls._executor is None:
+            with cls._init_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=current_app.config['ALERT_FETCH_WORKERS'],
+                        thread_name_prefix='alert-fetch'
+                    )
+        return cls._executor
+    
+    @classmethod
+    def get_rate_limiter(cls, url):
+        """Get the token bucket for the host serving url"""
+        host = urlsplit(url).netloc
+        limiter = cls._rate_limiters.get(host)
+        if limiter is None:
+            with cls._init_lock:
+                limiter = cls._rate_limiters.get(host)
+                if limiter is None:
+                    limiter = TokenBucket(
+                        current_app.config['ALERT_RATE_LIMIT'],
+                        current_app.config['ALERT_RATE_BURST']
+                    )
+                    cls._rate_limiters[host] = limiter
+        return limiter
+    
+    @classmethod
+    def fetch_alerts(cls, feed_type='subway'):
         """
         Fetch alerts from MTA GTFS-RT feed WITHOUT API KEY
+        
+        Each feed is cached on its own for ALERT_FEED_CACHE_TIMEOUT seconds.
+        Concurrent misses for the same feed share one download, and if a
+        download fails the last good alerts are returned instead.
         """
+        cached = cls._feed_cache.get(feed_type)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        if feed_type not in cls.ALERT_FEEDS:
+            print(f"Unknown feed type: {feed_type}")
+            return []
+        
+        with cls._feed_locks.setdefault(feed_type, threading.Lock()):
+            # Another caller may have refreshed the feed while we waited
+            cached = cls._feed_cache.get(feed_type)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            
+            alerts = cls._download_alerts(feed_type)
+            if alerts is None:
+                return cached[1] if cached else []
+            
+            expires_at = time.monotonic() + current_app.config['ALERT_FEED_CACHE_TIMEOUT']
+            cls._feed_cache[feed_type] = (expires_at, alerts)
+            return alerts
+    
+    @classmethod
+    def _download_alerts(cls, feed_type):
+        """Download and parse one alert feed, returning None on failure"""
+        feed_url = cls.ALERT_FEEDS[feed_type]
+        timeout = current_app.config['ALERT_FEED_TIMEOUT']
         try:
-            feed_url = MTAAlertsService.ALERT_FEEDS.get(feed_type)
-            if not feed_url:
-                print(f"Unknown feed type: {feed_type}")
-                return []
-
+            if not cls.get_rate_limiter(feed_url).acquire(timeout=timeout):
+                print(f"Rate limit wait exceeded {timeout}s for {feed_type} alerts")
+                return None
+            
             # No API key required
-            response = requests.get(feed_url, timeout=10)
+            response = cls.get_session().get(feed_url, timeout=timeout)
             response.raise_for_status()
 
             # Parse protobuf feed
             feed = gtfs_realtime_pb2.FeedMessage()
             feed.ParseFromString(response.content)
 
+            # Alerts whose content is unchanged since the last download are
+            # reused as-is instead of being parsed again
+            previous = cls._parsed_alerts.get(feed_type, {})
+            parsed = {}
             alerts = []
+            reused = 0
             for entity in feed.entity:
-                if entity.HasField('alert'):
-                    alert = MTAAlertsService._parse_alert(entity.alert, entity.id)
-                    if alert:
-                        alerts.append(alert)
+                if not entity.HasField('alert') or entity.id in parsed:
+                    continue
+                fingerprint = cls.fingerprint(entity.alert)
+                entry = previous.get(entity.id)
+                if entry and entry['fingerprint'] == fingerprint:
+                    alert = entry
+                    reused += 1
+                else:
+                    alert = cls._parse_alert(entity.alert, entity.id)
+                    if not alert:
+                        continue
+                    alert['feed_type'] = feed_type
+                    alert['fingerprint'] = fingerprint
+                parsed[entity.id] = alert
+                alerts.append(alert)
+            cls._parsed_alerts[feed_type] = parsed
 
-            print(f"Fetched {len(alerts)} alerts from {feed_type}")
+            print(f"Fetched {len(alerts)} alerts from {feed_type} ({reused} unchanged)")
             return alerts
 
         except requests.exceptions.RequestException as e:
             print(f"Error fetching MTA alerts: {e}")
-            return []
+            return None
         except Exception as e:
             print(f"Error parsing MTA alerts: {e}")
-            return []
-
-
+            return None
+    
+    @staticmethod
+    def fingerprint(alert_data):
+        """Content hash of a GTFS-RT alert, stable across downloads of the same alert"""
+        return hashlib.sha1(alert_data.SerializeToString(deterministic=True)).hexdigest()
+    
     @staticmethod
     def _parse_alert(alert_data, alert_id):
         """
@@ -170,29 +283,77 @@ class MTAAlertsService:
         else:
             return "low"
     
-    @staticmethod
-    def fetch_all_alerts():
-        """Fetch alerts from all feeds"""
-        all_alerts = []
+    @classmethod
+    def fetch_all_alerts(cls):
+        """
+        Fetch alerts from all feeds concurrently
         
-        for feed_type in MTAAlertsService.ALERT_FEEDS.keys():
-            alerts = MTAAlertsService.fetch_alerts(feed_type)
-            for alert in alerts:
-                alert['feed_type'] = feed_type
-            all_alerts.extend(alerts)
-            time.sleep(0.5)  # Rate limiting
+        The whole fan-out is bounded by ALERT_FETCH_BUDGET seconds. A feed
+        that fails, or is still downloading when the budget runs out,
+        contributes its last cached alerts (if any); a slow one keeps
+        refreshing in the pool.
+        """
+        app = current_app._get_current_object()
+        
+        def fetch_in_context(feed_type):
+            with app.app_context():
+                return cls.fetch_alerts(feed_type)
+        
+        executor = cls.get_executor()
+        futures = {
+            feed_type: executor.submit(fetch_in_context, feed_type)
+            for feed_type in cls.ALERT_FEEDS
+        }
+        wait(futures.values(), timeout=app.config['ALERT_FETCH_BUDGET'])
+        
+        all_alerts = []
+        for feed_type, future in futures.items():
+            if future.done():
+                try:
+                    all_alerts.extend(future.result())
+                    continue
+                except Exception as e:
+                    print(f"Error fetching {feed_type} alerts: {e}")
+            else:
+                print(f"Alert feed {feed_type} still loading after {app.config['ALERT_FETCH_BUDGET']}s")
+            
+            # Fall back to the feed's last good alerts
+            cached = cls._feed_cache.get(feed_type)
+            if cached:
+                all_alerts.extend(cached[1])
         
         return all_alerts
     
+    @classmethod
+    def get_route_ids(cls):
+        """IDs of all known routes, loaded once and reloaded after routes change"""
+        route_ids = cls._route_ids
+        if route_ids is None:
+            route_ids = frozenset(route_id for (route_id,) in db.session.query(Route.id))
+            cls._route_ids = route_ids
+        return route_ids
+    
+    @classmethod
+    def invalidate_route_ids(cls):
+        """Drop the cached route IDs so the next tick reloads them"""
+        cls._route_ids = None
+    
     @staticmethod
     def update_service_status_from_alerts():
         """
         Update service status in database based on fetched alerts
         This replaces the manual status updates
+        
+        Only routes whose status changed since their latest row are written,
+        in a single bulk insert; unaffected routes already in good service
+        are skipped.
         """
         try:
+            started = time.perf_counter()
+            
             # Fetch subway alerts (most common)
             alerts = MTAAlertsService.fetch_alerts('subway')
+            fetched = time.perf_counter()
             
             # Group alerts by route
             route_alerts = {}
@@ -202,40 +363,43 @@ class MTAAlertsService:
                         route_alerts[route_id] = []
                     route_alerts[route_id].append(alert)
             
-            # Update status for each affected route
+            # Status for each affected route from its most severe alert
+            statuses = {}
             for route_id, alerts_list in route_alerts.items():
-                # Get the most severe alert
                 most_severe = max(alerts_list, 
                                 key=lambda x: ['low', 'medium', 'high', 'critical'].index(x['severity']))
-                
-                # Create or update service status
-                status = ServiceStatus(
-                    route_id=route_id,
-                    status=most_severe['effect'].lower().replace('_', ' '),
-                    message=most_severe['header'] or most_severe['description'],
-                    severity=most_severe['severity'],
-                    timestamp=datetime.utcnow()
-                )
-                
-                db.session.add(status)
-            
-            # Mark routes with no alerts as good service
-            all_routes = Route.query.all()
-            for route in all_routes:
-                if route.id not in route_alerts:
-                    status = ServiceStatus(
-                        route_id=route.id,
-                        status='good_service',
-                        message='No delays',
-                        severity='low',
-                        timestamp=datetime.utcnow()
-                    )
-                    db.session.add(status)
+                statuses[route_id] = {
+                    'status': most_severe['effect'].lower().replace('_', ' '),
+                    'message': most_severe['header'] or most_severe['description'],
+                    'severity': most_severe['severity']
+                }
+            
+            # Routes with no alerts are in good service
+            for route_id in MTAAlertsService.get_route_ids():
+                if route_id not in statuses:
+                    statuses[route_id] = {
+                        'status': 'good_service',
+                        'message': 'No delays',
+                        'severity': 'low'
+                    }
             
+            written, skipped = ServiceStatus.insert_transitions(statuses, MTAAlertsService.get_route_ids())
             db.session.commit()
-            print(f"Updated service status for {len(route_alerts)} routes with alerts")
+            finished = time.perf_counter()
+            
+            print(
+                f"Updated service status for {len(route_alerts)} routes with alerts: "
+                f"{written} written, {skipped} unchanged "
+                f"(fetch {(fetched - started) * 1000:.0f} ms, "
+                f"write {(finished - fetched) * 1000:.0f} ms)"
+            )
             
         except Exception as e:
             db.session.rollback()
             print(f"Error updating service status from alerts: {e}")
 
+
+@event.listens_for(Route, 'after_insert')
+@event.listens_for(Route, 'after_delete')
+def _routes_changed(mapper, connection, target):
+    MTAAlertsService.invalidate_route_ids()
@@ -4,6 +4,9 @@ from app import db
 from app.models.route import Route
 from app.models.station import Station
 from app.models.service_status import ServiceStatus
+from app.services.alert_store import AlertStore
+from app.services.mta_alerts_service import MTAAlertsService
+from app.services.status_retention import StatusRetentionService
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 
@@ -36,24 +39,17 @@ class MTAAPIService:
             return
 
         try:
+            statuses = {}
             for route_data in status_data.get('routes', []):
-                route_id = route_data.get('id')
-                status = route_data.get('status', 'good_service')
-                message = route_data.get('message', '')
-                severity = route_data.get('severity', 'low')
-
-                new_status = ServiceStatus(
-                    route_id=route_id,
-                    status=status,
-                    message=message,
-                    severity=severity,
-                    timestamp=datetime.utcnow()
-                )
-
-                db.session.add(new_status)
+                statuses[route_data.get('id')] = {
+                    'status': route_data.get('status', 'good_service'),
+                    'message': route_data.get('message', ''),
+                    'severity': route_data.get('severity', 'low')
+                }
 
+            written, skipped = ServiceStatus.insert_transitions(statuses, MTAAlertsService.get_route_ids())
             db.session.commit()
-            print(f"Updated service status at {datetime.utcnow()}")
+            print(f"Updated service status at {datetime.utcnow()}: {written} written, {skipped} unchanged")
 
         except Exception as e:
             db.session.rollback()
@@ -117,10 +113,34 @@ def start_scheduler(app):
         with app.app_context():
             MTAAPIService.update_service_status()
 
+    def alert_store_job():
+        with app.app_context():
+            AlertStore.refresh()
+
+    def retention_job():
+        with app.app_context():
+            StatusRetentionService.compact_history()
+
     scheduler.add_job(
         func=update_job,
         trigger='interval',
         seconds=app.config['STATUS_UPDATE_INTERVAL']
     )
 
+    scheduler.add_job(
+        func=alert_store_job,
+        trigger='interval',
+        seconds=app.config['ALERT_STORE_REFRESH_INTERVAL'],
+        max_instances=1,
+        coalesce=True
+    )
+
+    scheduler.add_job(
+        func=retention_job,
+        trigger='interval',
+        seconds=app.config['STATUS_RETENTION_INTERVAL'],
+        max_instances=1,
+        coalesce=True
+    )
+
     scheduler.start()
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, tuple_
+from app import db
+from app.models.service_status import ServiceStatus
+
+
+class StatusRetentionService:
+    """
+    Keeps the service_status history table bounded
+
+    Rows newer than STATUS_RETENTION_FULL_DAYS are kept as written. Older
+    history is compacted to transitions only: a row that repeats the
+    previous row for its route (same status, message and severity) carries
+    no information and is deleted, so each route keeps one row per change.
+    History is walked once in (route_id, timestamp) order, in batches of
+    STATUS_RETENTION_BATCH_SIZE rows that each resume from the last row of
+    the previous batch. Each batch's deletes run in their own short
+    transaction, so request threads never wait behind one long write.
+    """
+
+    @staticmethod
+    def _next_batch(cutoff, after, limit):
+        """
+        Up to limit rows older than cutoff, in (route_id, timestamp, id) order
+
+        after is the (route_id, timestamp, id) of the last row already
+        processed, or None to start from the beginning. The keyset predicate
+        lets every batch resume where the previous one stopped.
+        """
+        table = ServiceStatus.__table__
+        query = select(
+            table.c.id, table.c.route_id, table.c.timestamp,
+            table.c.status, table.c.message, table.c.severity
+        ).where(table.c.timestamp < cutoff)
+
+        if after is not None:
+            # Row-value comparison, so the database seeks straight to the
+            # resume point on ix_service_status_route_timestamp
+            query = query.where(tuple_(table.c.route_id, table.c.timestamp, table.c.id) > tuple_(*after))
+
+        query = query.order_by(table.c.route_id, table.c.timestamp, table.c.id).limit(limit)
+        return db.session.execute(query).all()
+
+    @staticmethod
+    def compact_history(now=None):
+        """
+        Delete repeated status rows older than the full-resolution window
+
+        Returns:
+            Number of rows deleted
+        """
+        config = current_app.config
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=config['STATUS_RETENTION_FULL_DAYS'])
+        batch_size = config['STATUS_RETENTION_BATCH_SIZE']
+        table = ServiceStatus.__table__
+
+        deleted = 0
+        started = time.perf_counter()
+        after = None
+        previous = None  # (route_id, status, message, severity) of the last row seen
+        try:
+            while True:
+                rows = StatusRetentionService._next_batch(cutoff, after, batch_size)
+                if not rows:
+                    break
+
+                # A row that repeats the previous row for its route is redundant
+                ids = []
+                for row in rows:
+                    current = (row.route_id, row.status, row.message, row.severity)
+                    if current == previous:
+                        ids.append(row.id)
+                    previous = current
+
+                if ids:
+                    db.session.execute(table.delete().where(table.c.id.in_(ids)))
+                db.session.commit()
+                deleted += len(ids)
+
+                if len(rows) < batch_size:
+                    break
+                last = rows[-1]
+                after = (last.route_id, last.timestamp, last.id)
+                # Let other writers take the database lock between batches
+                time.sleep(config['STATUS_RETENTION_BATCH_PAUSE'])
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error compacting service status history: {e}")
+
+        elapsed = (time.perf_counter() - started) * 1000
+        print(f"Compacted service status history before {cutoff.isoformat()}: {deleted} rows deleted in {elapsed:.0f} ms")
+        return deleted
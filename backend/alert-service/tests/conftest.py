@@ -0,0 +1,40 @@
+import pytest
+from flask import Flask
+from app import db
+from app.config import Config
+
+
+@pytest.fixture
+def app():
+    """Bare app on an in-memory database (no blueprints or scheduler)"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    """Test client with the stations blueprint registered"""
+    from app.routes.stations import stations_bp
+
+    app.register_blueprint(stations_bp, url_prefix='/api/stations')
+    return app.test_client()
+
+
+@pytest.fixture
+def local_cache(monkeypatch):
+    """CacheService with an empty in-process tier and no Redis"""
+    from collections import OrderedDict
+    from app.services.cache_service import CacheService
+
+    monkeypatch.setattr(CacheService, '_local', OrderedDict())
+    monkeypatch.setattr(CacheService, 'get_redis', classmethod(lambda cls: None))
+    monkeypatch.setattr(CacheService, 'get_raw_redis', classmethod(lambda cls: None))
+    return CacheService
@@ -0,0 +1,131 @@
+from collections import deque
+from datetime import datetime
+import pytest
+from app.services.alert_store import ActivePeriodIndex, AlertSnapshot, AlertStore
+from app.services.cache_service import CacheService
+from app.services.mta_alerts_service import MTAAlertsService
+
+
+def alert(alert_id, fingerprint, feed_type='subway', routes=('A',), periods=()):
+    return {
+        'id': alert_id,
+        'feed_type': feed_type,
+        'fingerprint': fingerprint,
+        'affected_routes': list(routes),
+        'severity': 'high',
+        'effect': 'DETOUR',
+        'active_period': [
+            {'start': datetime.fromtimestamp(start) if start else None,
+             'end': datetime.fromtimestamp(end) if end else None}
+            for start, end in periods
+        ]
+    }
+
+
+@pytest.fixture
+def feeds(app, monkeypatch):
+    """Serve AlertStore refreshes from a mutable list of alerts"""
+    current = []
+    monkeypatch.setattr(MTAAlertsService, 'fetch_all_alerts', staticmethod(lambda: list(current)))
+    monkeypatch.setattr(CacheService, 'delete', classmethod(lambda cls, key: True))
+    monkeypatch.setattr(AlertStore, '_snapshot', None)
+    monkeypatch.setattr(AlertStore, '_history', deque(maxlen=3))
+    return current
+
+
+def test_version_is_derived_from_content():
+    first = AlertSnapshot.build([alert('a', 'f1'), alert('b', 'f2')])
+    same = AlertSnapshot.build([alert('b', 'f2'), alert('a', 'f1')])
+    updated = AlertSnapshot.build([alert('a', 'f1'), alert('b', 'f3')])
+
+    assert first.version == same.version
+    assert first.version != updated.version
+
+
+def test_changes_since_reports_added_updated_and_removed(feeds):
+    feeds[:] = [alert('a', 'f1'), alert('b', 'f2')]
+    since = AlertStore.refresh().version
+
+    feeds[:] = [alert('a', 'f1-new'), alert('c', 'f3')]
+    snapshot = AlertStore.refresh()
+    _, changes = AlertStore.changes_since(since)
+
+    assert [a['id'] for a in changes['added']] == ['c']
+    assert [a['id'] for a in changes['updated']] == ['a']
+    assert changes['removed'] == [('subway', 'b')]
+    assert AlertStore.changes_since(snapshot.version)[1] == {'added': [], 'updated': [], 'removed': []}
+
+
+def test_changes_since_unknown_or_evicted_version_resets(feeds):
+    feeds[:] = [alert('a', 'f0')]
+    evicted = AlertStore.refresh().version
+    for i in range(1, 5):  # History holds 3 versions
+        feeds[:] = [alert('a', f'f{i}')]
+        AlertStore.refresh()
+
+    assert AlertStore.changes_since(evicted)[1] is None
+    assert AlertStore.changes_since('not-a-version')[1] is None
+
+
+def test_unchanged_refresh_keeps_version(feeds):
+    feeds[:] = [alert('a', 'f1')]
+    version = AlertStore.refresh().version
+    assert AlertStore.refresh().version == version
+    assert len(AlertStore._history) == 1
+
+
+def brute_force_active(periods, timestamp):
+    active = set()
+    for index, start, end in periods:
+        if (start is None or start <= timestamp) and (end is None or timestamp <= end + 0.999):
+            active.add(index)
+    return active
+
+
+def test_active_period_index_segment_boundaries():
+    index = ActivePeriodIndex([(0, 10, 20), (1, 15, None), (0, 18, 30), (2, 20, 20)])
+
+    assert index.active_at(9) == set()
+    assert index.active_at(10) == {0}          # Start is inclusive
+    assert index.active_at(14.9) == {0}
+    assert index.active_at(20) == {0, 1, 2}    # End is inclusive
+    assert index.active_at(20.5) == {0, 1, 2}  # ...to the second
+    assert index.active_at(21) == {0, 1}
+    assert index.active_at(30) == {0, 1}       # Overlapping periods of one alert
+    assert index.active_at(31) == {1}
+    assert index.active_at(10 ** 12) == {1}    # Open-ended
+
+
+def test_active_period_index_open_start_and_unbounded():
+    index = ActivePeriodIndex([(0, None, 100), (1, None, None), (2, 50, 40)])
+
+    assert index.active_at(-10 ** 12) == {0, 1}
+    assert index.active_at(100) == {0, 1}
+    assert index.active_at(101) == {1}
+    assert 2 not in index.active_at(45)        # Inverted period is ignored
+
+
+def test_active_period_index_matches_brute_force():
+    periods = [
+        (i % 7, None if i % 11 == 0 else i * 3, None if i % 13 == 0 else i * 3 + (i % 5) * 4)
+        for i in range(60)
+    ]
+    index = ActivePeriodIndex(periods)
+
+    for timestamp in range(-5, 200):
+        assert index.active_at(timestamp) == brute_force_active(periods, timestamp), timestamp
+
+
+def test_query_intersects_route_and_active_window(feeds):
+    feeds[:] = [
+        alert('a', 'f1', routes=('A',), periods=[(100, 200)]),
+        alert('b', 'f2', routes=('A', 'C'), periods=[]),
+        alert('c', 'f3', routes=('C',), periods=[(150, None)]),
+        alert('d', 'f4', feed_type='bus_bronx', routes=('Bx1',), periods=[(None, 120)])
+    ]
+    snapshot = AlertStore.refresh()
+
+    assert [a['id'] for a in snapshot.query(route_id='A', active_at=150)] == ['a', 'b']
+    assert [a['id'] for a in snapshot.query(route_id='C', active_at=120)] == ['b']
+    assert [a['id'] for a in snapshot.query(active_at=110)] == ['a', 'b', 'd']
+    assert snapshot.query(feed_type='bus_bronx', active_at=121) == []
@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import json
+import threading
+import time
+from app.services.cache_service import CacheService
+
+
+def test_l1_evicts_the_least_recently_used_key(app, local_cache):
+    app.config['CACHE_L1_MAX_ENTRIES'] = 2
+    local_cache.set('a', 1)
+    local_cache.set('b', 2)
+    assert local_cache.get('a') == 1  # a is now the most recently used
+
+    local_cache.set('c', 3)
+
+    assert local_cache.get('b') is None
+    assert (local_cache.get('a'), local_cache.get('c')) == (1, 3)
+
+
+def test_l1_entries_expire_with_their_timeout(app, local_cache):
+    local_cache.set('a', 1, timeout=0.05)
+    assert local_cache.get('a') == 1
+
+    time.sleep(0.06)
+
+    assert local_cache.get('a') is None
+
+
+def test_delete_drops_the_l1_copy_and_announces_it(app, local_cache, monkeypatch):
+    published = []
+
+    class Client:
+        def delete(self, key):
+            pass
+
+        def publish(self, channel, message):
+            published.append((channel, message))
+
+    local_cache.set('a', 1)
+    monkeypatch.setattr(CacheService, 'get_redis', classmethod(lambda cls: Client()))
+
+    local_cache.delete('a')
+
+    assert local_cache._local_get('a') is None
+    assert published == [(app.config['CACHE_INVALIDATION_CHANNEL'], f'{CacheService._instance_id}:a')]
+
+
+def test_invalidation_from_another_worker_drops_the_l1_copy(app, local_cache):
+    local_cache.set('a', 1)
+    local_cache.set('b:1', 2)
+
+    local_cache._on_invalidation(f'{CacheService._instance_id}:a')  # Our own announcement
+    local_cache._on_invalidation('other-worker:b:1')
+
+    assert local_cache.get('a') == 1
+    assert local_cache.get('b:1') is None
+
+
+def test_gzip_body_is_served_only_when_accepted(app, local_cache):
+    app.config['CACHE_GZIP_MIN_BYTES'] = 100
+    entry = CacheService.encode_response({'trains': ['A'] * 100})
+    assert entry.gzip_body
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip, deflate'}):
+        response = CacheService.respond(entry)
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == entry.body
+    assert response.headers['Vary'] == 'Accept-Encoding'
+
+    with app.test_request_context():
+        response = CacheService.respond(entry)
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_data() == entry.body
+
+
+def test_small_bodies_are_not_compressed(app, local_cache):
+    app.config['CACHE_GZIP_MIN_BYTES'] = 100
+    entry = CacheService.encode_response({'trains': []})
+
+    with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = CacheService.respond(entry)
+
+    assert not entry.gzip_body
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_etag_is_the_body_hash_and_matches_give_304(app, local_cache):
+    entry = CacheService.encode_response({'count': 1})
+    assert entry.etag == hashlib.sha1(entry.body).hexdigest()
+    assert CacheService.encode_response({'count': 1}).etag == entry.etag
+
+    with app.test_request_context(headers={'If-None-Match': f'"{entry.etag}"'}):
+        response = CacheService.respond(entry)
+        assert response.status_code == 304
+        assert CacheService.not_modified(entry.etag).status_code == 304
+
+    with app.test_request_context(headers={'If-None-Match': '"something-else"'}):
+        assert CacheService.respond(entry).status_code == 200
+        assert CacheService.not_modified(entry.etag) is None
+
+
+def test_set_response_round_trips_through_l1(app, local_cache):
+    stored = CacheService.set_response('trains', {'count': 2}, timeout=30)
+
+    assert CacheService.get_response('trains') == stored
+    assert json.loads(stored.body) == {'count': 2}
+
+
+def run_concurrently(app, count, target):
+    """Call target() from count threads released together; returns their results"""
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def worker(i):
+        with app.app_context():
+            barrier.wait()
+            results[i] = target()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def slow_loader(value, calls, delay=0.1):
+    def loader():
+        calls.append(1)
+        time.sleep(delay)
+        return value
+    return loader
+
+
+def test_concurrent_misses_call_the_loader_once(app, local_cache):
+    calls = []
+    loader = slow_loader({'count': 3}, calls)
+
+    results = run_concurrently(app, 8, lambda: CacheService.get_or_build('trains', loader, timeout=30))
+
+    assert len(calls) == 1
+    assert results == [{'count': 3}] * 8
+
+
+def test_concurrent_response_misses_call_the_loader_once(app, local_cache):
+    calls = []
+    loader = slow_loader({'count': 3}, calls)
+
+    results = run_concurrently(app, 8, lambda: CacheService.get_or_build_response('trains', loader, timeout=30))
+
+    assert len(calls) == 1
+    assert len({entry.body for entry in results}) == 1
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(app, local_cache):
+    CacheService.get_or_build_response('trains', lambda: {'version': 1}, timeout=30, stale_timeout=60)
+    # Push the entry past its soft TTL, keeping it inside the hard one
+    expires, entry = CacheService._local['response:trains']
+    CacheService._local['response:trains'] = (expires, entry._replace(fresh_until=time.time() - 1))
+
+    release = threading.Event()
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        release.wait(5)
+        return {'version': 2}
+
+    served = [
+        CacheService.get_or_build_response('trains', refresh, timeout=30, stale_timeout=60)
+        for _ in range(5)
+    ]
+    assert [json.loads(entry.body) for entry in served] == [{'version': 1}] * 5
+
+    release.set()
+    for _ in range(100):
+        if not CacheService._inflight:
+            break
+        time.sleep(0.01)
+
+    assert len(calls) == 1
+    entry = CacheService.get_or_build_response('trains', refresh, timeout=30, stale_timeout=60)
+    assert json.loads(entry.body) == {'version': 2}
+    assert len(calls) == 1
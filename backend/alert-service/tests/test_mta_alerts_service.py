@@ -0,0 +1,20 @@
+from app.services.mta_alerts_service import MTAAlertsService
+
+
+def test_fetch_all_alerts_falls_back_to_cache_when_a_feed_raises(app, monkeypatch):
+    def fetch_alerts(feed_type='subway'):
+        if feed_type == 'lirr':
+            raise ValueError('app context lost')
+        return [{'id': f'{feed_type}-1', 'feed_type': feed_type}]
+
+    monkeypatch.setattr(MTAAlertsService, 'fetch_alerts', staticmethod(fetch_alerts))
+    monkeypatch.setattr(MTAAlertsService, '_feed_cache', {
+        'lirr': (0, [{'id': 'lirr-cached', 'feed_type': 'lirr'}])
+    })
+
+    alerts = MTAAlertsService.fetch_all_alerts()
+
+    ids = {alert['id'] for alert in alerts}
+    assert 'lirr-cached' in ids
+    assert 'subway-1' in ids
+    assert len(alerts) == len(MTAAlertsService.ALERT_FEEDS)
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.route import Route
+from app.models.service_status import ServiceStatus
+
+START = datetime(2026, 1, 1)
+
+
+def add_routes(*route_ids):
+    db.session.add_all([Route(id=route_id, name=route_id) for route_id in route_ids])
+    db.session.commit()
+
+
+def add_status(route_id, status, minutes, message='m', severity='low'):
+    db.session.add(ServiceStatus(
+        route_id=route_id, status=status, message=message, severity=severity,
+        timestamp=START + timedelta(minutes=minutes)
+    ))
+
+
+def test_latest_by_route_returns_only_newest_row_per_route(app):
+    add_routes('A', 'B', 'C')
+    for minute in range(50):
+        add_status('A', f'a{minute}', minute)
+        add_status('B', f'b{minute}', 49 - minute)
+    db.session.commit()
+
+    latest = ServiceStatus.latest_by_route()
+
+    assert {route_id: status.status for route_id, status in latest.items()} == {'A': 'a49', 'B': 'b0'}
+
+
+def test_latest_by_route_breaks_timestamp_ties_by_id(app):
+    add_routes('A')
+    add_status('A', 'first', 0)
+    add_status('A', 'second', 0)
+    db.session.commit()
+
+    assert ServiceStatus.latest_by_route()['A'].status == 'second'
+
+
+def status(value, message='m', severity='low'):
+    return {'status': value, 'message': message, 'severity': severity}
+
+
+def test_insert_transitions_writes_only_changed_routes(app):
+    add_routes('A', 'B', 'C')
+    route_ids = {'A', 'B', 'C'}
+
+    assert ServiceStatus.insert_transitions(
+        {'A': status('good_service'), 'B': status('delays')}, route_ids, START
+    ) == (2, 0)
+
+    written, skipped = ServiceStatus.insert_transitions({
+        'A': status('good_service'),                    # unchanged
+        'B': status('delays', severity='high'),         # severity changed
+        'C': status('good_service'),                    # first row
+        'X': status('delays')                           # not in the routes table
+    }, route_ids, START + timedelta(minutes=1))
+    db.session.commit()
+
+    assert (written, skipped) == (2, 2)
+    assert ServiceStatus.query.filter_by(route_id='A').count() == 1
+    assert ServiceStatus.query.filter_by(route_id='B').count() == 2
+    assert ServiceStatus.query.filter_by(route_id='X').count() == 0
+    assert ServiceStatus.latest_by_route()['B'].severity == 'high'
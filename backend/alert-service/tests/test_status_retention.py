@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models.route import Route
+from app.models.service_status import ServiceStatus
+from app.services.status_retention import StatusRetentionService
+
+NOW = datetime(2026, 6, 1)
+
+
+def add_history(route_id, statuses, start):
+    for hour, status in enumerate(statuses):
+        db.session.add(ServiceStatus(
+            route_id=route_id, status=status, message='m', severity='low',
+            timestamp=start + timedelta(hours=hour)
+        ))
+
+
+def history(route_id):
+    rows = ServiceStatus.query.filter_by(route_id=route_id).order_by(ServiceStatus.timestamp).all()
+    return [row.status for row in rows]
+
+
+def test_compaction_keeps_exactly_the_transitions(app):
+    app.config['STATUS_RETENTION_FULL_DAYS'] = 7
+    app.config['STATUS_RETENTION_BATCH_SIZE'] = 3  # Force runs to span batches
+    app.config['STATUS_RETENTION_BATCH_PAUSE'] = 0
+    db.session.add_all([Route(id='A', name='A'), Route(id='B', name='B')])
+
+    old = NOW - timedelta(days=30)
+    add_history('A', ['good', 'good', 'good', 'delays', 'delays', 'good', None, None, 'good', 'good'], old)
+    add_history('B', ['good', 'good', 'delays', 'delays', 'delays', 'delays', 'good'], old)
+    # Inside the full-resolution window: kept as written
+    add_history('A', ['good', 'good', 'good'], NOW - timedelta(days=1))
+    db.session.commit()
+
+    deleted = StatusRetentionService.compact_history(now=NOW)
+
+    assert history('A') == ['good', 'delays', 'good', None, 'good', 'good', 'good', 'good']
+    assert history('B') == ['good', 'delays', 'good']
+    assert deleted == 5 + 4
+
+
+def test_compaction_is_idempotent(app):
+    app.config['STATUS_RETENTION_BATCH_PAUSE'] = 0
+    db.session.add(Route(id='A', name='A'))
+    add_history('A', ['good', 'delays', 'good'], NOW - timedelta(days=30))
+    db.session.commit()
+
+    assert StatusRetentionService.compact_history(now=NOW) == 0
+    assert history('A') == ['good', 'delays', 'good']
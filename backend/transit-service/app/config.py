@@ -42,6 +42,19 @@ class Config:
     # Cache Configuration
     REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
     CACHE_DEFAULT_TIMEOUT = 30  # seconds
+    CACHE_L1_MAX_ENTRIES = 256  # In-process LRU entries per worker
+    CACHE_INVALIDATION_CHANNEL = 'transit-cache-invalidate'
+    CACHE_GZIP_MIN_BYTES = 1024  # Smaller cached responses are not worth compressing
+    SINGLE_FLIGHT_LOCK_TIMEOUT = 15  # Max seconds one worker may hold a cache rebuild lock
     
     # Update intervals (in seconds)
     REALTIME_UPDATE_INTERVAL = 30  # Update train positions every 30 seconds
+    FLEET_HISTORY_SECONDS = 600  # How far back /trains/changes can diff before resetting clients
+    
+    # Feed fetching (pollers only; requests never fetch feeds themselves)
+    REALTIME_FEED_TIMEOUT = 10  # Per-feed deadline
+    REALTIME_FETCH_WORKERS = 8  # HTTP connection pool size
+    
+    # Live position stream (Server-Sent Events)
+    STREAM_MAX_SUBSCRIBERS = 500  # Open streams per worker process
+    STREAM_HEARTBEAT_INTERVAL = 15  # Seconds between keep-alive comments on idle streams
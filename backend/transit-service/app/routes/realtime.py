@@ -1,35 +1,157 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request
 from app.services.realtime_service import RealtimeService
 from app.services.cache_service import CacheService
+from app.services.feed_store import FeedStore
+from app.services.geo_index import GeoIndex
+from app.services.stream_hub import StreamHub
 from datetime import datetime
+import time
 
 realtime_bp = Blueprint('realtime', __name__)
 
 @realtime_bp.route('/trains', methods=['GET'])
 def get_all_trains():
     """Get all train positions across all feeds"""
-    # Try cache first
-    cached = CacheService.get('all_train_positions')
-    if cached:
-        return jsonify(cached)
+    # Validators come from the FeedHeader timestamps, so clients polling an
+    # unchanged fleet get a 304 before the cache is even consulted
+    snapshots = RealtimeService.get_snapshots(RealtimeService.SUBWAY_FEEDS)
+    etag, last_modified = RealtimeService.snapshot_validators(snapshots)
+    not_modified = CacheService.not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
     
-    all_positions = []
-    feeds = ['123456S', 'ACE', 'BDFM', 'G', 'JZ', 'NQRW', 'L', '7']
+    # Cached as already-encoded response bytes under one stable key, tagged
+    # with the ETag and Last-Modified of the snapshots it was built from, so
+    # both validators always describe the body they are sent with. Fresh for
+    # 30 seconds and until the feeds move on, then served stale for up to 60
+    # more while one background refresh runs. Concurrent misses are
+    # coalesced into a single rebuild. Partial results aren't cached.
+    entry = CacheService.get_or_build_response(
+        'all_train_positions',
+        _build_all_trains,
+        timeout=30,
+        cacheable=lambda result: 'errors' not in result,
+        stale_timeout=60,
+        etag=etag
+    )
     
-    for feed_id in feeds:
-        positions = RealtimeService.fetch_train_positions(feed_id)
-        all_positions.extend(positions)
+    return CacheService.respond(entry)
+
+def _build_all_trains():
+    """
+    Assemble the all-trains payload from the feed snapshots
+    
+    Returns:
+        Tuple of (payload, (etag, last_modified)), all derived from the same snapshots
+    """
+    snapshots, errors = RealtimeService.load_snapshots(RealtimeService.SUBWAY_FEEDS)
+    
+    all_positions = [
+        position.to_dict() for snapshot in snapshots for position in snapshot.positions
+    ]
     
-    # Cache for 30 seconds
     result = {
         'trains': all_positions,
         'count': len(all_positions),
+        'feed_timestamp': RealtimeService.latest_feed_timestamp(snapshots),
         'timestamp': datetime.utcnow().isoformat()
     }
     
-    CacheService.set('all_train_positions', result, timeout=30)
+    if errors:
+        result['errors'] = errors
+    
+    return result, RealtimeService.snapshot_validators(snapshots)
+
+@realtime_bp.route('/trains/changes', methods=['GET'])
+def get_train_changes():
+    """
+    Get trains added, moved or removed since a fleet version (?since=<version>)
+    
+    Without since, the full fleet is returned with full=true. When since is
+    unknown (older than the retained history, or from a fleet this worker
+    never held) the full fleet is returned with reset=true as well, and the
+    client should replace its state. Clients pass the returned version as
+    since on their next poll.
+    """
+    since = request.args.get('since')
+    
+    if since is not None:
+        version, changes = FeedStore.changes_since(since)
+        if changes is not None:
+            return jsonify({
+                'version': version,
+                'since': since,
+                'full': False,
+                'reset': False,
+                'added': [position.to_dict() for position in changes['added']],
+                'moved': [position.to_dict() for position in changes['moved']],
+                'removed': changes['removed'],
+                'timestamp': datetime.utcnow().isoformat()
+            })
     
-    return jsonify(result)
+    version, positions = FeedStore.get_fleet()
+    trains = [position.to_dict() for position in positions]
+    return jsonify({
+        'version': version,
+        'since': since,
+        'full': True,
+        'reset': since is not None,
+        'trains': trains,
+        'count': len(trains),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+@realtime_bp.route('/stream', methods=['GET'])
+def stream_trains():
+    """
+    Server-Sent Events stream of live train updates
+    
+    Subscribe with any of ?routes=A,C ?feeds=L and ?station=127. Each topic
+    is sent once on connect and again whenever its feed is re-polled. A
+    slow client only receives the latest update per topic.
+    """
+    topics = []
+    for route_id in _split_param('routes'):
+        route_id = route_id.upper()
+        if not RealtimeService.get_feed_for_route(route_id):
+            return jsonify({'error': f'Unknown route: {route_id}'}), 404
+        topics.append(('route', route_id))
+    for feed_id in _split_param('feeds'):
+        if feed_id not in current_app.config['MTA_FEEDS']:
+            return jsonify({'error': f'Unknown feed: {feed_id}'}), 404
+        topics.append(('feed', feed_id))
+    for station_id in _split_param('station'):
+        topics.append(('station', station_id))
+    
+    if not topics:
+        return jsonify({'error': 'Subscribe to at least one of routes, feeds or station'}), 400
+    
+    subscriber = StreamHub.subscribe(topics)
+    if subscriber is None:
+        return jsonify({'error': 'Too many open streams, try again later'}), 503
+    
+    heartbeat = current_app.config['STREAM_HEARTBEAT_INTERVAL']
+    
+    def generate():
+        while True:
+            events = subscriber.drain(heartbeat)
+            if not events:
+                yield b': keep-alive\n\n'
+            for event in events:
+                yield event
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    # The slot is released when the server closes the response, whether or
+    # not the stream was ever iterated, so an abandoned stream can't leak it
+    response.call_on_close(lambda: StreamHub.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def _split_param(name):
+    """Comma-separated query parameter as a list of non-empty values"""
+    value = request.args.get(name, '')
+    return [item.strip() for item in value.split(',') if item.strip()]
 
 @realtime_bp.route('/route/<route_id>', methods=['GET'])
 def get_trains_by_route(route_id):
@@ -40,72 +162,126 @@ def get_trains_by_route(route_id):
     if not feed_id:
         return jsonify({'error': f'Unknown route: {route_id}'}), 404
     
-    # Try cache
-    cache_key = f'train_positions_{route_id}'
-    cached = CacheService.get(cache_key)
-    if cached:
-        return jsonify(cached)
-    
-    # Fetch positions
-    positions = RealtimeService.fetch_train_positions(feed_id)
-    
-    # Filter by route
-    route_positions = [
-        pos for pos in positions 
-        if pos['route_id'] == route_id.upper()
-    ]
+    snapshots = RealtimeService.get_snapshots([feed_id])
+    etag, last_modified = RealtimeService.snapshot_validators(snapshots)
+    not_modified = CacheService.not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
     
-    result = {
-        'route_id': route_id,
-        'trains': route_positions,
-        'count': len(route_positions),
-        'timestamp': datetime.utcnow().isoformat()
-    }
+    def build_route_trains():
+        # Re-read the snapshots so the payload and its validators describe
+        # the same feed version. Snapshots are already grouped by route.
+        snapshots = RealtimeService.get_snapshots([feed_id])
+        route_positions = [
+            pos.to_dict() for snapshot in snapshots
+            for pos in snapshot.positions_by_route.get(route_id.upper(), ())
+        ]
+        
+        return {
+            'route_id': route_id,
+            'trains': route_positions,
+            'count': len(route_positions),
+            'feed_timestamp': RealtimeService.latest_feed_timestamp(snapshots),
+            'timestamp': datetime.utcnow().isoformat()
+        }, RealtimeService.snapshot_validators(snapshots)
     
-    CacheService.set(cache_key, result, timeout=30)
+    # Try cache (stable key, tagged with the feed version), coalescing
+    # concurrent misses
+    entry = CacheService.get_or_build_response(
+        f'train_positions_{route_id}', build_route_trains, timeout=30,
+        stale_timeout=30, etag=etag
+    )
     
-    return jsonify(result)
+    return CacheService.respond(entry)
 
 @realtime_bp.route('/feed/<feed_id>', methods=['GET'])
 def get_trains_by_feed(feed_id):
     """Get all trains in a specific feed"""
-    positions = RealtimeService.fetch_train_positions(feed_id)
+    snapshots = RealtimeService.get_snapshots([feed_id])
+    etag, last_modified = RealtimeService.snapshot_validators(snapshots)
+    not_modified = CacheService.not_modified(etag, last_modified)
+    if not_modified:
+        return not_modified
     
-    return jsonify({
+    positions = [pos.to_dict() for snapshot in snapshots for pos in snapshot.positions]
+    
+    return _with_validators(jsonify({
         'feed_id': feed_id,
         'trains': positions,
         'count': len(positions),
+        'feed_timestamp': RealtimeService.latest_feed_timestamp(snapshots),
         'timestamp': datetime.utcnow().isoformat()
+    }), etag, last_modified)
+
+def _with_validators(response, etag, last_modified):
+    """Attach feed-derived ETag / Last-Modified headers to a response"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+@realtime_bp.route('/nearby', methods=['GET'])
+def get_nearby_trains():
+    """Get trains near given coordinates (?lat=&lon=&radius= in km, optional ?limit=)"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius', default=0.5, type=float)
+    limit = request.args.get('limit', type=int)
+    
+    error = GeoIndex.point_error(lat, lon) or GeoIndex.search_error(radius, limit)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    snapshots, errors = RealtimeService.load_snapshots(RealtimeService.SUBWAY_FEEDS)
+    
+    # Each snapshot carries a grid index over its trains, built when it was polled
+    nearby = RealtimeService.get_nearby_trains(snapshots, lat, lon, radius, limit=limit)
+    trains = [
+        {**position.to_dict(), 'distance': round(distance, 2)}
+        for position, distance in nearby
+    ]
+    
+    return jsonify({
+        'latitude': lat,
+        'longitude': lon,
+        'radius': radius,
+        'trains': trains,
+        'count': len(trains),
+        'feed_timestamp': RealtimeService.latest_feed_timestamp(snapshots),
+        'timestamp': datetime.utcnow().isoformat(),
+        'errors': errors
     })
 
 @realtime_bp.route('/station/<station_id>', methods=['GET'])
 def get_trains_at_station(station_id):
     """Get trains currently at or approaching a station"""
-    # Get all train positions
-    all_positions = []
-    feeds = ['123456S', 'ACE', 'BDFM', 'G', 'JZ', 'NQRW', 'L', '7']
-    
-    for feed_id in feeds:
-        positions = RealtimeService.fetch_train_positions(feed_id)
-        all_positions.extend(positions)
+    snapshots, errors = RealtimeService.load_snapshots(RealtimeService.SUBWAY_FEEDS)
     
     # Filter trains at this station
     station_trains = [
-        pos for pos in all_positions
-        if pos['current_stop'] and station_id in pos['current_stop']
+        pos.to_dict() for snapshot in snapshots for pos in snapshot.positions
+        if pos.current_stop and station_id in pos.current_stop
     ]
     
     return jsonify({
         'station_id': station_id,
         'trains': station_trains,
         'count': len(station_trains),
-        'timestamp': datetime.utcnow().isoformat()
+        'feed_timestamp': RealtimeService.latest_feed_timestamp(snapshots),
+        'timestamp': datetime.utcnow().isoformat(),
+        'errors': errors
     })
 
 @realtime_bp.route('/arrivals/<station_id>', methods=['GET'])
 def get_station_arrivals(station_id):
-    """Get upcoming arrivals at a station"""
+    """Get upcoming arrivals at a station (optionally ?route= and ?direction=N|S)"""
     route_id = request.args.get('route')
+    direction = request.args.get('direction', type=str)
+    
+    if direction:
+        direction = direction.upper()
+        if direction not in ('N', 'S'):
+            return jsonify({'error': f'Unknown direction: {direction}'}), 400
     
     # Get feed(s) to check
     if route_id:
@@ -114,37 +290,26 @@ def get_station_arrivals(station_id):
             return jsonify({'error': f'Unknown route: {route_id}'}), 404
         feeds = [feed_id]
     else:
-        feeds = ['123456S', 'ACE', 'BDFM', 'G', 'JZ', 'NQRW', 'L', '7']
+        feeds = RealtimeService.SUBWAY_FEEDS
     
-    # Fetch trip updates
-    all_arrivals = []
-    for feed_id in feeds:
-        updates = RealtimeService.fetch_trip_updates(feed_id)
-        
-        for update in updates:
-            for stop_time in update['stop_time_updates']:
-                if stop_time['stop_id'] and station_id in stop_time['stop_id']:
-                    if stop_time['arrival']:
-                        all_arrivals.append({
-                            'route_id': update['route_id'],
-                            'trip_id': update['trip_id'],
-                            'vehicle_id': update['vehicle_id'],
-                            'stop_id': stop_time['stop_id'],
-                            'arrival_time': stop_time['arrival'].isoformat(),
-                            'minutes_until_arrival': int(
-                                (stop_time['arrival'] - datetime.utcnow()).total_seconds() / 60
-                            )
-                        })
-    
-    # Sort by arrival time
-    all_arrivals.sort(key=lambda x: x['arrival_time'])
-    
-    # Only show upcoming arrivals
-    upcoming = [a for a in all_arrivals if a['minutes_until_arrival'] >= 0]
+    snapshots, errors = RealtimeService.load_snapshots(feeds)
+    
+    # Exact stop ID lookup in the per-feed arrival indexes, already sorted
+    upcoming = list(RealtimeService.get_upcoming_arrivals(
+        snapshots, station_id, direction=direction, route_id=route_id
+    ))
+    
+    now = time.time()
+    arrivals = [
+        RealtimeService.arrival_to_dict(arrival, now)
+        for arrival in upcoming[:10]  # Next 10 trains
+    ]
     
     return jsonify({
         'station_id': station_id,
-        'arrivals': upcoming[:10],  # Next 10 trains
+        'arrivals': arrivals,
         'count': len(upcoming),
-        'timestamp': datetime.utcnow().isoformat()
+        'feed_timestamp': RealtimeService.latest_feed_timestamp(snapshots),
+        'timestamp': datetime.utcnow().isoformat(),
+        'errors': errors
     })
\ No newline at end of file
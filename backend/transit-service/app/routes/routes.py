@@ -7,16 +7,13 @@ routes_bp = Blueprint('routes', __name__)
 @routes_bp.route('/', methods=['GET'])
 def get_all_routes():
     """Get all transit routes"""
-    cached = CacheService.get('all_routes')
-    if cached:
-        return jsonify(cached)
+    entry = CacheService.get_or_build_response(
+        'all_routes',
+        lambda: [route.to_dict() for route in Route.query.all()],
+        timeout=300
+    )
     
-    routes = Route.query.all()
-    result = [route.to_dict() for route in routes]
-    
-    CacheService.set('all_routes', result, timeout=300)
-    
-    return jsonify(result)
+    return CacheService.respond(entry)
 
 @routes_bp.route('/<route_id>', methods=['GET'])
 def get_route(route_id):
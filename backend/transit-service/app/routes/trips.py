@@ -1,26 +1,72 @@
-from flask import Blueprint, jsonify
-from app.services.realtime_service import RealtimeService
+from flask import Blueprint, jsonify, request
+from app.services.feed_store import FeedStore
 from datetime import datetime
 
 trips_bp = Blueprint('trips', __name__)
 
+MAX_BATCH_TRIPS = 200
+
+def _trip_to_dict(feed_id, update):
+    """Format an indexed trip update for the API"""
+    snapshot = FeedStore.get(feed_id)
+    feed_timestamp = snapshot.feed_timestamp if snapshot else None
+    
+    return {
+        'trip_id': update['trip_id'],
+        'route_id': update['route_id'],
+        'vehicle_id': update['vehicle_id'],
+        'feed_id': feed_id,
+        'stops': update['stop_time_updates'],
+        'feed_timestamp': feed_timestamp.isoformat() if feed_timestamp else None,
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
 @trips_bp.route('/<trip_id>', methods=['GET'])
 def get_trip_details(trip_id):
     """Get details and real-time updates for a specific trip"""
-    # Try all feeds to find this trip
-    feeds = ['123456S', 'ACE', 'BDFM', 'G', 'JZ', 'NQRW', 'L', '7']
+    # Trip index is maintained on every feed refresh; never touches the network
+    entry = FeedStore.get_trip(trip_id)
+    if not entry:
+        return jsonify({'error': 'Trip not found'}), 404
+    
+    return jsonify(_trip_to_dict(*entry))
+
+@trips_bp.route('/batch', methods=['POST'])
+def get_trips_batch():
+    """Get details for many trips in one call (JSON body: {"trip_ids": [...]})"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Body must be a JSON object'}), 400
+    trip_ids = data.get('trip_ids')
+    
+    if not isinstance(trip_ids, list) or not trip_ids:
+        return jsonify({'error': 'trip_ids list required'}), 400
+    if len(trip_ids) > MAX_BATCH_TRIPS:
+        return jsonify({'error': f'At most {MAX_BATCH_TRIPS} trip_ids per request'}), 400
+    if not all(isinstance(trip_id, str) for trip_id in trip_ids):
+        return jsonify({'error': 'trip_ids must be strings'}), 400
     
-    for feed_id in feeds:
-        updates = RealtimeService.fetch_trip_updates(feed_id)
-        
-        for update in updates:
-            if update['trip_id'] == trip_id:
-                return jsonify({
-                    'trip_id': trip_id,
-                    'route_id': update['route_id'],
-                    'vehicle_id': update['vehicle_id'],
-                    'stops': update['stop_time_updates'],
-                    'timestamp': datetime.utcnow().isoformat()
-                })
+    trips = {}
+    not_found = []
+    for trip_id in trip_ids:
+        entry = FeedStore.get_trip(trip_id)
+        if entry:
+            trips[trip_id] = _trip_to_dict(*entry)
+        else:
+            not_found.append(trip_id)
+    
+    return jsonify({
+        'trips': trips,
+        'not_found': not_found,
+        'count': len(trips)
+    })
+
+@trips_bp.route('/vehicle/<vehicle_id>', methods=['GET'])
+def get_vehicle_trip(vehicle_id):
+    """Get the trip a vehicle is currently running"""
+    vehicle_entry = FeedStore.get_vehicle_trip(vehicle_id)
+    trip_entry = FeedStore.get_trip(vehicle_entry[1]) if vehicle_entry else None
+    if not trip_entry:
+        return jsonify({'error': 'Vehicle not found'}), 404
     
-    return jsonify({'error': 'Trip not found'}), 404
+    return jsonify(_trip_to_dict(*trip_entry))
\ No newline at end of file
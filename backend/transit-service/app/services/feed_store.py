@@ -0,0 +1,298 @@
+import hashlib
+import sys
+import threading
+from collections import deque
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Optional
+
+
+class VehiclePosition:
+    """
+    Compact record for one train in a feed snapshot
+    
+    Status, congestion and occupancy are kept as their GTFS-RT enum values
+    (small ints, -1 when absent), the timestamp as epoch seconds (None when
+    the vehicle reports none) and route and stop IDs are interned, so a
+    snapshot holds one slotted object per train instead of two dicts. to_dict() builds the API representation
+    only when a response is serialized.
+    """
+    __slots__ = (
+        'vehicle_id', 'trip_id', 'route_id', 'latitude', 'longitude', 'bearing',
+        'current_stop', 'status', 'timestamp', 'congestion_level', 'occupancy_status'
+    )
+    
+    STATUS_TEXT = ('INCOMING_AT', 'STOPPED_AT', 'IN_TRANSIT_TO')
+    CONGESTION_TEXT = ('UNKNOWN', 'RUNNING_SMOOTHLY', 'STOP_AND_GO', 'CONGESTION', 'SEVERE_CONGESTION')
+    OCCUPANCY_TEXT = (
+        'EMPTY', 'MANY_SEATS_AVAILABLE', 'FEW_SEATS_AVAILABLE',
+        'STANDING_ROOM_ONLY', 'CRUSHED_STANDING_ROOM_ONLY', 'FULL', 'NOT_ACCEPTING_PASSENGERS'
+    )
+    
+    def __init__(self, vehicle_id, trip_id, route_id, latitude, longitude, bearing,
+                 current_stop, status, timestamp, congestion_level, occupancy_status):
+        self.vehicle_id = vehicle_id
+        self.trip_id = trip_id
+        self.route_id = sys.intern(route_id) if route_id else route_id
+        self.latitude = latitude  # None when the feed has no position
+        self.longitude = longitude
+        self.bearing = bearing
+        self.current_stop = sys.intern(current_stop) if current_stop else current_stop
+        self.status = status
+        self.timestamp = timestamp
+        self.congestion_level = congestion_level
+        self.occupancy_status = occupancy_status
+    
+    @staticmethod
+    def _enum_text(table, value, default='UNKNOWN'):
+        return table[value] if 0 <= value < len(table) else default
+    
+    def to_dict(self):
+        """API representation (same shape the realtime endpoints have always returned)"""
+        position = None
+        if self.latitude is not None:
+            position = {
+                'latitude': self.latitude,
+                'longitude': self.longitude,
+                'bearing': self.bearing
+            }
+        
+        return {
+            'vehicle_id': self.vehicle_id,
+            'trip_id': self.trip_id,
+            'route_id': self.route_id,
+            'position': position,
+            'current_stop': self.current_stop,
+            'status': self._enum_text(self.STATUS_TEXT, self.status),
+            # Without a vehicle timestamp, fall back to the current UTC time
+            'timestamp': datetime.fromtimestamp(self.timestamp) if self.timestamp is not None else datetime.utcnow(),
+            'congestion_level': self._enum_text(self.CONGESTION_TEXT, self.congestion_level),
+            'occupancy_status': self._enum_text(self.OCCUPANCY_TEXT, self.occupancy_status)
+        }
+
+
+@dataclass(frozen=True)
+class FeedSnapshot:
+    """
+    Immutable decoded view of one GTFS-RT feed, published by its poller
+    
+    positions is a tuple of VehiclePosition, positions_by_route groups the
+    same records by route ID and vehicle_index is a GeoIndex over the
+    trains that report a location.
+    
+    arrivals_by_stop maps (parent_station_id, direction) to a tuple of
+    (arrival_epoch, route_id, trip_id, vehicle_id, stop_id) sorted by
+    arrival time; direction is 'N', 'S' or None for unsuffixed stop IDs.
+    
+    version is the fleet version assigned by FeedStore.publish (see
+    FeedStore.fleet_version).
+    """
+    feed_id: str
+    positions: tuple
+    trip_updates: tuple
+    feed_timestamp: Optional[datetime]
+    fetched_at: datetime
+    arrivals_by_stop: dict
+    positions_by_route: dict = field(default_factory=dict)
+    vehicle_index: Optional[object] = None
+    version: str = ''
+
+
+class FeedStore:
+    """Latest snapshot per feed, shared by every realtime and trips route"""
+    _snapshots = {}
+    _trips = {}  # trip_id -> (feed_id, trip update)
+    _vehicles = {}  # vehicle_id -> (feed_id, trip_id)
+    _fleet = {}  # vehicle key -> (feed_id, position) across all feeds
+    _errors = {}  # feed_id -> (message, failed_at) for feeds whose last poll failed
+    _version = ''
+    _lock = threading.Lock()
+
+    # Recent fleet states as (version, fleet), kept for changes_since. One
+    # entry per changed publish; resized from the poll interval by
+    # configure_history.
+    FLEET_HISTORY_SIZE = 60
+    _history = deque(maxlen=FLEET_HISTORY_SIZE)
+
+    @classmethod
+    def configure_history(cls, seconds, poll_interval, feed_count):
+        """
+        Keep enough fleet states for changes_since to cover seconds of history
+        
+        Every feed publishes once per poll_interval, and each publish that
+        changes the fleet adds one entry.
+        """
+        size = max(1, -(-seconds // poll_interval) * feed_count)
+        with cls._lock:
+            cls._history = deque(cls._history, maxlen=size)
+        return size
+
+    @staticmethod
+    def fleet_version(snapshots):
+        """
+        Version of the fleet assembled from these per-feed snapshots
+        
+        A hash of each feed's FeedHeader timestamp (or fetch time when the
+        header has none), so every worker process holding the same feed
+        messages reports the same version, whichever order it polled them in.
+        """
+        stamps = sorted(
+            (s.feed_id, (s.feed_timestamp or s.fetched_at).timestamp()) for s in snapshots
+        )
+        tag = '|'.join(f'{feed_id}:{ts:.0f}' for feed_id, ts in stamps)
+        return hashlib.sha1(tag.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def publish(cls, snapshot):
+        """
+        Swap in a new snapshot for its feed (copy-on-write, readers never block)
+        
+        The trip and vehicle indexes and the fleet history are updated in
+        the same step: entries owned by the feed's previous snapshot are
+        dropped and replaced. Returns the snapshot with its version set.
+        """
+        feed_id = snapshot.feed_id
+        with cls._lock:
+            previous = cls._snapshots.get(feed_id)
+            others = [s for key, s in cls._snapshots.items() if key != feed_id]
+            version = cls.fleet_version(others + [snapshot])
+            snapshot = replace(snapshot, version=version)
+            trips = dict(cls._trips)
+            vehicles = dict(cls._vehicles)
+            
+            if previous:
+                for update in previous.trip_updates:
+                    entry = trips.get(update['trip_id'])
+                    if entry and entry[0] == feed_id:
+                        del trips[update['trip_id']]
+                for vehicle_id in [v for v, entry in vehicles.items() if entry[0] == feed_id]:
+                    del vehicles[vehicle_id]
+            
+            for update in snapshot.trip_updates:
+                if update['trip_id']:
+                    trips[update['trip_id']] = (feed_id, update)
+                    if update['vehicle_id']:
+                        vehicles[update['vehicle_id']] = (feed_id, update['trip_id'])
+            for position in snapshot.positions:
+                if position.vehicle_id and position.trip_id:
+                    vehicles.setdefault(position.vehicle_id, (feed_id, position.trip_id))
+            
+            fleet = {key: entry for key, entry in cls._fleet.items() if entry[0] != feed_id}
+            for position in snapshot.positions:
+                key = cls.vehicle_key(position)
+                if key:
+                    fleet[key] = (feed_id, position)
+            
+            snapshots = dict(cls._snapshots)
+            snapshots[feed_id] = snapshot
+            cls._snapshots = snapshots
+            if feed_id in cls._errors:
+                cls._errors = {key: value for key, value in cls._errors.items() if key != feed_id}
+            cls._trips = trips
+            cls._vehicles = vehicles
+            cls._fleet = fleet
+            # Re-publishing an unchanged feed message leaves the version as is
+            if version != cls._version:
+                cls._history.append((version, fleet))
+            cls._version = version
+        
+        return snapshot
+
+    @staticmethod
+    def vehicle_key(position):
+        """Stable identity for a train across snapshots (vehicle ID, else trip ID)"""
+        return position.vehicle_id or position.trip_id
+
+    @classmethod
+    def current_version(cls):
+        """Version of the current fleet ('' before any publish)"""
+        return cls._version
+
+    @classmethod
+    def get_fleet(cls):
+        """Current VehiclePositions of every train across all feeds, with the fleet version"""
+        with cls._lock:
+            return cls._version, [position for _, position in cls._fleet.values()]
+
+    @classmethod
+    def changes_since(cls, since):
+        """
+        Diff the current fleet against the fleet as of version since
+        
+        Returns:
+            Tuple of (version, changes) where changes is a dict of added,
+            moved and removed trains, or None if since is unknown to this
+            process or no longer retained (the caller should reset the
+            client to a full snapshot)
+        """
+        with cls._lock:
+            version = cls._version
+            current = cls._fleet
+            base = None
+            if since == version:
+                base = current
+            else:
+                for entry_version, fleet in cls._history:
+                    if entry_version == since:
+                        base = fleet
+                        break
+        
+        if base is None:
+            return version, None
+        
+        added = []
+        moved = []
+        for key, (_, position) in current.items():
+            old = base.get(key)
+            if old is None:
+                added.append(position)
+            elif cls._position_changed(old[1], position):
+                moved.append(position)
+        removed = [key for key in base if key not in current]
+        
+        return version, {'added': added, 'moved': moved, 'removed': removed}
+
+    @staticmethod
+    def _position_changed(old, new):
+        """Whether a train's location or stop status differs between snapshots"""
+        return (
+            old.latitude != new.latitude
+            or old.longitude != new.longitude
+            or old.bearing != new.bearing
+            or old.current_stop != new.current_stop
+            or old.status != new.status
+        )
+
+    @classmethod
+    def record_error(cls, feed_id, message):
+        """Remember that the latest poll of a feed failed (cleared by its next publish)"""
+        with cls._lock:
+            errors = dict(cls._errors)
+            errors[feed_id] = (message, datetime.utcnow())
+            cls._errors = errors
+
+    @classmethod
+    def get_error(cls, feed_id):
+        """Get (message, failed_at) for a feed whose latest poll failed, or None"""
+        return cls._errors.get(feed_id)
+
+    @classmethod
+    def get(cls, feed_id):
+        """Get the latest snapshot for a feed, or None before its first poll"""
+        return cls._snapshots.get(feed_id)
+
+    @classmethod
+    def get_many(cls, feed_ids):
+        """Get the latest snapshots for several feeds, skipping feeds not yet polled"""
+        snapshots = cls._snapshots
+        return [snapshots[feed_id] for feed_id in feed_ids if feed_id in snapshots]
+
+    @classmethod
+    def get_trip(cls, trip_id):
+        """Look up a trip across all feeds, returning (feed_id, trip update) or None"""
+        return cls._trips.get(trip_id)
+
+    @classmethod
+    def get_vehicle_trip(cls, vehicle_id):
+        """Look up the trip a vehicle is running, returning (feed_id, trip_id) or None"""
+        return cls._vehicles.get(vehicle_id)
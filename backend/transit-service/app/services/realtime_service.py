@@ -1,12 +1,27 @@
+import heapq
 import requests
+import threading
+import time
+from bisect import bisect_left
+from itertools import islice
+from operator import itemgetter
 from flask import current_app
+from requests.adapters import HTTPAdapter
 from google.transit import gtfs_realtime_pb2
-from datetime import datetime
+from datetime import datetime, timezone
+from app.services.feed_store import FeedStore, FeedSnapshot, VehiclePosition
+from app.services.geo_index import GeoIndex
 
 
 class RealtimeService:
     """Service to fetch and process real-time train positions"""
     
+    # Subway feeds served by the all-feeds realtime and trips endpoints
+    SUBWAY_FEEDS = ['123456S', 'ACE', 'BDFM', 'G', 'JZ', 'NQRW', 'L', '7']
+    
+    _session = None
+    _init_lock = threading.Lock()
+    
     @staticmethod
     def get_feed_for_route(route_id):
         """Determine which feed contains this route"""
@@ -24,177 +39,343 @@ class RealtimeService:
         }
         return route_to_feed.get(route_id.upper())
     
+    @classmethod
+    def get_session(cls):
+        """Get the pooled HTTP session shared by pollers and fan-out fetches (singleton)"""
+        if cls._session is None:
+            with cls._init_lock:
+                if cls._session is None:
+                    pool_size = current_app.config['REALTIME_FETCH_WORKERS']
+                    adapter = HTTPAdapter(
+                        pool_connections=pool_size,
+                        pool_maxsize=pool_size
+                    )
+                    session = requests.Session()
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    cls._session = session
+        return cls._session
+    
     @staticmethod
-    def fetch_train_positions(feed_id):
+    def refresh_feed(feed_id):
         """
-        Fetch real-time train positions from MTA GTFS-RT feed
+        Download and decode a GTFS-RT feed once, then publish it to the FeedStore
+        
+        Called by the per-feed pollers in scheduler.py. A failure is recorded
+        in the FeedStore, so request handlers can report it without
+        fetching the feed themselves.
         
         Args:
             feed_id: Feed identifier (e.g., '123456S', 'ACE', 'L')
         
         Returns:
-            List of train position dictionaries
+            The published FeedSnapshot, or None if the fetch failed
         """
         try:
-            # Get feed URL
-            feeds = current_app.config['MTA_FEEDS']
-            feed_url_suffix = feeds.get(feed_id)
-            if not feed_url_suffix:
-                print(f"Unknown feed ID: {feed_id}")
-                return []
-            
-            # Construct full URL
-            base_url = current_app.config['MTA_API_BASE_URL']
-            url = f"{base_url}/{feed_url_suffix}"
-            
-            # Fetch the GTFS-RT feed (no API key required)
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            # Parse the protobuf data
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
-            
-            # Extract vehicle positions
-            positions = []
-            for entity in feed.entity:
-                if entity.HasField('vehicle'):
-                    position = RealtimeService._parse_vehicle_position(entity.vehicle)
-                    if position:
-                        positions.append(position)
-            
-            print(f"Fetched {len(positions)} train positions from {feed_id}")
-            return positions
-            
+            return RealtimeService._download_and_publish(feed_id)
         except requests.exceptions.RequestException as e:
-            print(f"Error fetching train positions: {e}")
-            return []
+            print(f"Error fetching feed {feed_id}: {e}")
+            FeedStore.record_error(feed_id, f"Fetch failed: {e}")
+            return None
         except Exception as e:
-            print(f"Error parsing train positions: {e}")
-            return []
+            print(f"Error parsing feed {feed_id}: {e}")
+            FeedStore.record_error(feed_id, f"Parse failed: {e}")
+            return None
+    
+    @staticmethod
+    def _download_and_publish(feed_id):
+        """Fetch, decode and publish one feed, raising on any failure"""
+        # Get feed URL
+        feeds = current_app.config['MTA_FEEDS']
+        feed_url_suffix = feeds.get(feed_id)
+        if not feed_url_suffix:
+            raise ValueError(f"Unknown feed ID: {feed_id}")
+        
+        # Construct full URL
+        base_url = current_app.config['MTA_API_BASE_URL']
+        url = f"{base_url}/{feed_url_suffix}"
+        
+        # Fetch the GTFS-RT feed (no API key required)
+        response = RealtimeService.get_session().get(
+            url, timeout=current_app.config['REALTIME_FEED_TIMEOUT']
+        )
+        response.raise_for_status()
+        
+        positions, trip_updates, feed_timestamp = RealtimeService.decode_feed(response.content)
+        
+        snapshot = FeedSnapshot(
+            feed_id=feed_id,
+            positions=tuple(positions),
+            trip_updates=tuple(trip_updates),
+            feed_timestamp=feed_timestamp,
+            fetched_at=datetime.utcnow(),
+            arrivals_by_stop=RealtimeService.build_arrivals_index(trip_updates),
+            positions_by_route=RealtimeService.group_by_route(positions),
+            vehicle_index=RealtimeService.build_vehicle_index(positions)
+        )
+        snapshot = FeedStore.publish(snapshot)
+        
+        print(f"Refreshed {feed_id}: {len(snapshot.positions)} trains, {len(snapshot.trip_updates)} trip updates")
+        return snapshot
+    
+    @staticmethod
+    def load_snapshots(feed_ids):
+        """
+        Get the published snapshots for the given feeds, never touching the network
+        
+        Feeds without a snapshot (not polled yet, or every poll so far has
+        failed) are left out and reported in errors with their last poll
+        failure, so request latency never depends on an MTA round-trip.
+        
+        Returns:
+            Tuple of (snapshots, errors) where errors maps feed_id to a message
+        """
+        snapshots = FeedStore.get_many(feed_ids)
+        loaded = {snapshot.feed_id for snapshot in snapshots}
+        missing = [feed_id for feed_id in feed_ids if feed_id not in loaded]
+        
+        errors = {}
+        for feed_id in missing:
+            failure = FeedStore.get_error(feed_id)
+            if failure:
+                message, failed_at = failure
+                errors[feed_id] = f"{message} (last attempt {failed_at.isoformat()})"
+            else:
+                errors[feed_id] = 'Waiting for first poll'
+        return snapshots, errors
+    
+    @staticmethod
+    def decode_feed(content):
+        """
+        Decode raw GTFS-RT bytes in a single walk over the feed entities
+        
+        Args:
+            content: Protobuf-encoded FeedMessage bytes
+        
+        Returns:
+            Tuple of (positions, trip_updates, feed_timestamp) where
+            feed_timestamp is the FeedHeader timestamp as a datetime (or None)
+        """
+        feed = gtfs_realtime_pb2.FeedMessage()
+        feed.ParseFromString(content)
+        
+        feed_timestamp = None
+        if feed.header.HasField('timestamp'):
+            feed_timestamp = datetime.fromtimestamp(feed.header.timestamp)
+        
+        positions = []
+        trip_updates = []
+        for entity in feed.entity:
+            if entity.HasField('vehicle'):
+                position = RealtimeService._parse_vehicle_position(entity.vehicle)
+                if position:
+                    positions.append(position)
+            if entity.HasField('trip_update'):
+                update = RealtimeService._parse_trip_update(entity.trip_update)
+                if update:
+                    trip_updates.append(update)
+        
+        return positions, trip_updates, feed_timestamp
+    
+    @staticmethod
+    def group_by_route(positions):
+        """Group VehiclePositions by route ID, so route filters are a dictionary lookup"""
+        by_route = {}
+        for position in positions:
+            by_route.setdefault(position.route_id, []).append(position)
+        return {route_id: tuple(group) for route_id, group in by_route.items()}
+    
+    @staticmethod
+    def build_vehicle_index(positions):
+        """Build a GeoIndex over the VehiclePositions that report a location"""
+        located = [position for position in positions if position.latitude is not None]
+        return GeoIndex(located, [(position.latitude, position.longitude) for position in located])
+    
+    @staticmethod
+    def get_nearby_trains(snapshots, lat, lon, radius, limit=None):
+        """
+        Get trains within radius km of a point from the snapshots' vehicle indexes
+        
+        Returns:
+            List of (VehiclePosition, distance_km) pairs, nearest first
+        """
+        runs = [
+            snapshot.vehicle_index.within(lat, lon, radius, limit=limit)
+            for snapshot in snapshots if snapshot.vehicle_index is not None
+        ]
+        nearby = heapq.merge(*runs, key=itemgetter(1))
+        return list(islice(nearby, limit) if limit is not None else nearby)
+    
+    @staticmethod
+    def split_stop_id(stop_id):
+        """Split a GTFS stop ID like '127N' into ('127', 'N'); unsuffixed IDs get None"""
+        if len(stop_id) > 1 and stop_id[-1] in ('N', 'S'):
+            return stop_id[:-1], stop_id[-1]
+        return stop_id, None
+    
+    @staticmethod
+    def build_arrivals_index(trip_updates):
+        """
+        Index predicted arrivals by parent station and direction
+        
+        Built once per feed refresh so arrival boards are a dictionary lookup
+        instead of a scan over every trip update.
+        
+        Returns:
+            Dict of (parent_station_id, direction) -> tuple of
+            (arrival_epoch, route_id, trip_id, vehicle_id, stop_id) sorted by arrival
+        """
+        index = {}
+        for update in trip_updates:
+            for stop_time in update['stop_time_updates']:
+                stop_id = stop_time['stop_id']
+                if not stop_id or not stop_time['arrival']:
+                    continue
+                key = RealtimeService.split_stop_id(stop_id)
+                index.setdefault(key, []).append((
+                    stop_time['arrival'].timestamp(),
+                    update['route_id'],
+                    update['trip_id'],
+                    update['vehicle_id'],
+                    stop_id
+                ))
+        
+        return {key: tuple(sorted(arrivals, key=itemgetter(0))) for key, arrivals in index.items()}
+    
+    @staticmethod
+    def get_upcoming_arrivals(snapshots, station_id, direction=None, route_id=None):
+        """
+        Get upcoming arrivals at a station from the snapshots' arrival indexes
+        
+        Args:
+            snapshots: Feed snapshots to read
+            station_id: Parent station ID ('127') or directional stop ID ('127N')
+            direction: Optional 'N' or 'S'
+            route_id: Optional route to filter by
+        
+        Returns:
+            Iterator of arrival tuples merged across feeds in arrival order
+        """
+        parent_id, suffix = RealtimeService.split_stop_id(station_id)
+        direction = suffix or direction
+        keys = [(parent_id, direction)] if direction else [
+            (parent_id, 'N'), (parent_id, 'S'), (parent_id, None)
+        ]
+        
+        now = (time.time(),)
+        runs = []
+        for snapshot in snapshots:
+            for key in keys:
+                arrivals = snapshot.arrivals_by_stop.get(key)
+                if arrivals:
+                    # Entries are sorted, so skip departed trains with a bisect
+                    start = bisect_left(arrivals, now)
+                    runs.append(arrivals[start:])
+        
+        upcoming = heapq.merge(*runs, key=itemgetter(0))
+        if route_id:
+            route_id = route_id.upper()
+            upcoming = (arrival for arrival in upcoming if arrival[1] == route_id)
+        return upcoming
+    
+    @staticmethod
+    def arrival_to_dict(arrival, now):
+        """Serialize an arrival index tuple, with minutes counted from epoch time now"""
+        arrival_ts, route_id, trip_id, vehicle_id, stop_id = arrival
+        return {
+            'route_id': route_id,
+            'trip_id': trip_id,
+            'vehicle_id': vehicle_id,
+            'stop_id': stop_id,
+            'arrival_time': datetime.fromtimestamp(arrival_ts).isoformat(),
+            'minutes_until_arrival': int((arrival_ts - now) / 60)
+        }
+    
+    @staticmethod
+    def get_snapshots(feed_ids):
+        """Get the latest decoded snapshots for the given feeds"""
+        return FeedStore.get_many(feed_ids)
+    
+    @staticmethod
+    def latest_feed_timestamp(snapshots):
+        """Most recent FeedHeader timestamp across snapshots, as an ISO string"""
+        timestamps = [s.feed_timestamp for s in snapshots if s.feed_timestamp]
+        return max(timestamps).isoformat() if timestamps else None
+    
+    @staticmethod
+    def snapshot_validators(snapshots):
+        """
+        HTTP validators for a response built from these snapshots
+        
+        The ETag is the FeedStore.fleet_version of the snapshots, so it only
+        changes when a feed does and matches the version /trains/changes and
+        the stream report for the same feed messages.
+        
+        Returns:
+            Tuple of (etag, last_modified) where last_modified is a UTC datetime or None
+        """
+        etag = FeedStore.fleet_version(snapshots)
+        
+        feed_timestamps = [s.feed_timestamp for s in snapshots if s.feed_timestamp]
+        last_modified = max(feed_timestamps).astimezone(timezone.utc) if feed_timestamps else None
+        return etag, last_modified
+    
+    @staticmethod
+    def fetch_train_positions(feed_id):
+        """
+        Get real-time train positions from the latest snapshot of a feed
+        
+        Args:
+            feed_id: Feed identifier (e.g., '123456S', 'ACE', 'L')
+        
+        Returns:
+            List of train position dictionaries (empty until the feed is first polled)
+        """
+        snapshot = FeedStore.get(feed_id)
+        return [position.to_dict() for position in snapshot.positions] if snapshot else []
     
     @staticmethod
     def _parse_vehicle_position(vehicle):
-        """Parse GTFS-RT vehicle position into structured format"""
+        """Parse GTFS-RT vehicle position into a compact VehiclePosition"""
         try:
-            position = None
+            latitude = longitude = bearing = None
             if vehicle.HasField('position'):
-                position = {
-                    'latitude': vehicle.position.latitude,
-                    'longitude': vehicle.position.longitude,
-                    'bearing': vehicle.position.bearing if vehicle.position.HasField('bearing') else None
-                }
-            
-            # Get trip information
-            trip_id = vehicle.trip.trip_id if vehicle.trip.HasField('trip_id') else None
-            route_id = vehicle.trip.route_id if vehicle.trip.HasField('route_id') else None
-            
-            # Get current stop
-            current_stop = vehicle.stop_id if vehicle.HasField('stop_id') else None
+                latitude = vehicle.position.latitude
+                longitude = vehicle.position.longitude
+                bearing = vehicle.position.bearing if vehicle.position.HasField('bearing') else None
             
-            # Get status
-            current_status = RealtimeService._get_status_text(
-                vehicle.current_status if vehicle.HasField('current_status') else None
+            # Enum fields stay as their GTFS-RT values; text is looked up at serialization
+            return VehiclePosition(
+                vehicle_id=vehicle.vehicle.id if vehicle.vehicle.HasField('id') else None,
+                trip_id=vehicle.trip.trip_id if vehicle.trip.HasField('trip_id') else None,
+                route_id=vehicle.trip.route_id if vehicle.trip.HasField('route_id') else None,
+                latitude=latitude,
+                longitude=longitude,
+                bearing=bearing,
+                current_stop=vehicle.stop_id if vehicle.HasField('stop_id') else None,
+                status=vehicle.current_status if vehicle.HasField('current_status') else -1,
+                timestamp=vehicle.timestamp if vehicle.HasField('timestamp') else None,
+                congestion_level=vehicle.congestion_level if vehicle.HasField('congestion_level') else -1,
+                occupancy_status=vehicle.occupancy_status if vehicle.HasField('occupancy_status') else -1
             )
             
-            # Get timestamp
-            timestamp = datetime.fromtimestamp(vehicle.timestamp) if vehicle.HasField('timestamp') else datetime.utcnow()
-            
-            return {
-                'vehicle_id': vehicle.vehicle.id if vehicle.vehicle.HasField('id') else None,
-                'trip_id': trip_id,
-                'route_id': route_id,
-                'position': position,
-                'current_stop': current_stop,
-                'status': current_status,
-                'timestamp': timestamp,
-                'congestion_level': RealtimeService._get_congestion_text(
-                    vehicle.congestion_level if vehicle.HasField('congestion_level') else None
-                ),
-                'occupancy_status': RealtimeService._get_occupancy_text(
-                    vehicle.occupancy_status if vehicle.HasField('occupancy_status') else None
-                )
-            }
-            
         except Exception as e:
             print(f"Error parsing vehicle position: {e}")
             return None
     
-    @staticmethod
-    def _get_status_text(status_enum):
-        """Convert GTFS-RT vehicle status enum to text"""
-        statuses = {
-            0: "INCOMING_AT",
-            1: "STOPPED_AT",
-            2: "IN_TRANSIT_TO"
-        }
-        return statuses.get(status_enum, "UNKNOWN")
-    
-    @staticmethod
-    def _get_congestion_text(congestion_enum):
-        """Convert congestion level enum to text"""
-        levels = {
-            0: "UNKNOWN",
-            1: "RUNNING_SMOOTHLY",
-            2: "STOP_AND_GO",
-            3: "CONGESTION",
-            4: "SEVERE_CONGESTION"
-        }
-        return levels.get(congestion_enum, "UNKNOWN")
-    
-    @staticmethod
-    def _get_occupancy_text(occupancy_enum):
-        """Convert occupancy status enum to text"""
-        statuses = {
-            0: "EMPTY",
-            1: "MANY_SEATS_AVAILABLE",
-            2: "FEW_SEATS_AVAILABLE",
-            3: "STANDING_ROOM_ONLY",
-            4: "CRUSHED_STANDING_ROOM_ONLY",
-            5: "FULL",
-            6: "NOT_ACCEPTING_PASSENGERS"
-        }
-        return statuses.get(occupancy_enum, "UNKNOWN")
-    
     @staticmethod
     def fetch_trip_updates(feed_id):
         """
-        Fetch trip updates (arrival/departure predictions)
+        Get trip updates (arrival/departure predictions) from the latest snapshot
         
         Args:
             feed_id: Feed identifier
         
         Returns:
-            List of trip update dictionaries
+            List of trip update dictionaries (empty until the feed is first polled)
         """
-        try:
-            feeds = current_app.config['MTA_FEEDS']
-            feed_url_suffix = feeds.get(feed_id)
-            if not feed_url_suffix:
-                return []
-            
-            base_url = current_app.config['MTA_API_BASE_URL']
-            url = f"{base_url}/{feed_url_suffix}"
-            
-            # Fetch the GTFS-RT feed (no API key required)
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(response.content)
-            
-            updates = []
-            for entity in feed.entity:
-                if entity.HasField('trip_update'):
-                    update = RealtimeService._parse_trip_update(entity.trip_update)
-                    if update:
-                        updates.append(update)
-            
-            return updates
-            
-        except Exception as e:
-            print(f"Error fetching trip updates: {e}")
-            return []
+        snapshot = FeedStore.get(feed_id)
+        return list(snapshot.trip_updates) if snapshot else []
     
     @staticmethod
     def _parse_trip_update(trip_update):
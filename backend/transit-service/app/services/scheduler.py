@@ -1,15 +1,39 @@
+from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
+from app.services.feed_store import FeedStore
+from app.services.realtime_service import RealtimeService
+from app.services.stream_hub import StreamHub
 
 def start_scheduler(app):
-    """Start background scheduler for periodic updates"""
+    """Start background scheduler with one GTFS-RT poller per MTA feed"""
     scheduler = BackgroundScheduler()
-    
-    def update_job():
+
+    FeedStore.configure_history(
+        app.config['FLEET_HISTORY_SECONDS'],
+        app.config['REALTIME_UPDATE_INTERVAL'],
+        len(app.config['MTA_FEEDS'])
+    )
+
+    def poll_feed_job(feed_id):
         with app.app_context():
-            print(f"Background job running - Real-time data is fetched on-demand via API")
-    
-    # Optional: You can add background jobs here if needed
-    # For now, real-time data is fetched on-demand when API is called
-    
+            snapshot = RealtimeService.refresh_feed(feed_id)
+            if snapshot:
+                StreamHub.broadcast(snapshot)
+
+    # Each feed is downloaded and decoded once per interval; routes only read
+    # the published snapshots from FeedStore, and stream subscribers are
+    # pushed the new snapshot as soon as it is published
+    for feed_id in app.config['MTA_FEEDS']:
+        scheduler.add_job(
+            func=poll_feed_job,
+            args=[feed_id],
+            trigger='interval',
+            seconds=app.config['REALTIME_UPDATE_INTERVAL'],
+            id=f'poll_feed_{feed_id}',
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True
+        )
+
     scheduler.start()
-    print("Transit Service scheduler started")
\ No newline at end of file
+    print(f"Transit Service scheduler started ({len(app.config['MTA_FEEDS'])} feed pollers)")
\ No newline at end of file
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from app.services.feed_store import FeedStore
+from app.services.realtime_service import RealtimeService
+
+
+class StreamSubscriber:
+    """
+    One connected stream client
+
+    Pending events are held per topic and a newer event replaces an unsent
+    one for the same topic, so a slow consumer skips intermediate states
+    instead of growing an unbounded backlog. Every event is a full state
+    for its topic, so nothing is lost by skipping.
+    """
+
+    def __init__(self, topics):
+        self.topics = topics
+        self.dropped = 0
+        self.closed = False
+        self._pending = OrderedDict()  # topic -> encoded event
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def push(self, topic, event):
+        """Queue an encoded event, replacing any unsent event for the same topic"""
+        with self._lock:
+            if topic in self._pending:
+                self.dropped += 1
+                del self._pending[topic]
+            self._pending[topic] = event
+            self._ready.set()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for events and take everything pending"""
+        self._ready.wait(timeout)
+        with self._lock:
+            events = list(self._pending.values())
+            self._pending.clear()
+            self._ready.clear()
+        return events
+
+
+class StreamHub:
+    """
+    Fans out feed snapshots to Server-Sent Events subscribers
+
+    Topics are ('route', route_id), ('feed', feed_id) and ('station',
+    station_id). When a poller publishes a snapshot, each affected topic
+    that has subscribers is encoded once and the same bytes are queued for
+    every subscriber of that topic.
+    """
+    _subscribers = {}  # topic -> tuple of StreamSubscriber (copy-on-write)
+    _count = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def subscribe(cls, topics):
+        """
+        Register a subscriber for the given topics
+
+        Returns:
+            The StreamSubscriber, or None if STREAM_MAX_SUBSCRIBERS is reached
+        """
+        subscriber = StreamSubscriber(topics)
+        with cls._lock:
+            if cls._count >= current_app.config['STREAM_MAX_SUBSCRIBERS']:
+                return None
+            subscribers = dict(cls._subscribers)
+            for topic in topics:
+                subscribers[topic] = subscribers.get(topic, ()) + (subscriber,)
+            cls._subscribers = subscribers
+            cls._count += 1
+
+        # Start the client off with the current state of each topic
+        try:
+            snapshots = FeedStore.get_many(list(current_app.config['MTA_FEEDS']))
+            for topic in topics:
+                event = cls._build_event(topic, snapshots)
+                if event:
+                    subscriber.push(topic, event)
+        except Exception:
+            cls.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    @classmethod
+    def unsubscribe(cls, subscriber):
+        """Remove a subscriber from all of its topics (safe to call more than once)"""
+        with cls._lock:
+            if subscriber.closed:
+                return
+            subscriber.closed = True
+            subscribers = dict(cls._subscribers)
+            for topic in subscriber.topics:
+                remaining = tuple(s for s in subscribers.get(topic, ()) if s is not subscriber)
+                if remaining:
+                    subscribers[topic] = remaining
+                else:
+                    subscribers.pop(topic, None)
+            cls._subscribers = subscribers
+            cls._count -= 1
+
+    @classmethod
+    def broadcast(cls, snapshot):
+        """Push the topics affected by a newly published snapshot to their subscribers"""
+        subscribers = cls._subscribers
+        if not subscribers:
+            return
+
+        snapshots = FeedStore.get_many(list(current_app.config['MTA_FEEDS']))
+        for topic, topic_subscribers in subscribers.items():
+            if not cls._is_affected(topic, snapshot.feed_id):
+                continue
+            event = cls._build_event(topic, snapshots)
+            if not event:
+                continue
+            for subscriber in topic_subscribers:
+                subscriber.push(topic, event)
+
+    @staticmethod
+    def _is_affected(topic, feed_id):
+        """Whether a snapshot of feed_id changes the state of a topic"""
+        kind, key = topic
+        if kind == 'feed':
+            return key == feed_id
+        if kind == 'route':
+            return RealtimeService.get_feed_for_route(key) == feed_id
+        # Station events are built from every feed's arrivals, SIR included
+        return True
+
+    @classmethod
+    def _build_event(cls, topic, snapshots):
+        """Encode the current state of a topic as an SSE event, or None if there is none yet"""
+        kind, key = topic
+
+        if kind == 'station':
+            now = time.time()
+            upcoming = list(RealtimeService.get_upcoming_arrivals(snapshots, key))
+            data = {
+                'station_id': key,
+                'arrivals': [RealtimeService.arrival_to_dict(a, now) for a in upcoming[:10]],
+                'count': len(upcoming),
+                'feed_timestamp': RealtimeService.latest_feed_timestamp(snapshots)
+            }
+        else:
+            feed_id = key if kind == 'feed' else RealtimeService.get_feed_for_route(key)
+            feed_snapshots = [s for s in snapshots if s.feed_id == feed_id]
+            if not feed_snapshots:
+                return None
+            snapshot = feed_snapshots[0]
+            if kind == 'route':
+                positions = snapshot.positions_by_route.get(key, ())
+            else:
+                positions = snapshot.positions
+            data = {
+                f'{kind}_id': key,
+                'trains': [position.to_dict() for position in positions],
+                'count': len(positions),
+                'feed_timestamp': RealtimeService.latest_feed_timestamp(feed_snapshots)
+            }
+
+        data['version'] = FeedStore.current_version()
+        data['timestamp'] = datetime.utcnow().isoformat()
+        return cls.encode_event(kind, current_app.json.dumps(data), event_id=data['version'])
+
+    @staticmethod
+    def encode_event(event, data, event_id=None):
+        """Format one Server-Sent Events message as bytes"""
+        message = f'event: {event}\n'
+        if event_id is not None:
+            message += f'id: {event_id}\n'
+        message += f'data: {data}\n\n'
+        return message.encode('utf-8')
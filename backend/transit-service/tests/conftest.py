@@ -0,0 +1,56 @@
+import pytest
+from flask import Flask
+from app import db
+from app.config import Config
+
+
+@pytest.fixture
+def app():
+    """App with the realtime, stations and trips blueprints on an in-memory database (no scheduler)"""
+    from app.routes.realtime import realtime_bp
+    from app.routes.stations import stations_bp
+    from app.routes.trips import trips_bp
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    app.register_blueprint(realtime_bp, url_prefix='/api/realtime')
+    app.register_blueprint(stations_bp, url_prefix='/api/stations')
+    app.register_blueprint(trips_bp, url_prefix='/api/trips')
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def feed_store(monkeypatch):
+    """Empty FeedStore for the duration of a test"""
+    from collections import deque
+    from app.services.feed_store import FeedStore
+
+    for name in ('_snapshots', '_trips', '_vehicles', '_fleet', '_errors'):
+        monkeypatch.setattr(FeedStore, name, {})
+    monkeypatch.setattr(FeedStore, '_version', '')
+    monkeypatch.setattr(FeedStore, '_history', deque(maxlen=FeedStore.FLEET_HISTORY_SIZE))
+    return FeedStore
+
+
+@pytest.fixture
+def local_cache(monkeypatch):
+    """CacheService with an empty in-process tier and no Redis"""
+    from collections import OrderedDict
+    from app.services.cache_service import CacheService
+
+    monkeypatch.setattr(CacheService, '_local', OrderedDict())
+    monkeypatch.setattr(CacheService, 'get_redis', classmethod(lambda cls: None))
+    monkeypatch.setattr(CacheService, 'get_raw_redis', classmethod(lambda cls: None))
+    return CacheService
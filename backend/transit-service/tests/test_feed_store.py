@@ -0,0 +1,120 @@
+from datetime import datetime
+from app.services.feed_store import FeedSnapshot, FeedStore, VehiclePosition
+
+
+def train(vehicle_id, latitude):
+    return VehiclePosition(
+        vehicle_id, f'trip-{vehicle_id}', 'A', latitude, -73.99, None,
+        'A27', 2, 0, 0, 0
+    )
+
+
+def snapshot(feed_id, second, *positions):
+    return FeedSnapshot(
+        feed_id=feed_id, positions=positions, trip_updates=(),
+        feed_timestamp=datetime(2026, 1, 1, 12, 0, second),
+        fetched_at=datetime.utcnow(), arrivals_by_stop={}
+    )
+
+
+def test_version_depends_on_feed_messages_not_publish_order(feed_store):
+    feed_store.publish(snapshot('ACE', 0))
+    feed_store.publish(snapshot('L', 5))
+    version = feed_store.current_version()
+
+    feed_store._snapshots = {}
+    feed_store.publish(snapshot('L', 5))
+    feed_store.publish(snapshot('ACE', 0))
+
+    assert feed_store.current_version() == version
+
+
+def test_republishing_an_unchanged_feed_keeps_the_version(feed_store):
+    feed_store.publish(snapshot('ACE', 0))
+    version = feed_store.current_version()
+
+    feed_store.publish(snapshot('ACE', 0))
+
+    assert feed_store.current_version() == version
+    assert len(feed_store._history) == 1
+
+
+def test_changes_since_diffs_a_retained_version(feed_store):
+    feed_store.publish(snapshot('ACE', 0, train('1', 40.70), train('2', 40.71)))
+    since = feed_store.current_version()
+    feed_store.publish(snapshot('ACE', 30, train('1', 40.75), train('3', 40.72)))
+
+    version, changes = feed_store.changes_since(since)
+
+    assert version == feed_store.current_version() != since
+    assert [p.vehicle_id for p in changes['added']] == ['3']
+    assert [p.vehicle_id for p in changes['moved']] == ['1']
+    assert changes['removed'] == ['2']
+
+
+def test_changes_since_unknown_version_resets(client, feed_store):
+    feed_store.publish(snapshot('ACE', 0, train('1', 40.70)))
+
+    assert feed_store.changes_since('not-a-version')[1] is None
+
+    data = client.get('/api/realtime/trains/changes?since=not-a-version').get_json()
+    assert data['full'] and data['reset']
+    assert data['count'] == 1
+
+    data = client.get(f'/api/realtime/trains/changes?since={data["version"]}').get_json()
+    assert not data['full'] and not data['reset']
+
+
+def test_history_is_sized_from_the_poll_interval(feed_store):
+    assert FeedStore.configure_history(600, 30, 9) == 180
+    assert feed_store._history.maxlen == 180
+
+
+def test_etag_and_fleet_version_come_from_one_hash(feed_store):
+    from app.services.realtime_service import RealtimeService
+
+    feed_store.publish(snapshot('ACE', 0))
+    feed_store.publish(snapshot('L', 5))
+
+    etag, _ = RealtimeService.snapshot_validators(feed_store.get_many(['ACE', 'L']))
+    assert etag == feed_store.current_version()
+
+
+def test_position_to_dict_maps_enums_to_text():
+    position = VehiclePosition('v1', 't1', 'A', 40.7, -73.99, 90.0, 'A27N', 1, 1767268800, 2, 5)
+
+    data = position.to_dict()
+
+    assert data['status'] == 'STOPPED_AT'
+    assert data['congestion_level'] == 'STOP_AND_GO'
+    assert data['occupancy_status'] == 'FULL'
+    assert data['position'] == {'latitude': 40.7, 'longitude': -73.99, 'bearing': 90.0}
+    assert data['timestamp'] == datetime.fromtimestamp(1767268800)
+
+
+def test_position_to_dict_handles_missing_fields():
+    position = VehiclePosition(None, 't1', 'A', None, None, None, None, -1, None, -1, 99)
+
+    before = datetime.utcnow()
+    data = position.to_dict()
+
+    assert data['position'] is None
+    assert (data['status'], data['congestion_level'], data['occupancy_status']) == ('UNKNOWN',) * 3
+    # No vehicle timestamp: the current time, in UTC like the rest of the API
+    assert before <= data['timestamp'] <= datetime.utcnow()
+
+
+def test_parse_vehicle_position_without_timestamp():
+    from google.transit import gtfs_realtime_pb2
+    from app.services.realtime_service import RealtimeService
+
+    vehicle = gtfs_realtime_pb2.VehiclePosition()
+    vehicle.trip.trip_id = 't1'
+    vehicle.trip.route_id = 'A'
+    vehicle.current_status = gtfs_realtime_pb2.VehiclePosition.IN_TRANSIT_TO
+
+    position = RealtimeService._parse_vehicle_position(vehicle)
+
+    assert position.timestamp is None
+    assert position.status == 2 and position.congestion_level == -1
+    assert position.to_dict()['status'] == 'IN_TRANSIT_TO'
@@ -0,0 +1,128 @@
+import math
+import pathlib
+import random
+import pytest
+from app.services.geo_index import EARTH_RADIUS_KM, GeoIndex
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def brute_force(points, lat, lon):
+    """(index, distance) for every point, nearest first"""
+    return sorted(
+        ((i, haversine(lat, lon, p_lat, p_lon)) for i, (p_lat, p_lon) in enumerate(points)),
+        key=lambda pair: (pair[1], pair[0])
+    )
+
+
+@pytest.fixture(scope='module')
+def points():
+    rng = random.Random(42)
+    points = [(40.55 + rng.random() * 0.35, -74.10 + rng.random() * 0.35) for _ in range(400)]
+    # Points exactly on and just either side of grid cell edges
+    for row in range(4070, 4076):
+        for col in range(-7400, -7394):
+            edge_lat, edge_lon = row * GeoIndex.CELL_SIZE, col * GeoIndex.CELL_SIZE
+            points += [(edge_lat, edge_lon), (edge_lat - 1e-9, edge_lon + 1e-9)]
+    return points
+
+
+@pytest.fixture(scope='module')
+def index(points):
+    return GeoIndex(range(len(points)), points)
+
+
+QUERIES = [
+    (40.7580, -73.9855),
+    (40.7500, -73.9600),                      # On a cell corner
+    (40.7300 - 1e-9, -73.9800 + 1e-9),        # Just inside the neighbouring cell
+    (40.5000, -74.2000),                      # Outside the populated area
+]
+
+
+@pytest.mark.parametrize('lat, lon', QUERIES)
+@pytest.mark.parametrize('radius', [0.0, 0.3, 1.0, 2.5, 8.0])
+def test_within_matches_brute_force(index, points, lat, lon, radius):
+    expected = [(i, d) for i, d in brute_force(points, lat, lon) if d <= radius]
+
+    found = index.within(lat, lon, radius)
+
+    assert sorted(i for i, _ in found) == sorted(i for i, _ in expected)
+    assert [d for _, d in found] == pytest.approx([d for _, d in expected], abs=1e-6)
+
+
+@pytest.mark.parametrize('lat, lon', QUERIES)
+def test_within_limit_keeps_the_closest(index, points, lat, lon):
+    expected = [d for _, d in brute_force(points, lat, lon) if d <= 3.0][:5]
+
+    found = index.within(lat, lon, 3.0, limit=5)
+
+    assert [d for _, d in found] == pytest.approx(expected, abs=1e-6)
+
+
+@pytest.mark.parametrize('lat, lon', QUERIES)
+@pytest.mark.parametrize('k', [1, 7, 50])
+def test_nearest_matches_brute_force(index, points, lat, lon, k):
+    expected = brute_force(points, lat, lon)[:k]
+
+    found = index.nearest(lat, lon, k)
+
+    assert [d for _, d in found] == pytest.approx([d for _, d in expected], abs=1e-6)
+
+
+def test_nearest_with_more_than_indexed(points):
+    small = GeoIndex(['a', 'b'], points[:2])
+    assert [item for item, _ in small.nearest(40.7, -74.0, 5)] == sorted(
+        ['a', 'b'], key=lambda item: haversine(40.7, -74.0, *points['ab'.index(item)])
+    )
+    assert GeoIndex([], []).nearest(40.7, -74.0, 3) == []
+
+
+def test_batch_within_matches_single_queries(index):
+    batch = index.batch_within(QUERIES, 1.5, limit=10)
+
+    assert batch == [index.within(lat, lon, 1.5, limit=10) for lat, lon in QUERIES]
+
+
+@pytest.mark.parametrize('lat, lon, radius, limit, valid', [
+    (0.0, 0.0, 0.5, None, True),
+    (40.7, -74.0, GeoIndex.MAX_RADIUS_KM, GeoIndex.MAX_LIMIT, True),
+    (None, -74.0, 0.5, None, False),
+    (91, -74.0, 0.5, None, False),
+    (float('nan'), -74.0, 0.5, None, False),
+    (40.7, float('inf'), 0.5, None, False),
+    (40.7, -74.0, 0, None, False),
+    (40.7, -74.0, float('nan'), None, False),
+    (40.7, -74.0, float('inf'), None, False),
+    (40.7, -74.0, GeoIndex.MAX_RADIUS_KM + 1, None, False),
+    (40.7, -74.0, 0.5, 0, False),
+    (40.7, -74.0, 0.5, GeoIndex.MAX_LIMIT + 1, False),
+])
+def test_query_validation(lat, lon, radius, limit, valid):
+    error = GeoIndex.point_error(lat, lon) or GeoIndex.search_error(radius, limit)
+
+    assert (error is None) == valid
+
+
+def geo_index_class(path):
+    """Lines of the GeoIndex class in one service's copy, ignoring blank lines"""
+    source = path.read_text()
+    start = source.index('class GeoIndex:')
+    end = source.find('\nclass ', start)
+    return [line.rstrip() for line in source[start:end].splitlines() if line.strip()]
+
+
+@pytest.mark.parametrize('copy', [
+    'alert-service/app/services/geo_index.py',
+    'accessibility-service/services/geo_index.py',
+])
+def test_other_services_carry_the_same_geo_index(copy):
+    backend = pathlib.Path(__file__).resolve().parents[2]
+    if not (backend / copy).exists():
+        pytest.skip(f'{copy} is not checked out')
+
+    assert geo_index_class(backend / copy) == geo_index_class(backend / 'transit-service/app/services/geo_index.py')
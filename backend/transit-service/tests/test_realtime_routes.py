@@ -0,0 +1,112 @@
+import time
+from datetime import datetime
+import pytest
+from app.services.cache_service import CacheService
+from app.services.feed_store import FeedSnapshot
+from app.services.realtime_service import RealtimeService
+
+
+def snapshot(feed_id, feed_timestamp):
+    return FeedSnapshot(
+        feed_id=feed_id, positions=(), trip_updates=(), feed_timestamp=feed_timestamp,
+        fetched_at=datetime.utcnow(), arrivals_by_stop={}
+    )
+
+
+def publish_all(feed_store, feed_timestamp):
+    for feed_id in RealtimeService.SUBWAY_FEEDS:
+        feed_store.publish(snapshot(feed_id, feed_timestamp))
+    return RealtimeService.snapshot_validators(RealtimeService.get_snapshots(RealtimeService.SUBWAY_FEEDS))[0]
+
+
+@pytest.fixture
+def no_feeds(monkeypatch):
+    monkeypatch.setattr(RealtimeService, 'load_snapshots', staticmethod(lambda feed_ids: ([], {})))
+
+
+@pytest.mark.parametrize('query', [
+    'lat=40.7&lon=-74.0&limit=-1',
+    'lat=40.7&lon=-74.0&limit=0',
+    'lat=40.7&lon=-74.0&limit=100000',
+    'lat=40.7&lon=-74.0&radius=-1',
+    'lat=40.7&lon=-74.0&radius=0',
+    'lat=40.7&lon=-74.0&radius=1000',
+    'lat=40.7&lon=-74.0&radius=nan',
+    'lat=40.7&lon=-74.0&radius=inf',
+    'lat=nan&lon=-74.0',
+    'lat=40.7&lon=-inf',
+    'lat=40.7',
+])
+def test_nearby_rejects_bad_parameters(client, no_feeds, query):
+    assert client.get(f'/api/realtime/nearby?{query}').status_code == 400
+
+
+def test_nearby_accepts_zero_coordinates(client, no_feeds):
+    response = client.get('/api/realtime/nearby?lat=0&lon=0&radius=1&limit=5')
+
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 0
+
+
+def wait_for_refresh():
+    for _ in range(100):
+        if not CacheService._inflight:
+            return
+        time.sleep(0.01)
+
+
+def test_trains_etag_always_matches_the_body(client, feed_store, local_cache):
+    first = publish_all(feed_store, datetime(2026, 1, 1, 12, 0, 0))
+    response = client.get('/api/realtime/trains')
+    assert response.headers['ETag'] == f'"{first}"'
+    assert response.get_json()['feed_timestamp'] == '2026-01-01T12:00:00'
+
+    # The feeds moved on: the cached body is served once more under its own
+    # ETag while one refresh rebuilds it under the stable key
+    second = publish_all(feed_store, datetime(2026, 1, 1, 12, 0, 30))
+    response = client.get('/api/realtime/trains')
+    assert response.headers['ETag'] == f'"{first}"'
+    assert response.get_json()['feed_timestamp'] == '2026-01-01T12:00:00'
+
+    wait_for_refresh()
+    response = client.get('/api/realtime/trains')
+    assert response.headers['ETag'] == f'"{second}"'
+    assert response.get_json()['feed_timestamp'] == '2026-01-01T12:00:30'
+    assert list(local_cache._local) == ['response:all_train_positions']
+
+    assert client.get('/api/realtime/trains', headers={'If-None-Match': f'"{second}"'}).status_code == 304
+
+
+def test_route_trains_cached_under_a_stable_key(client, feed_store, local_cache):
+    publish_all(feed_store, datetime(2026, 1, 1, 12, 0, 0))
+    client.get('/api/realtime/route/A')
+    publish_all(feed_store, datetime(2026, 1, 1, 12, 0, 30))
+    client.get('/api/realtime/route/A')
+    wait_for_refresh()
+
+    response = client.get('/api/realtime/route/A')
+    etag = RealtimeService.snapshot_validators(RealtimeService.get_snapshots(['ACE']))[0]
+    assert response.headers['ETag'] == f'"{etag}"'
+    assert response.get_json()['feed_timestamp'] == '2026-01-01T12:00:30'
+    assert list(local_cache._local) == ['response:train_positions_A']
+
+
+def test_trains_last_modified_is_the_feed_time_of_the_body(client, feed_store, local_cache):
+    publish_all(feed_store, datetime(2026, 1, 1, 12, 0, 0))
+    first = client.get('/api/realtime/trains')
+    _, feed_time = RealtimeService.snapshot_validators(RealtimeService.get_snapshots(['ACE']))
+    assert first.last_modified == feed_time
+
+    # A client holding only Last-Modified must see the next feed version,
+    # even though it was fetched after the first body was built
+    publish_all(feed_store, datetime(2026, 1, 1, 12, 0, 30))
+    client.get('/api/realtime/trains')
+    wait_for_refresh()
+    headers = {'If-Modified-Since': first.headers['Last-Modified']}
+    response = client.get('/api/realtime/trains', headers=headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['feed_timestamp'] == '2026-01-01T12:00:30'
+    assert client.get('/api/realtime/trains', headers={
+        'If-Modified-Since': response.headers['Last-Modified']
+    }).status_code == 304
@@ -0,0 +1,93 @@
+import time
+from datetime import datetime
+import pytest
+import requests
+from app.services.feed_store import FeedSnapshot
+from app.services.realtime_service import RealtimeService
+
+
+def snapshot(feed_id):
+    return FeedSnapshot(
+        feed_id=feed_id, positions=(), trip_updates=(), feed_timestamp=None,
+        fetched_at=datetime.utcnow(), arrivals_by_stop={}
+    )
+
+
+@pytest.fixture
+def no_network(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError('request path must not fetch feeds')
+    monkeypatch.setattr(RealtimeService, 'get_session', classmethod(lambda cls: fail()))
+
+
+def test_load_snapshots_reports_missing_feeds_without_fetching(app, feed_store, no_network):
+    feed_store.publish(snapshot('ACE'))
+
+    snapshots, errors = RealtimeService.load_snapshots(['ACE', 'L'])
+
+    assert [s.feed_id for s in snapshots] == ['ACE']
+    assert errors == {'L': 'Waiting for first poll'}
+
+
+def test_failed_poll_is_recorded_and_cleared_by_next_publish(app, feed_store, monkeypatch):
+    def timeout(*args, **kwargs):
+        raise requests.exceptions.ConnectTimeout('MTA timed out')
+    monkeypatch.setattr(RealtimeService, '_download_and_publish', staticmethod(timeout))
+
+    assert RealtimeService.refresh_feed('L') is None
+    _, errors = RealtimeService.load_snapshots(['L'])
+    assert errors['L'].startswith('Fetch failed: MTA timed out (last attempt ')
+
+    feed_store.publish(snapshot('L'))
+    assert feed_store.get_error('L') is None
+    assert RealtimeService.load_snapshots(['L'])[1] == {}
+
+
+def trip_update(trip_id, route_id, *stops):
+    """Trip update with (stop_id, minutes from now) predicted arrivals"""
+    return {
+        'trip_id': trip_id, 'route_id': route_id, 'vehicle_id': None,
+        'stop_time_updates': [
+            {'stop_id': stop_id, 'arrival': datetime.fromtimestamp(time.time() + minutes * 60)}
+            for stop_id, minutes in stops
+        ]
+    }
+
+
+@pytest.fixture
+def arrivals_snapshot():
+    updates = (
+        trip_update('t1', 'A', ('A27N', 2), ('A2N', 8)),
+        trip_update('t2', 'A', ('A2S', 4), ('A27S', 10)),
+        trip_update('t3', 'C', ('A27S', 1)),
+    )
+    return FeedSnapshot(
+        feed_id='ACE', positions=(), trip_updates=updates, feed_timestamp=None,
+        fetched_at=datetime.utcnow(), arrivals_by_stop=RealtimeService.build_arrivals_index(updates)
+    )
+
+
+def test_arrivals_match_stop_ids_exactly(arrivals_snapshot):
+    # A2 is a prefix of A27; only A2's own platforms may match
+    upcoming = list(RealtimeService.get_upcoming_arrivals([arrivals_snapshot], 'A2'))
+
+    assert [arrival[4] for arrival in upcoming] == ['A2S', 'A2N']
+    assert [arrival[4] for arrival in RealtimeService.get_upcoming_arrivals([arrivals_snapshot], 'A27')] == [
+        'A27S', 'A27N', 'A27S'
+    ]
+
+
+def test_arrivals_filter_by_direction_and_route(arrivals_snapshot):
+    assert [a[4] for a in RealtimeService.get_upcoming_arrivals([arrivals_snapshot], 'A2N')] == ['A2N']
+    assert [a[4] for a in RealtimeService.get_upcoming_arrivals([arrivals_snapshot], 'A27', direction='S')] == [
+        'A27S', 'A27S'
+    ]
+    assert [a[2] for a in RealtimeService.get_upcoming_arrivals([arrivals_snapshot], 'A27', route_id='c')] == ['t3']
+
+
+def test_arrivals_endpoint_does_not_mix_in_prefixed_stops(client, feed_store, arrivals_snapshot):
+    feed_store.publish(arrivals_snapshot)
+
+    data = client.get('/api/realtime/arrivals/A2').get_json()
+
+    assert [arrival['stop_id'] for arrival in data['arrivals']] == ['A2S', 'A2N']
@@ -0,0 +1,77 @@
+import pytest
+from app import db
+from app.models.station import Station
+
+
+@pytest.fixture
+def stations(app):
+    # Inserts mark the station index stale, so each test sees these rows
+    db.session.add_all([
+        Station(id='127', name='Times Sq-42 St', latitude=40.75529, longitude=-73.987495),
+        Station(id='A27', name='42 St-Port Authority', latitude=40.757308, longitude=-73.989735),
+        Station(id='NULL', name='Null Island', latitude=0.0001, longitude=0.0001),
+    ])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('query', [
+    'lat=40.7',
+    'lat=40.7&lon=-74.0&radius=nan',
+    'lat=40.7&lon=-74.0&radius=inf',
+    'lat=40.7&lon=-74.0&radius=-1',
+    'lat=40.7&lon=-74.0&radius=0',
+    'lat=40.7&lon=-74.0&radius=1000',
+    'lat=40.7&lon=-74.0&limit=0',
+    'lat=40.7&lon=-74.0&limit=100000',
+    'lat=nan&lon=-74.0',
+    'lat=40.7&lon=inf',
+])
+def test_nearby_rejects_bad_parameters(client, stations, query):
+    assert client.get(f'/api/stations/nearby?{query}').status_code == 400
+
+
+def test_nearby_accepts_zero_coordinates(client, stations):
+    response = client.get('/api/stations/nearby?lat=0&lon=0&radius=1')
+
+    assert response.status_code == 200
+    assert [station['id'] for station in response.get_json()] == ['NULL']
+
+
+def test_nearby_returns_nearest_first(client, stations):
+    response = client.get('/api/stations/nearby?lat=40.7553&lon=-73.9875&radius=1&limit=1')
+
+    assert [station['id'] for station in response.get_json()] == ['127']
+
+
+@pytest.mark.parametrize('body', [
+    [{'lat': 40.7, 'lon': -74.0}],
+    'points',
+    42,
+    {'points': []},
+    {'points': [{'lat': 40.7}]},
+    {'points': [{'lat': 40.7, 'lon': -74.0}], 'radius': 'far'},
+    {'points': [{'lat': 40.7, 'lon': -74.0}], 'radius': float('nan')},
+    {'points': [{'lat': 40.7, 'lon': -74.0}], 'radius': float('inf')},
+    {'points': [{'lat': 40.7, 'lon': -74.0}], 'radius': 50},
+    {'points': [{'lat': 40.7, 'lon': -74.0}], 'limit': 100000},
+    {'points': [{'lat': 40.7, 'lon': -74.0}], 'limit': float('inf')},
+    {'points': [{'lat': 40.7, 'lon': -74.0}, {'lat': 91, 'lon': 0}]},
+])
+def test_nearby_batch_rejects_bad_bodies(client, stations, body):
+    assert client.post('/api/stations/nearby/batch', json=body).status_code == 400
+
+
+def test_nearby_batch_rejects_non_json_body(client, stations):
+    response = client.post('/api/stations/nearby/batch', data='lat=40.7', content_type='text/plain')
+
+    assert response.status_code == 400
+
+
+def test_nearby_batch_accepts_zero_coordinates(client, stations):
+    response = client.post('/api/stations/nearby/batch', json={
+        'points': [{'lat': 0, 'lon': 0}, {'lat': 40.7553, 'lon': -73.9875}], 'radius': 1, 'limit': 1
+    })
+
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert [[s['id'] for s in result['stations']] for result in results] == [['NULL'], ['127']]
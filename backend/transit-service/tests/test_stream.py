@@ -0,0 +1,86 @@
+from datetime import datetime
+import pytest
+from app.services.feed_store import FeedSnapshot
+from app.services.realtime_service import RealtimeService
+from app.services.stream_hub import StreamHub
+
+
+@pytest.fixture
+def hub(monkeypatch, feed_store):
+    monkeypatch.setattr(StreamHub, '_subscribers', {})
+    monkeypatch.setattr(StreamHub, '_count', 0)
+    return StreamHub
+
+
+def snapshot(feed_id, trip_updates=()):
+    return FeedSnapshot(
+        feed_id=feed_id, positions=(), trip_updates=trip_updates,
+        feed_timestamp=datetime(2026, 1, 1, 12, 0, 0), fetched_at=datetime.utcnow(),
+        arrivals_by_stop=RealtimeService.build_arrivals_index(trip_updates)
+    )
+
+
+@pytest.mark.parametrize('query, status', [
+    ('', 400),
+    ('routes=QQ', 404),
+    ('feeds=nope', 404),
+])
+def test_stream_rejects_bad_subscriptions(client, hub, query, status):
+    assert client.get(f'/api/realtime/stream?{query}').status_code == status
+    assert hub._count == 0
+
+
+def test_stream_sends_current_state_then_releases_its_slot(client, hub, feed_store):
+    feed_store.publish(snapshot('ACE'))
+
+    response = client.get('/api/realtime/stream?routes=A', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    first = next(response.response)
+    assert first.startswith(b'event: route\nid: ')
+    assert b'"route_id": "A"' in first
+    assert hub._count == 1
+
+    response.close()
+    assert hub._count == 0
+    assert hub._subscribers == {}
+
+
+def test_stream_never_iterated_still_releases_its_slot(app, hub):
+    from app.routes.realtime import stream_trains
+    app.config['STREAM_MAX_SUBSCRIBERS'] = 1
+
+    with app.test_request_context('/api/realtime/stream?feeds=L'):
+        abandoned = stream_trains()
+        assert stream_trains()[1] == 503
+
+    # The client went away before the server sent anything
+    abandoned.close()
+    assert hub._count == 0
+    with app.test_request_context('/api/realtime/stream?feeds=L'):
+        reopened = stream_trains()
+    assert reopened.status_code == 200
+    reopened.close()
+
+
+def test_unsubscribe_is_idempotent(app, hub):
+    subscriber = hub.subscribe([('feed', 'L')])
+
+    hub.unsubscribe(subscriber)
+    hub.unsubscribe(subscriber)
+
+    assert hub._count == 0
+
+
+def test_station_topics_follow_the_sir_feed(app, hub, feed_store):
+    subscriber = hub.subscribe([('station', 'S31')])
+    subscriber.drain(0)
+
+    update = {
+        'trip_id': 'si-1', 'route_id': 'SI', 'vehicle_id': None,
+        'stop_time_updates': [{'stop_id': 'S31N', 'arrival': datetime.fromtimestamp(4102444800)}]
+    }
+    hub.broadcast(feed_store.publish(snapshot('SIR', (update,))))
+
+    events = subscriber.drain(0)
+    assert len(events) == 1
+    assert b'"trip_id": "si-1"' in events[0]
@@ -0,0 +1,24 @@
+import pytest
+
+
+@pytest.mark.parametrize('trip_ids', [[[1]], [{'id': 'x'}], ['ok', 7], [None]])
+def test_batch_rejects_non_string_trip_ids(client, trip_ids):
+    response = client.post('/api/trips/batch', json={'trip_ids': trip_ids})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'trip_ids must be strings'}
+
+
+@pytest.mark.parametrize('body', [['A20230101'], 'A20230101', 7, None])
+def test_batch_rejects_bodies_that_are_not_objects(client, body):
+    response = client.post('/api/trips/batch', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Body must be a JSON object'}
+
+
+def test_batch_reports_unknown_trips(client):
+    response = client.post('/api/trips/batch', json={'trip_ids': ['no-such-trip']})
+
+    assert response.status_code == 200
+    assert response.get_json()['not_found'] == ['no-such-trip']